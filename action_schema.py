@@ -0,0 +1,179 @@
+# action_schema.py
+# 에이전트 액션 JSON의 형식을 디코딩 단계에서 강제한다.
+# 예전엔 모델이 JSON을 깨뜨리면 ai_web_browser.py는 그 텍스트를 JS로 실행했고
+# ai_web_browsing2.py / llama_web.py는 실행을 멈췄다 (LLM 한 번 호출이 통째로 낭비).
+#
+# - Ollama      : json_schema(spec)를 chat(format=...)에 넘긴다. Ollama가 문법으로 바꿔 샘플링을 제한하고
+#                 객체가 닫히면 생성이 끝난다.
+# - transformers: ActionGrammar(tokenizer, spec) 한 번 만들고, 호출마다 ActionLogitsProcessor(grammar)를
+#                 pipeline(..., logits_processor=[...])에 넘긴다. 출력은 항상
+#                   {"action": "<이름>", "<필드>": "<문자열>", ...}
+#                 꼴이고 '}' 다음에는 EOS만 허용한다. (문자열 필드만 지원)
+#                 ActionLogitsProcessor(grammar, max_new_tokens)로 생성 길이 한도를 알려 주면, 남은 토큰이
+#                 객체를 닫는 데 필요한 만큼이 됐을 때 문자열을 닫고 나머지 필드는 빈 문자열로 채워 '}'까지 낸다
+#                 (긴 summary/text 때문에 한도에 걸려 JSON이 열린 채 끝나지 않게).
+#
+# spec: {액션 이름: {필드: "string" | "number"}}
+BROWSER_ACTIONS = {   # ai_web_browser.py
+    name: {"selector": "string", "value": "string", "wait": "number"}
+    for name in ("goto", "click", "type", "scroll", "wait", "js")
+}
+AGENT_ACTIONS = {     # ai_web_browsing2.py, llama_web.py
+    "goto": {"url": "string"},
+    "click": {"selector": "string"},
+    "type": {"selector": "string", "text": "string"},
+    "finish": {"summary": "string"},
+}
+
+
+def _object_schema(actions, fields):
+    return {
+        "type": "object",
+        "properties": {"action": {"type": "string", "enum": list(actions)},
+                       **{f: {"type": t} for f, t in fields.items()}},
+        "required": ["action", *fields],
+        "additionalProperties": False,
+    }
+
+
+def json_schema(spec):
+    """Ollama format=용 JSON schema. 모든 액션의 필드가 같으면 객체 하나, 아니면 액션별 anyOf."""
+    field_sets = {tuple(fields.items()) for fields in spec.values()}
+    if len(field_sets) == 1:
+        return _object_schema(spec, next(iter(spec.values())))
+    return {"anyOf": [_object_schema([name], fields) for name, fields in spec.items()]}
+
+
+# ----------------------------------------
+# transformers용: 생성된 텍스트 prefix -> 다음에 올 수 있는 것
+# ----------------------------------------
+HEAD = '{"action": "'
+
+
+def _string_end(text):
+    """따옴표 안쪽 텍스트에서 닫는 따옴표 위치 (없으면 -1)"""
+    i = 0
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text[i] == '"':
+            return i
+        i += 1
+    return -1
+
+
+def next_step(text, spec):
+    """('literal', 남은 고정 텍스트) | ('enum', 후보 완성 텍스트들) | ('string', 액션, 필드 번호) | ('done',) | ('invalid',)"""
+    if not text.startswith(HEAD):
+        return ('literal', HEAD[len(text):]) if HEAD.startswith(text) else ('invalid',)
+    rest = text[len(HEAD):]
+    quote = rest.find('"')
+    if quote < 0:
+        options = [name[len(rest):] + '"' for name in spec if name.startswith(rest)]
+        return ('enum', options) if options else ('invalid',)
+    action, rest = rest[:quote], rest[quote + 1:]
+    if action not in spec:
+        return ('invalid',)
+    for index, field in enumerate(spec[action]):
+        lit = f', "{field}": "'
+        if not rest.startswith(lit):
+            return ('literal', lit[len(rest):]) if lit.startswith(rest) else ('invalid',)
+        rest = rest[len(lit):]
+        end = _string_end(rest)
+        if end < 0:
+            return ('string', action, index)
+        rest = rest[end + 1:]
+    if rest == '':
+        return ('literal', '}')
+    return ('done',) if rest == '}' else ('invalid',)
+
+
+class ActionGrammar:
+    """토크나이저별로 한 번 만든다 (어휘 전체를 한 번 디코딩해 문자열 안에 올 수 있는 토큰 마스크를 만듦)"""
+    def __init__(self, tokenizer, spec=AGENT_ACTIONS):
+        import re
+
+        import torch
+
+        for fields in spec.values():
+            if any(t != "string" for t in fields.values()):
+                raise ValueError("ActionGrammar supports string fields only")
+        self.tokenizer = tokenizer
+        self.spec = spec
+        inner = re.compile(r'(?:[^"\\\x00-\x1f]|\\["\\/nt])*')
+        texts = [tokenizer.decode([i], clean_up_tokenization_spaces=False) for i in range(len(tokenizer))]
+        # 문자열 안쪽에 그대로 들어갈 수 있는 토큰 / 문자열을 닫는 토큰 (escape가 토큰 경계에서 끊기는 건 막는다)
+        self.string_mask = torch.tensor([bool(t) and (inner.fullmatch(t) is not None or
+                                                      (t.endswith('"') and inner.fullmatch(t[:-1]) is not None))
+                                         for t in texts])
+        self.string_mask[tokenizer.all_special_ids] = False
+        self._first_token = {}
+        self._close_cost = {}
+
+    def first_token(self, text):
+        """고정 텍스트를 강제할 때 그 첫 토큰"""
+        if text not in self._first_token:
+            self._first_token[text] = self.tokenizer.encode(text, add_special_tokens=False)[0]
+        return self._first_token[text]
+
+    def close_cost(self, action, index):
+        """action의 index번째 문자열 필드 안에서 객체를 '}'까지 닫는 데 드는 토큰 수 (나머지 필드는 빈 문자열)"""
+        key = (action, index)
+        if key not in self._close_cost:
+            fields = list(self.spec[action])
+            text = HEAD + action + '"' + ''.join(f', "{f}": ""' for f in fields[:index]) + f', "{fields[index]}": "'
+            cost = 0
+            while True:
+                step = next_step(text, self.spec)
+                if step[0] == 'string':
+                    piece = '"'
+                elif step[0] == 'literal':
+                    piece = step[1]
+                else:
+                    break
+                # allowed()가 강제하는 것과 같은 토큰으로 센다
+                text += self.tokenizer.decode([self.first_token(piece)], clean_up_tokenization_spaces=False)
+                cost += 1
+            self._close_cost[key] = cost
+        return self._close_cost[key]
+
+    def allowed(self, generated, vocab_size, remaining=None):
+        """-> 허용 토큰 bool 마스크 (길이 vocab_size). remaining: 이 토큰을 포함해 남은 생성 토큰 수"""
+        import torch
+
+        step = next_step(generated, self.spec)
+        mask = torch.zeros(vocab_size, dtype=torch.bool)
+        if step[0] == 'literal':
+            mask[self.first_token(step[1])] = True
+        elif step[0] == 'enum':
+            for option in step[1]:
+                mask[self.first_token(option)] = True
+        elif step[0] == 'string' and remaining is not None and remaining <= self.close_cost(step[1], step[2]):
+            mask[self.first_token('"')] = True   # 지금 닫지 않으면 한도 안에 '}'까지 못 간다
+        elif step[0] == 'string':
+            n = min(vocab_size, len(self.string_mask))
+            mask[:n] = self.string_mask[:n]
+        else:   # 'done' 또는 'invalid' -> 끝낸다
+            mask[self.tokenizer.eos_token_id] = True
+        return mask
+
+
+class ActionLogitsProcessor:
+    """generate 한 번마다 새로 만든다 (첫 호출 때 프롬프트 길이를 기억).
+    max_new_tokens는 generate에 준 값과 같게 (None이면 길이 한도를 고려하지 않음)."""
+    def __init__(self, grammar, max_new_tokens=None):
+        self.grammar = grammar
+        self.max_new_tokens = max_new_tokens
+        self.prompt_len = None
+
+    def __call__(self, input_ids, scores):
+        if self.prompt_len is None:
+            self.prompt_len = input_ids.shape[1]
+        generated = self.grammar.tokenizer.decode(input_ids[0, self.prompt_len:], skip_special_tokens=True,
+                                                  clean_up_tokenization_spaces=False)
+        remaining = None
+        if self.max_new_tokens is not None:
+            remaining = self.max_new_tokens - (input_ids.shape[1] - self.prompt_len)
+        mask = self.grammar.allowed(generated, scores.shape[-1], remaining).to(scores.device)
+        return scores.masked_fill(~mask, float('-inf'))
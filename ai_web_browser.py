@@ -1,11 +1,14 @@
 import json
 import time
-import ollama
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+from dom_snapshot import DomSnapshotter, selenium_evaluate
+from llm_client import AgentLLM
+from action_schema import BROWSER_ACTIONS, json_schema
+
 
 # ----------------------------------------
 # 1) Chrome 브라우저 초기화
@@ -25,8 +28,13 @@ LLM_SYSTEM_PROMPT = """
 You are a browser automation agent.
 You will receive:
 1. User command
-2. The structured DOM of the page (as JSON)
+2. The visible elements of the page, one per line:
+   <selector> <tag> "text" attr=value ...
+   Lines starting with "-" are plain text (not clickable).
+   On the same page you may instead get only the changes since the last step
+   (added / changed / removed lines); the rest of the page is as before.
 Your task:
+- Use the selector exactly as given for click/type
 - Generate JSON ONLY (no extra text)
 - If the page is dynamic (SPA) and the element cannot be found, generate JS code instead
 Output format:
@@ -45,9 +53,14 @@ If the action cannot be performed, return:
 }
 """
 
+# system 프롬프트 고정 + keep_alive + 스트리밍 (llm_client.py), 출력은 액션 스키마로 제한
+llm = AgentLLM(LLM_SYSTEM_PROMPT, schema=json_schema(BROWSER_ACTIONS))
+
 
 # ----------------------------------------
-# 3) DOM을 JSON으로 추출
+# 3) DOM 추출
+#    프롬프트에는 dom_snapshot.get_dom_snapshot(압축 스냅샷)을 쓴다.
+#    아래 전체 트리 JSON은 디버깅/비교용 (python dom_snapshot.py 참고)
 # ----------------------------------------
 def get_dom_json(driver):
     dom_json = driver.execute_script("""
@@ -72,27 +85,21 @@ def get_dom_json(driver):
 # ----------------------------------------
 # 4) LLM에게 명령 전달
 # ----------------------------------------
-def ask_llm(user_cmd, dom_json):
+def ask_llm(user_cmd, page):
+    # 같은 페이지에서의 이전 턴은 llm.history에 이어 붙는다 (변경분은 이전 스냅샷이 대화에 있어야 의미가 있다)
     content = f"""
 User Command: {user_cmd}
 
-Page DOM (JSON):
-{json.dumps(dom_json)}
+Page:
+{page}
 """
-    response = ollama.chat(
-        model="llama3.1",
-        messages=[
-            {"role": "system", "content": LLM_SYSTEM_PROMPT},
-            {"role": "user", "content": content}
-        ]
-    )
-
-    raw = response['message']['content']
+    raw = llm.ask(content)
     try:
         return json.loads(raw)
     except json.JSONDecodeError:
-        print("❌ JSON parsing failed. Falling back to JS execution if available.\nRaw output:\n", raw)
-        return {"action": "js", "value": raw, "wait": 1}
+        # 스키마로 제한하므로 생성이 중간에 끊긴 경우뿐. 모델 출력을 JS로 실행하지는 않는다.
+        print("❌ Incomplete LLM output:\n", raw)
+        return None
 
 
 # ----------------------------------------
@@ -147,6 +154,8 @@ def execute_action(driver, action_json):
 # ----------------------------------------
 def main():
     driver = init_browser()
+    snapshots = DomSnapshotter(selenium_evaluate(driver))
+    llm.warmup()   # 모델 로드 + system 프롬프트 prefill을 첫 명령 전에
     print("\n🔥 DOM-based SPA-compatible LLM Chrome Controller 시작\n")
 
     while True:
@@ -154,11 +163,13 @@ def main():
         if cmd.lower() in ["exit", "quit"]:
             break
 
-        # DOM 구조 추출
-        dom_json = get_dom_json(driver)
+        # 새 페이지면 압축 스냅샷 전체, 같은 페이지면 바뀐 요소만
+        page, full = snapshots.step()
+        if full:
+            llm.reset()
 
         # LLM에게 명령 전달
-        action = ask_llm(cmd, dom_json)
+        action = ask_llm(cmd, page)
 
         if action:
             print("📌 LLM Action:", action)
@@ -1,14 +1,20 @@
-import ollama
 from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
 import json
 
+from dom_snapshot import DomSnapshotter
+from web_extract import extract_grouped
+from llm_client import AgentLLM
+from action_schema import AGENT_ACTIONS, json_schema
+
 # -----------------------------
 # Ollama helper
 # -----------------------------
 system_prompt = """
 You are a fully autonomous web browsing agent.
-You receive a structured list of actionable elements on the page.
+You receive the visible elements of the page, one per line:
+<selector> <tag> "text" attr=value ...
+(lines starting with "-" are plain text). After an action on the same page you
+may receive only the changes (added / changed / removed lines) instead.
 You must respond with ONE action in JSON:
 
 {"action": "goto", "url": "https://example.com"}
@@ -20,32 +26,20 @@ Do NOT include explanations or any text outside JSON.
 If you cannot perform an action, respond with finish and summarize the page instead.
 """
 
+# Shared client: fixed system prompt (cached prefix), keep_alive, stops at the closing brace.
+# Output is constrained to the action schema, so it always parses.
+llm = AgentLLM(system_prompt, schema=json_schema(AGENT_ACTIONS))
+
 def ask_ollama(prompt):
-    resp = ollama.chat(
-        model="llama3.1",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return resp['message']['content']
+    # earlier turns on the current page live in llm.history, so a change-only prompt has its base snapshot
+    return llm.ask(prompt)
 
 # -----------------------------
 # Extract interactive elements
 # -----------------------------
 def extract_actions(html, max_elements=20):
-    soup = BeautifulSoup(html, "html.parser")
-    inputs = [{"selector": f"#{i.get('id')}", "placeholder": i.get("placeholder", "")}
-              for i in soup.find_all("input") if i.get("id")]
-    buttons = [{"selector": f"#{b.get('id')}", "text": b.get_text(strip=True)}
-               for b in soup.find_all("button") if b.get("id")]
-    links = [{"selector": f"#{a.get('id')}", "text": a.get_text(strip=True)}
-             for a in soup.find_all("a") if a.get("id")]
-    return {
-        "inputs": inputs[:max_elements],
-        "buttons": buttons[:max_elements],
-        "links": links[:max_elements]
-    }
+    # HTML-only path (saved pages, no live page); the agent loop uses the in-page DomSnapshotter
+    return extract_grouped(html, max_elements)
 
 # -----------------------------
 # Autonomous browsing agent
@@ -55,15 +49,19 @@ def autonomous_browser(goal, start_url="https://www.youtube.com"):
         browser = p.chromium.launch(headless=False)
         page = browser.new_page()
         page.goto(start_url)
+        # Snapshot cache per page: full snapshot after navigation, MutationObserver deltas otherwise
+        snapshots = DomSnapshotter(page.evaluate)
+        llm.warmup()
 
         while True:
-            html = page.content()
-            dom_snapshot = extract_actions(html)
+            dom_snapshot, full = snapshots.step()
+            if full:
+                llm.reset()
 
             prompt = f"""
 Goal: {goal}
-Current actionable elements on the page:
-{json.dumps(dom_snapshot, indent=2)}
+{"Current elements on the page" if full else "Page changes since your last action"}:
+{dom_snapshot}
 
 Decide ONE action to achieve the goal. Respond ONLY in JSON.
 """
@@ -0,0 +1,151 @@
+# camera_association.py
+# 트랙 <-> 얼굴 검출 매칭(association) 모듈. HeightTracker(associator=...)로 교체할 수 있다.
+#
+# - GreedyIoUAssociator   : 예전 방식. 트랙 순서대로 IoU가 가장 큰 검출을 가져간다.
+# - HungarianAssociator   : IoU + 중심거리 비용 행렬을 헝가리안 알고리즘으로 전역 최소화.
+#                           트랙 속도로 예측한 위치를 쓰고, 너무 먼 쌍은 게이팅으로 제외한다.
+#
+# associate()는 (matches, unmatched_tracks, unmatched_dets)를 반환한다.
+# matches는 (트랙 행 번호, 검출 번호) 쌍 리스트.
+import numpy as np
+
+from camera_geometry import iou_matrix
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy가 없으면 아래 순수 NumPy 구현 사용
+    linear_sum_assignment = None
+
+GATED = 1e6  # 게이트 밖 쌍의 비용
+
+
+def predict_boxes(boxes, velocities, steps):
+    """(x,y,w,h) 박스를 등속 모델로 steps 프레임만큼 이동"""
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4).copy()
+    if velocities is not None and len(boxes):
+        v = np.asarray(velocities, dtype=float).reshape(-1, 2)
+        s = np.asarray(steps, dtype=float).reshape(-1, 1) if np.ndim(steps) else float(steps)
+        boxes[:, :2] += v * s
+    return boxes
+
+
+def centroid_distances(boxes_a, boxes_b):
+    """중심 사이 거리 행렬 (len(a), len(b))"""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+    ca = a[:, :2] + a[:, 2:] / 2
+    cb = b[:, :2] + b[:, 2:] / 2
+    return np.linalg.norm(ca[:, None, :] - cb[None, :, :], axis=-1)
+
+
+def hungarian(cost):
+    """최소 비용 할당 (행 인덱스 배열, 열 인덱스 배열). 직사각 행렬 가능."""
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    # 포텐셜(u, v)을 쓰는 O(n^2 m) 헝가리안. 1-based 인덱스, 0번은 가상 열.
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)   # p[j] = 열 j에 배정된 행
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            cand = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(cand)) + 1
+            delta = cand[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    order = np.argsort(rows)
+    rows, cols = rows[order], cols[order]
+    if transposed:
+        rows, cols = cols, rows
+        order = np.argsort(rows)
+        rows, cols = rows[order], cols[order]
+    return rows, cols
+
+
+class GreedyIoUAssociator:
+    """예전 HeightTracker.update의 탐욕 매칭 (비교 기준)"""
+    def __init__(self, min_iou=0.2):
+        self.min_iou = min_iou
+
+    def associate(self, track_boxes, det_boxes, velocities=None, steps=0):
+        ious = iou_matrix(track_boxes, det_boxes)
+        matches, assigned = [], set()
+        for row in range(ious.shape[0]):
+            best_i = -1
+            best_iou = 0.0
+            for i in range(ious.shape[1]):
+                if i in assigned: continue
+                if ious[row, i] > best_iou:
+                    best_iou = ious[row, i]
+                    best_i = i
+            if best_i != -1 and best_iou > self.min_iou:
+                matches.append((row, best_i))
+                assigned.add(best_i)
+        matched_rows = {r for r, _ in matches}
+        return (matches,
+                [r for r in range(ious.shape[0]) if r not in matched_rows],
+                [i for i in range(ious.shape[1]) if i not in assigned])
+
+
+class HungarianAssociator:
+    """비용 = w_iou*(1-IoU) + w_dist*(중심거리 / 트랙 대각선).
+
+    IoU가 min_iou 이상이거나 중심거리가 트랙 대각선의 max_dist_ratio배 이내인 쌍만 허용(게이팅).
+    velocities/steps가 주어지면 트랙 박스를 예측 위치로 옮긴 뒤 비용을 계산한다.
+    """
+    def __init__(self, w_iou=1.0, w_dist=1.0, min_iou=0.1, max_dist_ratio=1.0):
+        self.w_iou = w_iou
+        self.w_dist = w_dist
+        self.min_iou = min_iou
+        self.max_dist_ratio = max_dist_ratio
+
+    def cost_matrix(self, track_boxes, det_boxes, velocities=None, steps=0):
+        pred = predict_boxes(track_boxes, velocities, steps)
+        ious = iou_matrix(pred, det_boxes)
+        diag = np.hypot(pred[:, 2], pred[:, 3]).reshape(-1, 1)
+        dist = centroid_distances(pred, det_boxes) / np.maximum(diag, 1.0)
+        cost = self.w_iou * (1 - ious) + self.w_dist * np.minimum(dist, self.max_dist_ratio)
+        allowed = (ious >= self.min_iou) | (dist <= self.max_dist_ratio)
+        return np.where(allowed, cost, GATED)
+
+    def associate(self, track_boxes, det_boxes, velocities=None, steps=0):
+        cost = self.cost_matrix(track_boxes, det_boxes, velocities, steps)
+        rows, cols = hungarian(cost)
+        matches = [(int(r), int(c)) for r, c in zip(rows, cols) if cost[r, c] < GATED]
+        matched_rows = {r for r, _ in matches}
+        matched_cols = {c for _, c in matches}
+        return (matches,
+                [r for r in range(cost.shape[0]) if r not in matched_rows],
+                [i for i in range(cost.shape[1]) if i not in matched_cols])
+
+
+ASSOCIATORS = {'greedy': GreedyIoUAssociator, 'hungarian': HungarianAssociator}
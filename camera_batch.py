@@ -0,0 +1,108 @@
+# camera_batch.py
+# 녹화 영상 파일(또는 폴더)에 대해 GUI 없이 키 추정을 돌리고 프레임별 결과를 JSONL로 저장한다.
+# 파일이 여러 개면 프로세스 풀로 나눠 처리하며, 워커마다 MediaPipe 인스턴스를 하나씩 만든다.
+#
+#   python camera_batch.py videos/ --out results/ --workers 4
+#
+# 출력: results/<영상이름>.jsonl, 한 줄에 한 프레임
+#   {"frame": 12, "t": 0.4, "tracks": [{"id": 0, "bbox": [x, y, w, h], "height": 1.72,
+#                                       "confidence": 0.8, "frozen": false,
+#                                       "D": 2.31, "ankle_source": "left"}, ...]}
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+_processor = None  # 워커 프로세스마다 하나
+
+
+def _init_worker():
+    global _processor
+    from camera_height_detection import FrameProcessor
+    _processor = FrameProcessor()
+
+
+def _round(v, nd=3):
+    return None if v is None else round(float(v), nd)
+
+
+def process_video(path, out_dir):
+    """영상 하나를 처리해 JSONL을 쓰고 (경로, 프레임 수, 처리 시간)을 반환"""
+    _processor.reset()
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise RuntimeError(f"cannot open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    out_path = Path(out_dir) / (Path(path).stem + '.jsonl')
+    frame_idx = 0
+    start = time.perf_counter()
+    with open(out_path, 'w', encoding='utf-8') as out:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            results = _processor.process(frame, frame_idx)
+            tracks = [{'id': r['id'],
+                       'bbox': [int(v) for v in r['bbox']],
+                       'height': _round(r['height']),
+                       'confidence': _round(r['confidence'], 2),
+                       'frozen': r['frozen'],
+                       'D': _round(r['D']),
+                       'ankle_source': r['ankle_source']} for r in results]
+            out.write(json.dumps({'frame': frame_idx, 't': round(frame_idx / fps, 3),
+                                  'tracks': tracks}) + '\n')
+            frame_idx += 1
+    cap.release()
+    return str(path), frame_idx, time.perf_counter() - start
+
+
+def collect_videos(inputs):
+    paths = []
+    for name in inputs:
+        p = Path(name)
+        if p.is_dir():
+            paths += sorted(f for f in p.rglob('*') if f.suffix.lower() in VIDEO_EXTENSIONS)
+        else:
+            paths.append(p)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless batch height estimation")
+    parser.add_argument('inputs', nargs='+', help="영상 파일 또는 폴더")
+    parser.add_argument('--out', default='height_results', help="JSONL 출력 폴더")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="프로세스 수 (MediaPipe가 내부적으로도 스레드를 쓰므로 코어 수의 절반 정도)")
+    args = parser.parse_args()
+
+    videos = collect_videos(args.inputs)
+    if not videos:
+        parser.error("처리할 영상이 없습니다")
+    os.makedirs(args.out, exist_ok=True)
+
+    started = time.perf_counter()
+    total_frames = 0
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(videos)),
+                             initializer=_init_worker) as pool:
+        futures = {pool.submit(process_video, v, args.out): v for v in videos}
+        for fut in as_completed(futures):
+            try:
+                path, frames, seconds = fut.result()
+            except Exception as e:
+                print(f"FAILED {futures[fut]}: {e}")
+                continue
+            total_frames += frames
+            print(f"{path}: {frames} frames in {seconds:.1f}s ({frames / max(seconds, 1e-6):.1f} FPS)")
+    elapsed = time.perf_counter() - started
+    print(f"\n{len(videos)} videos, {total_frames} frames in {elapsed:.1f}s "
+          f"-> {total_frames / max(elapsed, 1e-6):.1f} FPS total with {args.workers} workers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+# camera_bench.py
+# 카메라 키 추정 경로의 마이크로 벤치마크. 카메라/모델 없이 합성 데이터로 돌린다.
+#
+#   python camera_bench.py geometry --people 1 2 5 10 20 50
+#   python camera_bench.py association --people 10 --save scene.json
+#   python camera_bench.py association --load scene.json
+#   python camera_bench.py tracking --trackers kalman csrt kcf
+#   python camera_bench.py pose --videos one.mp4 three.mp4 --heights heights.json
+#   python camera_bench.py detection --videos clip1.mp4 clip2.mp4
+#   python camera_bench.py convergence --noise 0.03 --outliers 0.1
+import argparse
+import json
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from camera_association import ASSOCIATORS
+from camera_geometry import estimate_height_from_pixels, estimate_heights_from_pixels, iou, iou_matrix
+from camera_height_detection import (
+    CX, CY, DETECT_EVERY_N_FRAMES, FX, FY, H_CAM, HeightEstimator, HeightTracker,
+    detect_faces,
+)
+from camera_tracking import TRACKERS
+
+
+def random_boxes(rng, n, img_w=1280, img_h=720):
+    w = rng.uniform(40, 160, n)
+    h = w * rng.uniform(1.0, 1.3, n)
+    x = rng.uniform(0, img_w - w)
+    y = rng.uniform(0, img_h / 2 - h)
+    return [tuple(b) for b in np.stack([x, y, w, h], axis=1)]
+
+
+def timeit(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench_geometry(args):
+    rng = np.random.default_rng(0)
+    print(f"{'people':>6} {'height scalar':>14} {'height numpy':>13} {'iou scalar':>11} {'iou numpy':>10}  (us/frame)")
+    for n in args.people:
+        tracks = random_boxes(rng, n)
+        dets = [(x + rng.normal(0, 5), y + rng.normal(0, 5), w, h) for x, y, w, h in tracks]
+        v_head = [y for _, y, _, _ in tracks]
+        v_foot = list(rng.uniform(0, 720, n))  # 유효/무효(NaN) 발 위치가 섞이도록
+        u_foot = [x + w / 2 for x, _, w, _ in tracks]
+
+        # 스칼라와 배치 결과가 같은지 먼저 확인
+        H, D = estimate_heights_from_pixels(v_head, v_foot, FX, FY, CX, CY, H_CAM, u_foot=u_foot)
+        for i in range(n):
+            ref = estimate_height_from_pixels(v_head[i], v_foot[i], FX, FY, CX, CY, H_CAM, u_foot=u_foot[i])
+            assert (ref is None) == np.isnan(D[i])
+            if ref is not None:
+                assert abs(ref[0] - H[i]) < 1e-9 and abs(ref[1] - D[i]) < 1e-9
+        ious = iou_matrix(tracks, dets)
+        assert all(abs(ious[i, j] - iou(tracks[i], dets[j])) < 1e-9
+                   for i in range(n) for j in range(n))
+
+        t_hs = timeit(lambda: [estimate_height_from_pixels(v_head[i], v_foot[i], FX, FY, CX, CY, H_CAM,
+                                                           u_foot=u_foot[i]) for i in range(n)], args.repeat)
+        t_hv = timeit(lambda: estimate_heights_from_pixels(v_head, v_foot, FX, FY, CX, CY, H_CAM,
+                                                           u_foot=u_foot), args.repeat)
+        t_is = timeit(lambda: [[iou(a, b) for b in dets] for a in tracks], args.repeat)
+        t_iv = timeit(lambda: iou_matrix(tracks, dets), args.repeat)
+        print(f"{n:>6} {t_hs:>14.1f} {t_hv:>13.1f} {t_is:>11.1f} {t_iv:>10.1f}")
+
+
+# --------- association: 합성 장면 재생 ----------
+def walk(rng, people, frames, img_w=1280, img_h=720):
+    """사람들이 서로 교차하며 걷는 장면. 프레임마다 (얼굴 크기 배열, 위치 배열)을 yield."""
+    size = rng.uniform(60, 120, people)
+    pos = np.stack([rng.uniform(0, img_w - 120, people), rng.uniform(0, img_h / 2, people)], axis=1)
+    vel = rng.normal(0, 4, (people, 2))
+    for _ in range(frames):
+        vel = 0.98 * vel + rng.normal(0, 0.3, vel.shape)  # 걷는 속도 정도로 유지
+        pos += vel
+        # 화면 가장자리에서 튕김
+        for k, limit in ((0, img_w), (1, img_h / 2)):
+            out = (pos[:, k] < 0) | (pos[:, k] > limit - size)
+            vel[out, k] *= -1
+            pos[:, k] = np.clip(pos[:, k], 0, limit - size)
+        yield size, pos
+
+
+def make_scene(rng, people, frames, detect_every, miss_prob):
+    """검출 프레임마다 [(gt_id, bbox), ...] 리스트 (검출 누락/잡음 포함)"""
+    scene = []
+    for f, (size, pos) in enumerate(walk(rng, people, frames)):
+        if f % detect_every:
+            continue
+        dets = []
+        for i in rng.permutation(people):
+            if rng.random() < miss_prob:
+                continue
+            x, y = pos[i] + rng.normal(0, 2, 2)
+            dets.append((int(i), (float(x), float(y), float(size[i]), float(size[i] * 1.2))))
+        scene.append({'frame': f, 'dets': dets})
+    return scene
+
+
+class _AcceptAllVerifier:
+    """FaceMesh 없이 모든 후보를 통과시키는 검증기 (HeightTracker의 검증 경로는 그대로 탄다)"""
+    def cached(self, pid, bbox, frame_no):
+        return True
+
+    def remember(self, pid, bbox, ok, frame_no):
+        pass
+
+    def forget(self, pid):
+        pass
+
+    def verify_pending(self, frame_bgr, candidates):
+        return {key: True for key, _, _ in candidates}
+
+
+class _TimedAssociator:
+    """associate() 시간만 재는 래퍼"""
+    def __init__(self, associator):
+        self.associator = associator
+        self.elapsed = 0.0
+
+    def associate(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.associator.associate(*args, **kwargs)
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+
+def bench_association(args):
+    if args.load:
+        with open(args.load, encoding='utf-8') as f:
+            scene = json.load(f)
+    else:
+        scene = make_scene(np.random.default_rng(args.seed), args.people, args.frames,
+                           args.detect_every, args.miss_prob)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(scene, f)
+    print(f"{len(scene)} detection frames, "
+          f"{max((len(s['dets']) for s in scene), default=0)} max people")
+    print(f"{'associator':>10} {'id switches':>11} {'tracks':>7} {'match mean':>11} {'p95':>8}  (us)")
+    for name in args.associators:
+        # 실제 HeightTracker(칼만 추적)를 합성 검출로 돌린다. 검출 사이 프레임은 track()으로 넘긴다.
+        associator = _TimedAssociator(ASSOCIATORS[name]())
+        tracker = HeightTracker(associator, 'kalman', _AcceptAllVerifier())
+        last_id = {}
+        switches = 0
+        times = []
+        frame = -1
+        for step in scene:
+            while frame < step['frame'] - 1:
+                tracker.track(None)   # 칼만은 영상을 보지 않는다
+                frame += 1
+            boxes = [tuple(b) for _, b in step['dets']]
+            tracker.update(None, boxes)
+            frame += 1
+            times.append(associator.elapsed * 1e6)
+            # 매칭/신규 트랙의 bbox는 검출 튜플 객체 그대로다
+            assigned = {i: pid for pid, p in tracker.people.items() for i, b in enumerate(boxes) if p.bbox is b}
+            for i, (g, _) in enumerate(step['dets']):
+                if i not in assigned:
+                    continue
+                if g in last_id and last_id[g] != assigned[i]:
+                    switches += 1
+                last_id[g] = assigned[i]
+        t = np.array(times)
+        print(f"{name:>10} {switches:>11} {tracker.idgen.next_id:>7} {t.mean():>11.1f} {np.percentile(t, 95):>8.1f}")
+
+
+# --------- tracking: 백엔드별 프레임당 추적 시간 ----------
+def render(size, pos, img_w=1280, img_h=720):
+    """추적기가 따라갈 수 있게 사람마다 다른 무늬의 '얼굴'을 그린 합성 프레임"""
+    import cv2
+    frame = np.full((img_h, img_w, 3), 90, np.uint8)
+    for i, ((x, y), s) in enumerate(zip(pos, size)):
+        color = ((i * 67) % 255, (i * 131) % 255, (i * 29 + 80) % 255)
+        x, y, w, h = int(x), int(y), int(s), int(s * 1.2)
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+        cv2.circle(frame, (x + w // 3, y + h // 3), max(2, w // 8), (255, 255, 255), -1)
+        cv2.circle(frame, (x + 2 * w // 3, y + h // 3), max(2, w // 8), (0, 0, 0), -1)
+    return frame
+
+
+def bench_tracking(args):
+    print(f"{'people':>6} " + " ".join(f"{k + ' track':>12} {k + ' reseed':>13}" for k in args.trackers)
+          + "  (ms/frame)")
+    for n in args.people:
+        cols = []
+        for kind in args.trackers:
+            tracker = HeightTracker(tracker_kind=kind)
+            track_t, update_t = [], []
+            for f, (size, pos) in enumerate(walk(np.random.default_rng(args.seed), n, args.frames)):
+                frame = render(size, pos)
+                start = time.perf_counter()
+                if f % args.detect_every == 0:
+                    tracker.update(frame, [(int(x), int(y), int(s), int(s * 1.2)) for (x, y), s in zip(pos, size)])
+                    update_t.append(time.perf_counter() - start)
+                else:
+                    tracker.track(frame)
+                    track_t.append(time.perf_counter() - start)
+            cols.append(f"{np.mean(track_t) * 1000:>12.2f} {np.mean(update_t) * 1000:>13.2f}")
+        print(f"{n:>6} " + " ".join(cols))
+
+
+# --------- pose: 공유 Pose vs 사람별 ROI Pose (녹화 영상 필요) ----------
+def bench_pose(args):
+    """heights.json: {"영상파일이름": [왼쪽부터 실제 키(m), ...]}"""
+    import cv2
+    from camera_height_detection import FrameProcessor
+
+    with open(args.heights, encoding='utf-8') as f:
+        truth = json.load(f)
+    print(f"{'video':<20} {'people':>6} {'mode':<10} {'pose ms/frame':>13} {'runs/frame':>10} {'MAE cm':>7}")
+    for video in args.videos:
+        heights = truth[Path(video).name]
+        for mode in ('shared', 'per-person'):
+            processor = FrameProcessor(per_person_pose=(mode == 'per-person'))
+            cap = cv2.VideoCapture(video)
+            pose_t = []
+            last = {}  # pid -> (마지막 키, bbox 중심 x, 키가 나온 프레임 수)
+            idx = 0
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                boxes = [p.bbox for p in processor.tracker.people.values()]
+                faces = processor.detector.detect(frame, idx, boxes)
+                if faces is not None:
+                    processor.tracker.update(frame, *faces)
+                else:
+                    processor.tracker.track(frame)
+                start = time.perf_counter()
+                ankles = processor.ankles(frame, idx)
+                pose_t.append(time.perf_counter() - start)
+                for r in processor.tracker.estimate(ankles, frame.shape[0]):
+                    if r['height'] is not None:
+                        n = last[r['id']][2] + 1 if r['id'] in last else 1
+                        last[r['id']] = (r['height'], r['bbox'][0] + r['bbox'][2] / 2, n)
+                idx += 1
+            cap.release()
+            runs = processor.person_pose.runs / max(1, idx) if processor.person_pose else 1.0
+            processor.close()
+            # 가장 오래 잡힌 트랙 len(heights)개를 왼쪽부터 실제 키와 짝지음
+            longest = sorted(last.values(), key=lambda e: e[2], reverse=True)[:len(heights)]
+            est = sorted(longest, key=lambda e: e[1])
+            err = [abs(h - t) for (h, _, _), t in zip(est, heights)]
+            mae = np.mean(err) * 100 if err else float('nan')
+            print(f"{Path(video).name:<20} {len(heights):>6} {mode:<10} "
+                  f"{np.mean(pose_t) * 1000:>13.1f} {runs:>10.2f} {mae:>7.1f}")
+
+
+# --------- detection: 검출 일정별 비용과 recall (녹화 영상 필요) ----------
+def bench_detection(args):
+    """기준 = 매 프레임 원본 전체 검출(1차 필터만). 각 일정에서 추적 결과 박스가 기준 얼굴을 몇 % 덮는지."""
+    import cv2
+    from camera_height_detection import DetectionScheduler, HeightTracker, mp_face
+
+    reference = mp_face.FaceDetection(model_selection=1, min_detection_confidence=0.5)
+    print(f"{'video':<20} {'schedule':<8} {'detect ms/frame':>15} {'p95':>7} {'recall':>7}")
+    for video in args.videos:
+        for mode in args.schedules:
+            detector = DetectionScheduler(mode)
+            tracker = HeightTracker()
+            cap = cv2.VideoCapture(video)
+            det_t = []
+            hits = total = idx = 0
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                start = time.perf_counter()
+                faces = detector.detect(frame, idx, [p.bbox for p in tracker.people.values()])
+                det_t.append(time.perf_counter() - start)
+                if faces is not None:
+                    tracker.update(frame, *faces)
+                else:
+                    tracker.track(frame)
+                if idx % args.eval_every == 0:
+                    ref, _ = detect_faces(reference, frame, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                    boxes = [p.bbox for p in tracker.people.values()]
+                    if ref:
+                        total += len(ref)
+                        if boxes:
+                            hits += int((iou_matrix(ref, boxes).max(axis=1) >= 0.3).sum())
+                idx += 1
+            cap.release()
+            detector.close()
+            t = np.array(det_t) * 1000
+            recall = hits / total if total else float('nan')
+            print(f"{Path(video).name:<20} {mode:<8} {t.mean():>15.2f} {np.percentile(t, 95):>7.1f} "
+                  f"{recall:>7.3f}")
+    reference.close()
+
+
+# --------- convergence: 온라인 키 추정기 수렴 시간 ----------
+def bench_convergence(args):
+    """프레임마다 참값 + 잡음, 일정 확률로 잘못 잡힌 발목(다른 사람 발 등) 값을 넣는다.
+
+    예전 방식(최근 10개 평균)과 HeightEstimator의 표시값 오차, 수렴(고정)까지 걸린 프레임을 비교.
+    """
+    rng = np.random.default_rng(args.seed)
+    old_bad, new_bad, freeze_at, final_err, update_us = [], [], [], [], []
+    for _ in range(args.tracks):
+        truth = rng.uniform(1.5, 1.9)
+        samples = truth + rng.normal(0, args.noise, args.frames)
+        wrong = rng.random(args.frames) < args.outliers
+        samples[wrong] += rng.choice([-1, 1], wrong.sum()) * rng.uniform(0.15, 0.5, wrong.sum())
+
+        window = deque(maxlen=10)
+        est = HeightEstimator()
+        old_err, new_err = [], []
+        frozen_at = None
+        start = time.perf_counter()
+        for f, x in enumerate(samples):
+            est.update(float(x))
+            if est.frozen and frozen_at is None:
+                frozen_at = f + 1
+            new_err.append(abs(est.value - truth))
+        update_us.append((time.perf_counter() - start) / args.frames * 1e6)
+        for x in samples:
+            window.append(x)
+            old_err.append(abs(sum(window) / len(window) - truth))
+        # 초기 10프레임 이후 표시값이 tol을 넘은 비율
+        old_bad.append(np.mean(np.array(old_err[10:]) > args.tol))
+        new_bad.append(np.mean(np.array(new_err[10:]) > args.tol))
+        freeze_at.append(frozen_at if frozen_at is not None else np.nan)
+        final_err.append(new_err[-1])
+
+    f = np.array(freeze_at)
+    converged = ~np.isnan(f)
+    print(f"{args.tracks} tracks, noise {args.noise * 100:.0f} cm, outliers {args.outliers:.0%}")
+    print(f"frames over {args.tol * 100:.0f} cm error after frame 10: "
+          f"mean of 10 = {np.mean(old_bad):.1%}, estimator = {np.mean(new_bad):.1%}")
+    if converged.any():
+        print(f"frames to freeze: median {np.median(f[converged]):.0f}, "
+              f"p95 {np.percentile(f[converged], 95):.0f}, never {np.mean(~converged):.1%}")
+    print(f"frozen value error: mean {np.mean(final_err) * 100:.2f} cm, "
+          f"p95 {np.percentile(final_err, 95) * 100:.2f} cm, update {np.mean(update_us):.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Height-tracking micro benchmarks")
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('geometry', help="스칼라 vs NumPy 배치 키/거리/IoU 계산")
+    p.add_argument('--people', type=int, nargs='+', default=[1, 2, 5, 10, 20, 50])
+    p.add_argument('--repeat', type=int, default=2000)
+    p.set_defaults(func=bench_geometry)
+
+    p = sub.add_parser('association', help="트랙-검출 매칭: ID 스위치 수와 매칭 시간")
+    p.add_argument('--people', type=int, default=10)
+    p.add_argument('--frames', type=int, default=3000)
+    p.add_argument('--detect-every', type=int, default=DETECT_EVERY_N_FRAMES)
+    p.add_argument('--miss-prob', type=float, default=0.1, help="검출 누락 확률")
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--associators', nargs='+', choices=sorted(ASSOCIATORS),
+                   default=['greedy', 'hungarian'])
+    p.add_argument('--save', help="생성한 장면을 JSON으로 저장 (재생용)")
+    p.add_argument('--load', help="저장된 장면 JSON을 재생")
+    p.set_defaults(func=bench_association)
+
+    p = sub.add_parser('tracking', help="추적 백엔드별 프레임당 추적/재설정 시간")
+    p.add_argument('--people', type=int, nargs='+', default=[1, 2, 5, 10, 20])
+    p.add_argument('--trackers', nargs='+', choices=TRACKERS, default=['kalman', 'csrt', 'kcf'])
+    p.add_argument('--frames', type=int, default=150)
+    p.add_argument('--detect-every', type=int, default=DETECT_EVERY_N_FRAMES)
+    p.add_argument('--seed', type=int, default=0)
+    p.set_defaults(func=bench_tracking)
+
+    p = sub.add_parser('pose', help="공유 Pose vs 사람별 ROI Pose: 키 오차와 프레임당 비용")
+    p.add_argument('--videos', nargs='+', required=True, help="인원수가 다른 녹화 영상들")
+    p.add_argument('--heights', required=True,
+                   help='실제 키 JSON {"영상파일이름": [왼쪽부터 키(m), ...]}')
+    p.set_defaults(func=bench_pose)
+
+    p = sub.add_parser('detection', help="검출 일정(full vs roi)별 프레임당 검출 비용과 recall")
+    p.add_argument('--videos', nargs='+', required=True)
+    p.add_argument('--schedules', nargs='+', choices=('full', 'roi'), default=['full', 'roi'])
+    p.add_argument('--eval-every', type=int, default=3, help="기준 검출을 돌릴 프레임 간격")
+    p.set_defaults(func=bench_detection)
+
+    p = sub.add_parser('convergence', help="온라인 키 추정기의 수렴 시간/오차 (합성 측정값)")
+    p.add_argument('--tracks', type=int, default=500)
+    p.add_argument('--frames', type=int, default=300)
+    p.add_argument('--noise', type=float, default=0.03, help="측정 잡음 표준편차 (m)")
+    p.add_argument('--outliers', type=float, default=0.1, help="잘못된 발목 비율")
+    p.add_argument('--tol', type=float, default=0.03, help="허용 오차 (m)")
+    p.add_argument('--seed', type=int, default=0)
+    p.set_defaults(func=bench_convergence)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
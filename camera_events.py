@@ -0,0 +1,124 @@
+# camera_events.py
+# 트랙별 결과(id, bbox, 키, 신뢰도)를 로컬 웹소켓으로 내보낸다. 키오스크 페이지(static/age_detection.js)가
+# 이걸 받으면 브라우저에서 카메라/face-api 추론을 돌리지 않는다.
+#
+# 메시지 (JSON, 키는 짧게):
+#   {"t": "s", "seq": 12, "tracks": [{"id": 3, "b": [x, y, w, h], "h": 1.72, "c": 0.85, "f": 1}, ...]}
+#       접속 직후 한 번 보내는 전체 스냅샷
+#   {"t": "d", "seq": 13, "u": [{"id": 3, "h": 1.73}, ...], "r": [5]}
+#       직전 메시지 대비 바뀐 필드만(u, 새 트랙은 전체 필드) + 사라진 트랙 id(r)
+# b: bbox(px), h: 키(m, 없으면 null), c: 신뢰도(0..1), f: 키 고정(수렴) 여부
+#
+# publish()는 처리 스레드에서 매 프레임 불러도 되고, 실제 전송은 max_rate_hz로 제한되며
+# 바뀐 게 없으면 아무것도 보내지 않는다.
+import asyncio
+import json
+import threading
+
+import websockets
+
+BBOX_STEP = 4      # bbox는 이 픽셀 단위로 양자화 (작은 흔들림은 diff에서 제외)
+CONF_STEP = 0.05
+
+
+def encode_track(r):
+    """FrameProcessor/HeightTracker 결과 dict -> 전송용 compact dict"""
+    return {'id': r['id'],
+            'b': [int(v) // BBOX_STEP * BBOX_STEP for v in r['bbox']],
+            'h': None if r['height'] is None else round(r['height'], 2),
+            'c': round(round(r['confidence'] / CONF_STEP) * CONF_STEP, 2),
+            'f': int(r['frozen'])}
+
+
+def diff_tracks(old, new):
+    """{id: track} 두 상태 -> (바뀐 필드 리스트, 사라진 id 리스트)"""
+    updates = []
+    for tid, track in new.items():
+        prev = old.get(tid)
+        if prev is None:
+            updates.append(track)
+            continue
+        changed = {k: v for k, v in track.items() if k != 'id' and prev.get(k) != v}
+        if changed:
+            updates.append({'id': tid, **changed})
+    return updates, [tid for tid in old if tid not in new]
+
+
+class TrackEventPublisher:
+    def __init__(self, host='127.0.0.1', port=8765, max_rate_hz=5.0):
+        self.host = host
+        self.port = port
+        self.interval = 1.0 / max_rate_hz
+        self.sent_messages = 0
+        self._lock = threading.Lock()
+        self._latest = {}      # 처리 스레드가 올린 최신 상태
+        self._dirty = False
+        self._sent = {}        # 클라이언트들에게 마지막으로 보낸 상태
+        self._seq = 0
+        self._clients = set()
+        self._loop = None
+        self._stop = None
+        self._thread = None
+
+    def publish(self, results):
+        """스레드 안전. 최신 결과만 남긴다."""
+        state = {r['id']: encode_track(r) for r in results}
+        with self._lock:
+            self._latest = state
+            self._dirty = True
+
+    def start(self):
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="track-events", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def _run(self, ready):
+        asyncio.run(self._main(ready))
+
+    async def _main(self, ready):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        async with websockets.serve(self._handler, self.host, self.port):
+            ready.set()
+            while not self._stop.is_set():
+                self._flush()
+                try:
+                    await asyncio.wait_for(self._stop.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _handler(self, websocket):
+        # 스냅샷 전송과 등록 사이에 await가 없어서, 이후 diff는 항상 이 스냅샷 기준이다
+        snapshot = json.dumps({'t': 's', 'seq': self._seq, 'tracks': list(self._sent.values())},
+                              separators=(',', ':'))
+        websockets.broadcast([websocket], snapshot)
+        self._clients.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self._clients.discard(websocket)
+
+    def _flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            state, self._dirty = self._latest, False
+        updates, removed = diff_tracks(self._sent, state)
+        self._sent = state
+        if not updates and not removed:
+            return
+        self._seq += 1
+        if self._clients:
+            msg = {'t': 'd', 'seq': self._seq, 'u': updates}
+            if removed:
+                msg['r'] = removed
+            websockets.broadcast(self._clients, json.dumps(msg, separators=(',', ':')))
+            self.sent_messages += 1
@@ -0,0 +1,96 @@
+# camera_geometry.py
+# 키/거리 추정과 박스 매칭에 쓰는 기하 계산 (NumPy 배치 버전 + 스칼라 래퍼).
+# 배치 함수는 N명분 픽셀/박스를 한 번에 계산한다. 계산이 안 되는 항목은 NaN.
+# camera_height_detection.py와 camera_association.py가 같이 쓴다 (서로를 import하지 않도록 분리).
+import numpy as np
+
+
+def rays_from_pixels(u, v, fx, fy, cx, cy):
+    """픽셀 (u, v) 배열 -> 카메라 좌표계 광선 방향 (N, 3)"""
+    u = np.asarray(u, dtype=float)
+    v = np.asarray(v, dtype=float)
+    return np.stack([(u - cx) / fx, (v - cy) / fy, np.ones_like(u)], axis=-1)
+
+def distances_to_ground(u, v, fx, fy, cx, cy, H_cam):
+    """발 픽셀 배열 -> 지면까지 거리 D 배열"""
+    d = rays_from_pixels(u, v, fx, fy, cx, cy)
+    d_y = d[..., 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = -H_cam / d_y
+    valid = (np.abs(d_y) >= 1e-8) & (t > 0)
+    return np.where(valid, t * d[..., 2], np.nan)
+
+def estimate_heights_from_pixels(v_head, v_foot, fx, fy, cx, cy, H_cam, u_foot=None):
+    """머리/발 픽셀 배열 -> (키 H 배열, 거리 D 배열)"""
+    v_head = np.asarray(v_head, dtype=float)
+    v_foot = np.asarray(v_foot, dtype=float)
+    if u_foot is None:
+        u_foot = np.full_like(v_foot, cx)
+    h_px = v_foot - v_head
+    D = distances_to_ground(u_foot, v_foot, fx, fy, cx, cy, H_cam)
+    D = np.where(h_px > 0, D, np.nan)
+    return h_px * D / fy, D
+
+def iou_matrix(boxes_a, boxes_b):
+    """(x,y,w,h) 박스 목록 두 개 -> IoU 행렬 (len(a), len(b))"""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum((a[:, 0] + a[:, 2])[:, None], (b[:, 0] + b[:, 2])[None, :])
+    y2 = np.minimum((a[:, 1] + a[:, 3])[:, None], (b[:, 1] + b[:, 3])[None, :])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(inter > 0, inter / union, 0.0)
+
+# 스칼라 래퍼: 1~2명이 보통이라 한 명분은 NumPy 배열을 만들지 않고 순수 파이썬으로 계산한다
+# (배치 함수와 같은 결과, camera_bench.py geometry에서 확인)
+
+def ray_from_pixel(u, v, fx, fy, cx, cy):
+    return np.array([(u - cx) / fx, (v - cy) / fy, 1.0])
+
+def distance_to_ground_from_pixel(u, v, fx, fy, cx, cy, H_cam):
+    d_y = (v - cy) / fy
+    if abs(d_y) < 1e-8:
+        return None
+    t = -H_cam / d_y
+    if t <= 0:
+        return None
+    return t  # 광선의 z 성분이 1
+
+def estimate_height_from_pixels(v_head, v_foot, fx, fy, cx, cy, H_cam, u_foot=None):
+    h_px = v_foot - v_head
+    if h_px <= 0:
+        return None
+    D = distance_to_ground_from_pixel(cx if u_foot is None else u_foot, v_foot, fx, fy, cx, cy, H_cam)
+    if D is None:
+        return None
+    return h_px * D / fy, D
+
+def bbox_bottom_center(bbox):
+    x, y, w, h = bbox
+    u = int(x + w/2)
+    v = int(y + h)
+    return u, v
+
+def iou(boxA, boxB):
+    xA, yA, wA, hA = boxA
+    xB, yB, wB, hB = boxB
+    x1 = max(xA, xB)
+    y1 = max(yA, yB)
+    x2 = min(xA + wA, xB + wB)
+    y2 = min(yA + hA, yB + hB)
+    if x2 <= x1 or y2 <= y1:
+        return 0.0
+    inter = (x2 - x1) * (y2 - y1)
+    return inter / (wA * hA + wB * hB - inter)
+
+def expand_clip_roi(x, y, w, h, img_w, img_h, pad_ratio):
+    pad_w = int(w * pad_ratio)
+    pad_h = int(h * pad_ratio)
+    nx = max(0, x - pad_w)
+    ny = max(0, y - pad_h)
+    nw = min(img_w - nx, w + 2*pad_w)
+    nh = min(img_h - ny, h + 2*pad_h)
+    return nx, ny, nw, nh
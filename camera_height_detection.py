@@ -4,7 +4,13 @@ import cv2
 import numpy as np
 import mediapipe as mp
 import time
-from collections import deque
+import math
+
+from camera_association import HungarianAssociator
+from camera_geometry import (
+    bbox_bottom_center, estimate_height_from_pixels, estimate_heights_from_pixels, expand_clip_roi, iou_matrix,
+)
+from camera_tracking import create_tracker
 
 # --------- 사용자/카메라 정보 (필수 입력) ----------
 FX = 1200.0
@@ -15,14 +21,36 @@ CY = 360.0
 H_CAM = 1.5
 
 DETECT_EVERY_N_FRAMES = 5
+DETECTION_SCHEDULE = 'roi'    # 'roi': 가끔 축소 전체 검출 + 트랙 주변 ROI 검출, 'full': 매번 원본 전체 검출
+FULL_DETECT_EVERY_N_FRAMES = 30
+FULL_DETECT_SCALE = 0.5       # 전체 프레임 검출 시 축소 비율
+TRACK_ROI_PADDING = 0.6       # 트랙 주변 검색 ROI 확장 비율 (얼굴 크기 대비, 각 방향)
 MAX_INACTIVE_FRAMES = 30
+TRACKER_BACKEND = 'kalman'    # 검출 사이 추적: 'kalman' | 'csrt' | 'kcf' | 'mosse' (camera_tracking.py)
+GEOMETRY_BATCH_MIN = 32       # 키 계산할 트랙이 이 이상일 때만 NumPy 배치 (camera_bench.py geometry 기준)
 # 얼굴 검증 관련 하이퍼파라미터(필요시 조정)
 FACE_SCORE_TH = 0.9        # FaceDetection 신뢰도 임계값
 MIN_FACE_SIZE = 40            # w,h 최소 픽셀 크기
 VERIFY_WITH_FACEMESH = True   # Face Mesh로 2차 검증 사용할지
-VERIFY_EVERY_N_DETECTIONS = 1 # 검출 프레임마다(=1) 검증. 더 키우면 빨라지고 엄격도는 약간 감소.
+VERIFY_CACHE_FRAMES = 150     # 확인된 트랙은 이 프레임 수 동안 다시 검증하지 않음
+VERIFY_SIZE_CHANGE = 0.5      # 박스 크기(면적 제곱근)가 이 비율 이상 바뀌면 재검증
+VERIFY_BUDGET_MS = 15.0       # 프레임당 FaceMesh 검증 시간 예산
 FACEMESH_MIN_LANDMARKS = 200  # Face Mesh가 이 이상 랜드마크(468 중)를 잡아야 진짜 얼굴로 인정
 ROI_PADDING_RATIO = 0.15      # 검증용 ROI 확장 비율
+# 트랙별 온라인 키 추정(HeightEstimator) 관련
+HEIGHT_WARMUP = 5             # 처음 이만큼은 모아서 중앙값/MAD로 초기값
+HEIGHT_HUBER_K = 1.5          # 잔차를 스케일의 이 배수에서 자름 (Huber)
+HEIGHT_OUTLIER_K = 4.0        # 스케일의 이 배수를 넘는 값은 버림 (잘못 잡힌 발목 등)
+HEIGHT_ALPHA_MIN = 0.05       # 평균 갱신률 하한 (유효 표본 약 40개)
+HEIGHT_MIN_SCALE = 0.005      # 잔차 스케일 하한 (m)
+HEIGHT_MIN_SAMPLES = 15       # 수렴 판정 전 최소 반영 표본 수
+HEIGHT_CONVERGED_STD = 0.01   # 추정 표준오차가 이 값(m) 미만이면 수렴 -> 고정(freeze)
+# 사람별 Pose(얼굴 아래 몸 ROI) 관련
+PER_PERSON_POSE = True        # False면 예전처럼 전체 프레임 Pose 1명분 발목을 모든 트랙이 공유
+POSE_ROI_WIDTH = 3.0          # 몸 ROI 폭 = 얼굴 폭 x 이 값 (얼굴 위쪽부터 화면 아래 끝까지)
+POSE_MOVE_RATIO = 0.25        # 얼굴 박스가 얼굴 크기의 이 비율 이상 움직였을 때만 Pose 재실행
+POSE_MAX_AGE = 15             # 움직임이 없어도 이 프레임 수가 지나면 재실행
+POSE_MAX_PER_FRAME = 4        # 한 프레임에 돌리는 최대 ROI 수 (오래된 것부터)
 # ----------------------------------------------------
 
 mp_face = mp.solutions.face_detection
@@ -37,93 +65,114 @@ class IDGenerator:
         self.next_id += 1
         return i
 
+class HeightEstimator:
+    """트랙별 온라인 키 추정. 갱신은 O(1).
+
+    초기 HEIGHT_WARMUP개의 중앙값/MAD로 시작해, 이후에는 스케일의 HEIGHT_OUTLIER_K배를 넘는 값은
+    버리고 나머지는 Huber로 잘라 평균/스케일을 갱신한다. 표준오차가 HEIGHT_CONVERGED_STD 아래로
+    내려가면 frozen이 되어 더 이상 값을 받지 않는다(그 트랙은 Pose/키 계산도 생략).
+    """
+    def __init__(self):
+        self.mean = None
+        self.scale = None
+        self.used = 0
+        self.rejected = 0
+        self.frozen = False
+        self._warmup = []
+
+    def update(self, x):
+        if self.frozen:
+            return
+        if self.mean is None:
+            self._warmup.append(x)
+            if len(self._warmup) >= HEIGHT_WARMUP:
+                w = sorted(self._warmup)
+                med = w[len(w)//2]
+                mad = sorted(abs(v - med) for v in w)[len(w)//2]
+                self.mean = med
+                self.scale = max(1.4826 * mad, HEIGHT_MIN_SCALE)
+                self.used = len(w)
+                self._warmup = None
+            return
+        r = x - self.mean
+        if abs(r) > HEIGHT_OUTLIER_K * self.scale:
+            self.rejected += 1
+            # 계속 버려지면 게이트를 넓혀 실제로 바뀐 값에도 다시 따라가게 한다
+            self.scale *= 1.1
+            return
+        c = HEIGHT_HUBER_K * self.scale
+        psi = max(-c, min(c, r))
+        self.used += 1
+        self.mean += max(1.0 / self.used, HEIGHT_ALPHA_MIN) * psi
+        # 정규분포에서 sigma ~= 1.2533 * E|r|
+        self.scale = max(HEIGHT_MIN_SCALE, self.scale + 0.1 * (1.2533 * abs(psi) - self.scale))
+        if self.used >= HEIGHT_MIN_SAMPLES and self.std < HEIGHT_CONVERGED_STD:
+            self.frozen = True
+
+    @property
+    def value(self):
+        if self.mean is not None:
+            return self.mean
+        if self._warmup:
+            return sorted(self._warmup)[len(self._warmup)//2]
+        return None
+
+    @property
+    def std(self):
+        """평균의 표준오차(m). 초기화 전에는 None."""
+        if self.mean is None:
+            return None
+        n_eff = min(self.used, (2 - HEIGHT_ALPHA_MIN) / HEIGHT_ALPHA_MIN)
+        return self.scale / math.sqrt(n_eff)
+
+    @property
+    def confidence(self):
+        """0..1, 수렴 기준 표준오차에 도달하면 1"""
+        std = self.std
+        if std is None:
+            return 0.0
+        return min(1.0, HEIGHT_CONVERGED_STD / std)
+
 class PersonState:
     def __init__(self, tracker, bbox, person_id):
         self.tracker = tracker
         self.bbox = bbox  # (x,y,w,h)
         self.id = person_id
         self.frames_missing = 0
-        self.heights = deque(maxlen=10)
-
-def ray_from_pixel(u, v, fx, fy, cx, cy):
-    dx = (u - cx) / fx
-    dy = (v - cy) / fy
-    dz = 1.0
-    return np.array([dx, dy, dz], dtype=float)
-
-def distance_to_ground_from_pixel(u, v, fx, fy, cx, cy, H_cam):
-    d = ray_from_pixel(u, v, fx, fy, cx, cy)
-    d_y = d[1]
-    if abs(d_y) < 1e-8:
-        return None
-    t = -H_cam / d_y
-    if t <= 0:
-        return None
-    D = t * d[2]
-    return D
+        self.height = HeightEstimator()
+        self.last = None            # 고정된 뒤 그대로 보여줄 마지막 (D, foot, ankle_source)
+        self.velocity = (0.0, 0.0)  # 프레임당 bbox 이동 (dx, dy), 매칭 예측에 사용
+        self.bbox_frame = 0         # bbox가 마지막으로 갱신된 프레임 번호
 
-def estimate_height_from_pixels(v_head, v_foot, fx, fy, cx, cy, H_cam, u_foot=None):
-    h_px = (v_foot - v_head)
-    if h_px <= 0:
-        return None
-    if u_foot is None:
-        u_foot = cx
-    D = distance_to_ground_from_pixel(u_foot, v_foot, fx, fy, cx, cy, H_cam)
-    if D is None:
-        return None
-    H = (h_px * D) / fy
-    return H, D
-
-def bbox_bottom_center(bbox):
-    x, y, w, h = bbox
-    u = int(x + w/2)
-    v = int(y + h)
-    return u, v
-
-def iou(boxA, boxB):
-    (xA,yA,wA,hA) = boxA
-    (xB,yB,wB,hB) = boxB
-    x1 = max(xA, xB)
-    y1 = max(yA, yB)
-    x2 = min(xA+wA, xB+wB)
-    y2 = min(yA+hA, yB+hB)
-    if x2 <= x1 or y2 <= y1:
-        return 0.0
-    inter = (x2-x1)*(y2-y1)
-    union = wA*hA + wB*hB - inter
-    return inter/union
-
-def expand_clip_roi(x, y, w, h, img_w, img_h, pad_ratio):
-    pad_w = int(w * pad_ratio)
-    pad_h = int(h * pad_ratio)
-    nx = max(0, x - pad_w)
-    ny = max(0, y - pad_h)
-    nw = min(img_w - nx, w + 2*pad_w)
-    nh = min(img_h - ny, h + 2*pad_h)
-    return nx, ny, nw, nh
+def passes_basic_filters(score, w, h):
+    """FaceDetection 1차 필터: 점수/크기/종횡비"""
+    if score < FACE_SCORE_TH:
+        return False
+    if w < MIN_FACE_SIZE or h < MIN_FACE_SIZE:
+        return False
+    # 가로세로 비정상 비율 제거(너무 납작/긴 박스)
+    ar = h / max(1, w)
+    if ar < 0.8 or ar > 2.2:
+        return False
+    return True
 
 class FaceVerifier:
-    """FaceDetection 1차 필터 + FaceMesh 2차 검증"""
+    """FaceMesh 2차 검증 + 트랙 id별 결과 캐시.
+
+    확인된 트랙은 VERIFY_CACHE_FRAMES 동안, 또는 박스 크기가 VERIFY_SIZE_CHANGE 이상 바뀔 때까지
+    다시 검증하지 않는다. 새 후보(와 만료된 트랙)는 모아서 점수 순으로 검증하되 프레임당
+    VERIFY_BUDGET_MS 안에서만 하고, 못 한 것은 다음 검출 때로 미룬다.
+    """
     def __init__(self):
+        # 서로 다른 사람의 ROI를 번갈아 넣으므로 프레임 간 추적 없는 정적 이미지 모드
         self.mesh = mp_mesh.FaceMesh(
-            static_image_mode=False,
+            static_image_mode=True,
             max_num_faces=1,
             refine_landmarks=False,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
+            min_detection_confidence=0.5
         )
-        self.detect_counter = 0
-
-    def passes_basic_filters(self, score, w, h):
-        if score < FACE_SCORE_TH:
-            return False
-        if w < MIN_FACE_SIZE or h < MIN_FACE_SIZE:
-            return False
-        # 가로세로 비정상 비율 제거(너무 납작/긴 박스)
-        ar = h / max(1, w)
-        if ar < 0.8 or ar > 2.2:
-            return False
-        return True
+        self.cache = {}  # pid -> (검증 결과, 검증한 프레임, 박스 크기)
+        self.runs = 0
 
     def verify_with_facemesh(self, frame_bgr, bbox):
         x,y,w,h = bbox
@@ -134,157 +183,482 @@ class FaceVerifier:
             return False
         rgb = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
         res = self.mesh.process(rgb)
+        self.runs += 1
         if not res.multi_face_landmarks:
             return False
         # 랜드마크 개수로 검증(보통 468개)
         n_lm = len(res.multi_face_landmarks[0].landmark)
         return n_lm >= FACEMESH_MIN_LANDMARKS
 
-    def is_human_face(self, frame_bgr, bbox, score):
-        # 1) 점수/크기/종횡비
-        x,y,w,h = bbox
-        if not self.passes_basic_filters(score, w, h):
-            return False
-        # 2) Facemesh는 간헐적으로만(성능 튜닝)
-        self.detect_counter += 1
+    def cached(self, pid, bbox, frame_no):
+        """트랙의 캐시된 검증 결과. 없거나 만료됐으면 None."""
         if not VERIFY_WITH_FACEMESH:
             return True
-        if (self.detect_counter % VERIFY_EVERY_N_DETECTIONS) != 0:
+        entry = self.cache.get(pid)
+        if entry is None:
+            return None
+        ok, f, size = entry
+        new_size = (bbox[2] * bbox[3]) ** 0.5
+        if frame_no - f > VERIFY_CACHE_FRAMES or abs(new_size - size) > VERIFY_SIZE_CHANGE * size:
+            return None
+        return ok
+
+    def remember(self, pid, bbox, ok, frame_no):
+        self.cache[pid] = (ok, frame_no, (bbox[2] * bbox[3]) ** 0.5)
+
+    def forget(self, pid):
+        self.cache.pop(pid, None)
+
+    def verify_pending(self, frame_bgr, candidates):
+        """candidates: [(key, bbox, score)] -> {key: bool}. 예산을 넘기면 남은 후보는 결과 없음."""
+        if not VERIFY_WITH_FACEMESH:
+            return {key: True for key, _, _ in candidates}
+        results = {}
+        start = time.perf_counter()
+        for key, bbox, _ in sorted(candidates, key=lambda c: -c[2]):
+            # 최소 1개는 검증해야 예산이 FaceMesh 1회보다 작아도 진행된다
+            if results and (time.perf_counter() - start) * 1000 > VERIFY_BUDGET_MS:
+                break
+            results[key] = self.verify_with_facemesh(frame_bgr, bbox)
+        return results
+
+    def close(self):
+        self.mesh.close()
+
+def detect_ankles(pose_detector, rgb, img_w, img_h):
+    """Pose 랜드마크 31/32(발끝)를 픽셀 좌표로 반환"""
+    pose_res = pose_detector.process(rgb)
+    if not pose_res.pose_landmarks:
+        return None
+    lm = pose_res.pose_landmarks.landmark
+    left_ankle_v = lm[31].y * img_h
+    right_ankle_v = lm[32].y * img_h
+    left_ankle_u = lm[31].x * img_w
+    right_ankle_u = lm[32].x * img_w
+    return {'left': (left_ankle_u, left_ankle_v),
+            'right': (right_ankle_u, right_ankle_v)}
+
+def body_roi(bbox, img_w, img_h):
+    """얼굴 bbox 아래 몸 전체를 덮는 ROI (x,y,w,h)"""
+    x,y,w,h = [int(v) for v in bbox]
+    half = int(w * POSE_ROI_WIDTH / 2)
+    cx = x + w//2
+    nx = max(0, cx - half)
+    ny = max(0, y - h//2)
+    return nx, ny, min(img_w, cx + half) - nx, img_h - ny
+
+class PersonPoseEstimator:
+    """트랙마다 얼굴 아래 몸 ROI에서 Pose를 돌려 트랙별 발목을 구한다.
+
+    MediaPipe Pose는 이미지당 1명만 찾으므로 ROI를 잘라 한 명씩 넣는다. 이번 프레임에 필요한 ROI를
+    모아 정적 이미지 모드 Pose 하나로 연달아 처리하고(배치), 박스가 거의 안 움직인 트랙은
+    지난 결과를 박스 이동량만큼 옮겨 재사용한다.
+    """
+    def __init__(self):
+        self.pose = mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5)
+        self.cache = {}  # pid -> (pose 당시 bbox, 발목 dict 또는 None, frame_idx)
+        self.runs = 0
+
+    def _stale(self, pid, bbox, frame_idx):
+        if pid not in self.cache:
             return True
-        return self.verify_with_facemesh(frame_bgr, bbox)
+        old, _, f = self.cache[pid]
+        moved = max(abs(bbox[0] - old[0]), abs(bbox[1] - old[1]), abs(bbox[2] - old[2]))
+        return moved > POSE_MOVE_RATIO * max(1, old[2]) or frame_idx - f >= POSE_MAX_AGE
 
-def main():
-    cap = cv2.VideoCapture(0)
-    idgen = IDGenerator()
-    people = dict()
+    def update(self, frame_idx, frame, tracks):
+        """frame(BGR), tracks: [(pid, bbox)] -> {pid: {'left': (u,v), 'right': (u,v)}}"""
+        img_h, img_w = frame.shape[:2]
+        live = {pid for pid, _ in tracks}
+        for pid in [p for p in self.cache if p not in live]:
+            del self.cache[pid]
 
-    face_detector = mp_face.FaceDetection(model_selection=1, min_detection_confidence=0.5)
-    pose_detector = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-    verifier = FaceVerifier()
+        stale = [(pid, bbox) for pid, bbox in tracks if self._stale(pid, bbox, frame_idx)]
+        # 처음 보는 트랙, 그다음 오래된 결과 순으로 POSE_MAX_PER_FRAME개만
+        stale.sort(key=lambda t: self.cache[t[0]][2] if t[0] in self.cache else -1)
+        for pid, bbox in stale[:POSE_MAX_PER_FRAME]:
+            rx, ry, rw, rh = body_roi(bbox, img_w, img_h)
+            ankles = None
+            if rw > 0 and rh > 0:
+                crop = cv2.cvtColor(frame[ry:ry+rh, rx:rx+rw], cv2.COLOR_BGR2RGB)  # ROI만 색 변환
+                local = detect_ankles(self.pose, crop, rw, rh)
+                self.runs += 1
+                if local:
+                    ankles = {k: (u + rx, v + ry) for k, (u, v) in local.items()}
+            self.cache[pid] = (tuple(bbox), ankles, frame_idx)
 
-    frame_idx = 0
-    fps_time = time.time()
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+        out = {}
+        for pid, bbox in tracks:
+            if pid not in self.cache:
+                continue
+            old, ankles, _ = self.cache[pid]
+            if ankles:
+                du = bbox[0] + bbox[2]/2 - old[0] - old[2]/2
+                dv = bbox[1] - old[1]
+                out[pid] = {k: (u + du, v + dv) for k, (u, v) in ankles.items()}
+        return out
+
+    def reset(self):
+        self.cache.clear()
+
+    def close(self):
+        self.pose.close()
+
+def detect_faces(face_detector, frame, rgb, region=None):
+    """rgb는 frame의 region(x,y,w,h) 부분 이미지(축소본도 가능, 기본 전체). bbox는 전체 frame 좌표.
+
+    여기서는 1차 필터만 한다. FaceMesh 검증은 트랙 매칭 후 HeightTracker에서(캐시 사용).
+    """
+    img_h, img_w = frame.shape[:2]
+    ox, oy, rw, rh = region if region else (0, 0, img_w, img_h)
+    faces_bboxes = []
+    faces_scores = []
+    face_res = face_detector.process(rgb)
+    if face_res.detections:
+        for det in face_res.detections:
+            r = det.location_data.relative_bounding_box
+            score = float(det.score[0]) if det.score else 0.0
+            x = int(max(0, ox + r.xmin * rw))
+            y = int(max(0, oy + r.ymin * rh))
+            w = int(r.width * rw)
+            h = int(r.height * rh)
+            if x+w > img_w: w = img_w - x
+            if y+h > img_h: h = img_h - y
+            if passes_basic_filters(score, w, h):
+                faces_bboxes.append((x,y,w,h))
+                faces_scores.append(score)
+    return faces_bboxes, faces_scores
+
+class DetectionScheduler:
+    """얼굴 검출 일정.
+
+    'roi'  : FULL_DETECT_EVERY_N_FRAMES마다(또는 트랙이 없을 때) 축소한 전체 프레임에서 새 얼굴을 찾고,
+             그 사이 DETECT_EVERY_N_FRAMES마다 기존 트랙 주변 확장 ROI만 검출한다.
+             색 변환도 축소 프레임/ROI 단위로만 한다.
+    'full' : 예전 방식. DETECT_EVERY_N_FRAMES마다 원본 전체 프레임.
+    detect()는 이번 프레임에 검출을 안 하면 None, 하면 (bboxes, scores)를 반환한다.
+    """
+    def __init__(self, mode=DETECTION_SCHEDULE):
+        self.mode = mode
+        self.full_detector = mp_face.FaceDetection(model_selection=1, min_detection_confidence=0.5)
+        # ROI 안 얼굴은 크게 잡히므로 근거리 모델
+        self.roi_detector = mp_face.FaceDetection(model_selection=0, min_detection_confidence=0.5)
+        self.reset()
+
+    def reset(self):
+        self.last_full = None
+        self.last_detect = None
+
+    def detect(self, frame, frame_idx, track_boxes):
+        # 프레임 번호 차이로 판단: 파이프라인 워커처럼 프레임을 건너뛰어도 주기가 유지된다
+        if self.last_detect is not None and frame_idx - self.last_detect < DETECT_EVERY_N_FRAMES:
+            return None
+        self.last_detect = frame_idx
+        if self.mode == 'full':
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            return detect_faces(self.full_detector, frame, rgb)
+
+        if (not track_boxes or self.last_full is None
+                or frame_idx - self.last_full >= FULL_DETECT_EVERY_N_FRAMES):
+            self.last_full = frame_idx
+            return self._detect_full(frame)
+        return self._detect_rois(frame, track_boxes)
+
+    def _detect_full(self, frame):
+        small = cv2.resize(frame, None, fx=FULL_DETECT_SCALE, fy=FULL_DETECT_SCALE,
+                           interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        return detect_faces(self.full_detector, frame, rgb)
+
+    def _detect_rois(self, frame, track_boxes):
         img_h, img_w = frame.shape[:2]
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        bboxes, scores = [], []
+        for x,y,w,h in track_boxes:
+            region = expand_clip_roi(int(x), int(y), int(w), int(h), img_w, img_h, TRACK_ROI_PADDING)
+            rx, ry, rw, rh = region
+            if rw <= 0 or rh <= 0:
+                continue
+            rgb = cv2.cvtColor(frame[ry:ry+rh, rx:rx+rw], cv2.COLOR_BGR2RGB)
+            b, sc = detect_faces(self.roi_detector, frame, rgb, region)
+            bboxes += b
+            scores += sc
+        # 겹친 ROI에서 같은 얼굴이 두 번 나오면 점수가 높은 것만
+        keep = []
+        ious = iou_matrix(bboxes, bboxes)
+        for i in np.argsort(scores)[::-1]:
+            if all(ious[i, k] < 0.5 for k in keep):
+                keep.append(i)
+        keep.sort()
+        return [bboxes[i] for i in keep], [scores[i] for i in keep]
 
-        # Pose (ankles)
-        pose_res = pose_detector.process(rgb)
-        ankles = None
-        if pose_res.pose_landmarks:
-            lm = pose_res.pose_landmarks.landmark
-            left_ankle_v = lm[31].y * img_h
-            right_ankle_v = lm[32].y * img_h
-            left_ankle_u = lm[31].x * img_w
-            right_ankle_u = lm[32].x * img_w
-            ankles = {'left': (left_ankle_u, left_ankle_v),
-                      'right': (right_ankle_u, right_ankle_v)}
-
-        faces_bboxes = []
-        faces_scores = []
-        if frame_idx % DETECT_EVERY_N_FRAMES == 0:
-            face_res = face_detector.process(rgb)
-            if face_res.detections:
-                for det in face_res.detections:
-                    r = det.location_data.relative_bounding_box
-                    score = float(det.score[0]) if det.score else 0.0
-                    x = int(max(0, r.xmin * img_w))
-                    y = int(max(0, r.ymin * img_h))
-                    w = int(r.width * img_w)
-                    h = int(r.height * img_h)
-                    if x+w > img_w: w = img_w - x
-                    if y+h > img_h: h = img_h - y
-                    # --- [중요] 사람 얼굴 검증 ---
-                    bbox = (x,y,w,h)
-                    if verifier.is_human_face(frame, bbox, score):
-                        faces_bboxes.append(bbox)
-                        faces_scores.append(score)
-                    # --------------------------------
-
-            # 매칭/업데이트
-            assigned = set()
-            for pid, pstate in list(people.items()):
-                best_i = -1
-                best_iou = 0.0
-                for i, fb in enumerate(faces_bboxes):
-                    if i in assigned: continue
-                    val = iou(pstate.bbox, fb)
-                    if val > best_iou:
-                        best_iou = val
-                        best_i = i
-                if best_i != -1 and best_iou > 0.2:
-                    fb = faces_bboxes[best_i]
-                    tracker = cv2.TrackerCSRT_create()
-                    tracker.init(frame, tuple(fb))
-                    pstate.tracker = tracker
-                    pstate.bbox = fb
-                    pstate.frames_missing = 0
-                    assigned.add(best_i)
-
-            for i, fb in enumerate(faces_bboxes):
-                if i in assigned: continue
-                tracker = cv2.TrackerCSRT_create()
-                tracker.init(frame, tuple(fb))
-                new_id = idgen.get()
-                people[new_id] = PersonState(tracker, fb, new_id)
+    def close(self):
+        self.full_detector.close()
+        self.roi_detector.close()
 
-        else:
-            lost_ids = []
-            for pid, pstate in list(people.items()):
-                ok, box = pstate.tracker.update(frame)
+class HeightTracker:
+    """얼굴 트랙 관리(매칭/검증/추적/소실) + 트랙별 키 추정"""
+    def __init__(self, associator=None, tracker_kind=TRACKER_BACKEND, verifier=None):
+        self.idgen = IDGenerator()
+        self.people = dict()
+        self.associator = associator or HungarianAssociator()
+        self.tracker_kind = tracker_kind
+        self.verifier = verifier  # None이면 FaceMesh 검증 없이 모든 검출을 받아들인다
+        self.frame = 0
+
+    def update(self, frame, faces_bboxes, faces_scores=None, source=None, lag=0):
+        """검출 프레임 처리. 매칭/업데이트: 트랙 예측 위치와 검출의 비용 행렬로 한 번에 할당.
+
+        source/lag: 검출이 현재 frame이 아니라 lag 프레임 전의 source 프레임에서 나왔을 때
+        (파이프라인 렌더 단계). 매칭은 트랙을 그 시점으로 되돌린 위치로, FaceMesh 검증과 추적기
+        재설정은 source 픽셀로 하고, 트랙 박스는 현재 프레임까지 옮긴 위치로 둔다.
+        """
+        self.frame += 1
+        if source is None:
+            source, lag = frame, 0
+        if faces_scores is None:
+            faces_scores = [1.0] * len(faces_bboxes)
+        tracks = list(self.people.values())
+        # 검출 프레임에서도 모든 트랙을 이 프레임으로 한 번 전진시킨다 (안 그러면 매칭 안 된 칼만 트랙은
+        # 놓칠 때마다 한 스텝씩 뒤처진다). 예측 박스가 있으면 그걸로 매칭하고 속도 보정은 하지 않는다.
+        predicted = [p.tracker.predict() for p in tracks]
+        matches, _, new_dets = self.associator.associate(
+            [p.bbox if box is None else box for p, (_, box) in zip(tracks, predicted)], faces_bboxes,
+            velocities=[p.velocity for p in tracks],
+            steps=[(self.frame - p.bbox_frame if box is None else 0) - lag for p, (_, box) in zip(tracks, predicted)])
+        matches, new_dets = self._verify(source, tracks, matches, new_dets, faces_bboxes, faces_scores)
+        matched_rows = {row for row, _ in matches}
+        for row, (pstate, (ok, box)) in enumerate(zip(tracks, predicted)):
+            if row not in matched_rows and pstate.id in self.people:
+                self._advance(pstate, ok, box)
+        for row, i in matches:
+            pstate = tracks[row]
+            fb = faces_bboxes[i]
+            # 검출 시점과 마지막 bbox 시점의 차이 (늦게 온 검출이면 음수일 수 있다)
+            steps = self.frame - lag - pstate.bbox_frame
+            if steps:
+                vx = (fb[0] + fb[2]/2 - pstate.bbox[0] - pstate.bbox[2]/2) / steps
+                vy = (fb[1] + fb[3]/2 - pstate.bbox[1] - pstate.bbox[3]/2) / steps
+                pstate.velocity = (0.5*pstate.velocity[0] + 0.5*vx, 0.5*pstate.velocity[1] + 0.5*vy)
+            # 추적기는 새로 만들지 않고 다시 맞춘다
+            pstate.bbox = pstate.tracker.reseed(frame, fb, source, lag)
+            pstate.bbox_frame = self.frame
+            pstate.frames_missing = 0
+
+        for i in new_dets:
+            fb = faces_bboxes[i]
+            tracker = create_tracker(self.tracker_kind)
+            tracker.init(source, fb)
+            if lag:
+                ok, box = tracker.update(frame)
                 if ok:
-                    x,y,w,h = [int(v) for v in box]
-                    pstate.bbox = (x,y,w,h)
-                    pstate.frames_missing = 0
-                else:
-                    pstate.frames_missing += 1
-                if pstate.frames_missing > MAX_INACTIVE_FRAMES:
-                    lost_ids.append(pid)
-            for pid in lost_ids:
-                del people[pid]
-
-        # 표시/키 추정
-        for pid, pstate in people.items():
+                    fb = tuple(int(v) for v in box)
+            new_id = self.idgen.get()
+            self.people[new_id] = PersonState(tracker, fb, new_id)
+            self.people[new_id].bbox_frame = self.frame
+            if self.verifier is not None:
+                self.verifier.remember(new_id, fb, True, self.frame)
+
+    def _verify(self, frame, tracks, matches, new_dets, faces_bboxes, faces_scores):
+        """캐시가 유효한 트랙은 그대로, 새 후보/만료 트랙은 모아서 예산 안에서 FaceMesh 검증.
+
+        검증에 실패한 트랙은 지우고, 새 후보는 통과한 것만 남긴다(예산 밖 후보는 다음 검출 때 다시).
+        """
+        if self.verifier is None:
+            return matches, new_dets
+        pending = []
+        for row, i in matches:
+            pid = tracks[row].id
+            if self.verifier.cached(pid, faces_bboxes[i], self.frame) is None:
+                pending.append((('track', row), faces_bboxes[i], faces_scores[i]))
+        pending += [(('new', i), faces_bboxes[i], faces_scores[i]) for i in new_dets]
+        results = self.verifier.verify_pending(frame, pending) if pending else {}
+
+        kept = []
+        for row, i in matches:
+            ok = results.get(('track', row))
+            pid = tracks[row].id
+            if ok is False:
+                self.verifier.forget(pid)
+                del self.people[pid]
+                continue
+            if ok:
+                self.verifier.remember(pid, faces_bboxes[i], True, self.frame)
+            kept.append((row, i))
+        return kept, [i for i in new_dets if results.get(('new', i))]
+
+    def track(self, frame):
+        self.frame += 1
+        lost_ids = []
+        for pid, pstate in list(self.people.items()):
+            ok, box = pstate.tracker.update(frame)
+            self._advance(pstate, ok, box)
+            if pstate.frames_missing > MAX_INACTIVE_FRAMES:
+                lost_ids.append(pid)
+        for pid in lost_ids:
+            del self.people[pid]
+            if self.verifier is not None:
+                self.verifier.forget(pid)
+
+    def _advance(self, pstate, ok, box):
+        """추적/예측 결과로 이 프레임의 bbox를 옮긴다 (box가 None이면 그대로)"""
+        if not ok:
+            pstate.frames_missing += 1
+        elif box is not None:
+            x,y,w,h = [int(v) for v in box]
+            pstate.bbox = (x,y,w,h)
+            pstate.bbox_frame = self.frame
+            pstate.frames_missing = 0
+
+    def estimate(self, ankles, img_h):
+        """트랙별 키 추정 결과(dict) 리스트. ankles는 {pid: 발목 dict}, 발 위치는 가까운 발목, 없으면 bbox 하단."""
+        rows = []
+        frozen = []
+        for pid, pstate in self.people.items():
+            if pstate.height.frozen and pstate.last is not None:
+                frozen.append((pid, pstate))
+                continue
             x,y,w,h = pstate.bbox
             v_head = y
             u_center = x + w/2
             v_foot = None
             u_foot = None
-            if ankles:
-                lu, lv = ankles['left']
-                ru, rv = ankles['right']
+            source = 'bbox'
+            person_ankles = ankles.get(pid) if ankles else None
+            if person_ankles:
+                lu, lv = person_ankles['left']
+                ru, rv = person_ankles['right']
                 if abs(lu - u_center) < abs(ru - u_center):
-                    u_foot, v_foot = lu, lv
+                    u_foot, v_foot, source = lu, lv, 'left'
                 else:
-                    u_foot, v_foot = ru, rv
+                    u_foot, v_foot, source = ru, rv, 'right'
                 if not (0 <= v_foot <= img_h):
                     v_foot = None
+                    source = 'bbox'
             if v_foot is None:
                 u_foot, v_foot = bbox_bottom_center(pstate.bbox)
+            rows.append((pid, pstate, u_center, v_head, u_foot, v_foot, source))
+
+        results = {}
+        # 키가 수렴한 트랙은 계산 없이 고정값 (발 위치는 머리 이동만큼만 옮겨 그린다)
+        for pid, pstate in frozen:
+            distance, (du, dv), source = pstate.last
+            x,y,w,h = pstate.bbox
+            results[pid] = self._result(pid, pstate, distance, (x + w/2, y), (x + w/2 + du, y + dv), source)
+        if not rows:
+            return list(results.values())
+
+        # 나머지 전원 키/거리 계산. 배열을 만드는 고정 비용(~30us)이 있어 사람이 적으면 스칼라가 빠르다
+        _, _, _, v_heads, u_feet, v_feet, _ = zip(*rows)
+        if len(rows) >= GEOMETRY_BATCH_MIN:
+            H, D = estimate_heights_from_pixels(v_heads, v_feet, FX, FY, CX, CY, H_CAM, u_foot=u_feet)
+        else:
+            HD = [estimate_height_from_pixels(vh, vf, FX, FY, CX, CY, H_CAM, u_foot=uf) or (np.nan, np.nan)
+                  for vh, uf, vf in zip(v_heads, u_feet, v_feet)]
+            H, D = zip(*HD)
+
+        for (pid, pstate, u_center, v_head, u_foot, v_foot, source), H_est, dist in zip(rows, H, D):
+            distance = None
+            if not np.isnan(dist):
+                distance = float(dist)
+                pstate.height.update(float(H_est))
+                pstate.last = (distance, (u_foot - u_center, v_foot - v_head), source)
+            results[pid] = self._result(pid, pstate, distance, (u_center, v_head), (u_foot, v_foot), source)
+        return [results[pid] for pid in self.people]
 
-            est = estimate_height_from_pixels(v_head, v_foot, FX, FY, CX, CY, H_CAM, u_foot=u_foot)
-            height_text = "N/A"
-            if est is not None:
-                H_est, D = est
-                pstate.heights.append(H_est)
-                avgH = sum(pstate.heights)/len(pstate.heights)
-                height_text = f"{avgH:.2f} m"
+    @staticmethod
+    def _result(pid, pstate, distance, head, foot, source):
+        est = pstate.height
+        return {'id': pid, 'bbox': pstate.bbox, 'height': est.value, 'height_std': est.std,
+                'confidence': est.confidence, 'frozen': est.frozen, 'D': distance,
+                'head': head, 'foot': foot, 'ankle_source': source}
+
+class FrameProcessor:
+    """한 프레임 처리: Pose/FaceDetection 검출 -> 추적 -> 키 추정 (단일 스레드)"""
+    def __init__(self, associator=None, tracker_kind=TRACKER_BACKEND, per_person_pose=PER_PERSON_POSE,
+                 detection_schedule=DETECTION_SCHEDULE):
+        if per_person_pose:
+            self.person_pose = PersonPoseEstimator()
+            self.pose_detector = None
+        else:
+            self.person_pose = None
+            self.pose_detector = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+        self.verifier = FaceVerifier()
+        self.detector = DetectionScheduler(detection_schedule)
+        self.tracker = HeightTracker(associator, tracker_kind, self.verifier)
+
+    def process(self, frame, frame_idx):
+        img_h = frame.shape[0]
+
+        faces = self.detector.detect(frame, frame_idx, [p.bbox for p in self.tracker.people.values()])
+        if faces is not None:
+            self.tracker.update(frame, *faces)
+        else:
+            self.tracker.track(frame)
+
+        # Pose (ankles) - 추적 후의 박스로 트랙별 ROI를 잡는다
+        ankles = self.ankles(frame, frame_idx)
+        return self.tracker.estimate(ankles, img_h)
+
+    def ankles(self, frame, frame_idx):
+        """트랙 id별 발목 좌표 {pid: {'left': (u,v), 'right': (u,v)}}"""
+        if self.person_pose is not None:
+            # 키가 수렴한 트랙은 Pose도 돌리지 않는다
+            tracks = [(pid, p.bbox) for pid, p in self.tracker.people.items() if not p.height.frozen]
+            return self.person_pose.update(frame_idx, frame, tracks)
+        img_h, img_w = frame.shape[:2]
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        shared = detect_ankles(self.pose_detector, rgb, img_w, img_h)
+        return {pid: shared for pid in self.tracker.people} if shared else {}
+
+    def reset(self):
+        """새 영상을 시작할 때 트랙/ID 초기화 (MediaPipe 인스턴스는 재사용)"""
+        self.tracker = HeightTracker(self.tracker.associator, self.tracker.tracker_kind, self.verifier)
+        self.verifier.cache.clear()
+        self.detector.reset()
+        if self.person_pose is not None:
+            self.person_pose.reset()
+
+    def close(self):
+        self.detector.close()
+        if self.person_pose is not None:
+            self.person_pose.close()
+        else:
+            self.pose_detector.close()
+        self.verifier.close()
+
+def draw_results(frame, results, frame_idx):
+    for r in results:
+        x,y,w,h = r['bbox']
+        height_text = "N/A" if r['height'] is None else f"{r['height']:.2f} m ({r['confidence']:.0%})"
+        u_center, v_head = r['head']
+        u_foot, v_foot = r['foot']
+        cv2.rectangle(frame, (x,y), (x+w, y+h), (0,255,0), 2)
+        cv2.putText(frame, f"ID:{r['id']}", (x, y-30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,0), 2)
+        cv2.putText(frame, f"H: {height_text}", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,255), 2)
+        cv2.circle(frame, (int(u_center), int(v_head)), 4, (0,0,255), -1)
+        cv2.circle(frame, (int(u_foot), int(v_foot)), 4, (255,0,0), -1)
+
+    cv2.putText(frame, f"Frame:{frame_idx} Faces:{len(results)}", (10,20),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200,200,200), 2)
+
+def main(source=0):
+    cap = cv2.VideoCapture(source)
+    processor = FrameProcessor()
+
+    frame_idx = 0
+    fps_time = time.time()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
 
-            cv2.rectangle(frame, (x,y), (x+w, y+h), (0,255,0), 2)
-            cv2.putText(frame, f"ID:{pid}", (x, y-30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,0), 2)
-            cv2.putText(frame, f"H: {height_text}", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,255), 2)
-            cv2.circle(frame, (int(u_center), int(v_head)), 4, (0,0,255), -1)
-            cv2.circle(frame, (int(u_foot), int(v_foot)), 4, (255,0,0), -1)
+        results = processor.process(frame, frame_idx)
 
         if frame_idx % 10 == 0:
             now = time.time()
             fps = 10.0 / (now - fps_time) if (now - fps_time) > 1e-6 else 0.0
             fps_time = now
-        cv2.putText(frame, f"Frame:{frame_idx} Faces:{len(people)}", (10,20),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200,200,200), 2)
+        draw_results(frame, results, frame_idx)
 
         cv2.imshow("FaceTrack+Height(Verified)", frame)
         key = cv2.waitKey(1) & 0xFF
@@ -292,6 +666,7 @@ def main():
             break
         frame_idx += 1
 
+    processor.close()
     cap.release()
     cv2.destroyAllWindows()
 
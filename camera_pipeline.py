@@ -0,0 +1,319 @@
+# camera_pipeline.py
+# 캡처 / Pose / FaceDetection / 추적+렌더 단계를 스레드로 분리한 파이프라인.
+# 기존 main() 루프는 모든 단계를 한 스레드에서 차례로 돌려 FPS가 단계 시간의 합으로 제한된다.
+# 여기서는 캡처 스레드가 최신 프레임 1장만 보관하고(latest-frame-only), Pose와 얼굴 검출은
+# 각자 워커에서 가장 최근 프레임을 처리하며, 렌더 단계는 가장 최근 검출 결과로 추적/키 추정을 한다.
+# (MediaPipe/OpenCV 추론은 GIL을 놓기 때문에 스레드로도 병렬 실행된다.)
+#
+# 녹화 영상으로 기존 루프와 비교:
+#   python camera_pipeline.py --video clip.mp4 --mode loop --headless
+#   python camera_pipeline.py --video clip.mp4 --mode pipeline --headless
+import argparse
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from camera_association import ASSOCIATORS
+from camera_events import TrackEventPublisher
+from camera_tracking import TRACKERS
+from camera_height_detection import (
+    DETECTION_SCHEDULE, TRACKER_BACKEND, DetectionScheduler, FaceVerifier, FrameProcessor,
+    HeightTracker, PersonPoseEstimator, draw_results,
+)
+
+
+class LatestSlot:
+    """최신 값 하나만 보관하는 1칸 버퍼. 소비자가 늦으면 이전 값은 덮어쓴다."""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.seq = 0
+        self.closed = False
+
+    def put(self, item):
+        with self._cond:
+            self._item = item
+            self.seq += 1
+            self._cond.notify_all()
+
+    def get(self, after_seq, timeout=1.0):
+        """after_seq 보다 새로운 값을 기다려 (seq, item) 반환. 닫히면 (seq, None)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > after_seq or self.closed, timeout)
+            if self.seq > after_seq:
+                return self.seq, self._item
+            return after_seq, None
+
+    def peek(self):
+        with self._cond:
+            return self.seq, self._item
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """단계별 처리 시간, 건너뛴 프레임 수, 큐 깊이(처리 시점에 밀려 있던 프레임 수)"""
+    def __init__(self, name):
+        self.name = name
+        self.times = deque(maxlen=1000)
+        self.count = 0
+        self.skipped = 0
+        self.depth = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, last_seq=None, seq=None):
+        with self._lock:
+            self.times.append(seconds)
+            self.count += 1
+            if last_seq is not None:
+                # 1칸 버퍼이므로 seq가 건너뛴 만큼 프레임을 놓친 것
+                self.skipped += max(0, seq - last_seq - 1)
+                self.depth = seq - last_seq
+
+    def summary(self):
+        with self._lock:
+            if not self.times:
+                return f"{self.name:<8} n=0"
+            t = np.array(self.times) * 1000
+            return (f"{self.name:<8} n={self.count:<5} mean={t.mean():6.1f}ms "
+                    f"p95={np.percentile(t, 95):6.1f}ms skipped={self.skipped:<5} depth={self.depth}")
+
+
+class FramePacket:
+    __slots__ = ('idx', 'bgr', 't_capture')
+
+    def __init__(self, idx, bgr, t_capture):
+        self.idx = idx
+        self.bgr = bgr
+        self.t_capture = t_capture
+
+
+def paced_reader(cap, realtime):
+    """영상 파일을 카메라처럼 재생: realtime이면 FPS에 맞춰, 늦으면 지난 프레임은 버린다.
+
+    (frame_idx, frame, t_capture)를 yield. t_capture는 그 프레임이 카메라에 찍혔을 시각.
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    t0 = time.perf_counter()
+    idx = -1
+    while True:
+        if realtime:
+            due = int((time.perf_counter() - t0) * fps)
+            if due <= idx:
+                time.sleep(max(0.0, (idx + 1) / fps - (time.perf_counter() - t0)))
+                due = idx + 1
+            # 드라이버가 밀린 프레임을 버리는 것처럼 due 직전까지 grab만 한다
+            while idx < due - 1:
+                if not cap.grab():
+                    return
+                idx += 1
+        ret, frame = cap.read()
+        if not ret:
+            return
+        idx += 1
+        t_capture = t0 + idx / fps if realtime else time.perf_counter()
+        yield idx, frame, t_capture
+
+
+def run_loop(cap, realtime, headless, stats, latencies, associator=None, tracker_kind=TRACKER_BACKEND,
+             detection_schedule=DETECTION_SCHEDULE, events=None):
+    """기존 main()과 같은 단일 스레드 루프 (비교 기준)"""
+    processor = FrameProcessor(associator, tracker_kind, detection_schedule=detection_schedule)
+    rendered = 0
+    try:
+        for idx, frame, t_capture in paced_reader(cap, realtime):
+            start = time.perf_counter()
+            results = processor.process(frame, idx)
+            if events is not None:
+                events.publish(results)
+            stats['process'].record(time.perf_counter() - start)
+            start = time.perf_counter()
+            draw_results(frame, results, idx)
+            if not headless:
+                cv2.imshow("FaceTrack+Height(Loop)", frame)
+                if (cv2.waitKey(1) & 0xFF) == 27:
+                    break
+            stats['render'].record(time.perf_counter() - start)
+            latencies.append(time.perf_counter() - t_capture)
+            rendered += 1
+    finally:
+        processor.close()
+    return rendered
+
+
+def run_pipeline(cap, realtime, headless, stats, latencies, associator=None, tracker_kind=TRACKER_BACKEND,
+                 detection_schedule=DETECTION_SCHEDULE, events=None):
+    frames = LatestSlot()
+    ankles_slot = LatestSlot()
+    faces_slot = LatestSlot()
+    tracks_slot = LatestSlot()  # 렌더 단계가 올리는 최신 트랙 박스 [(pid, bbox)] -> 검출 ROI
+    pose_slot = LatestSlot()    # 그중 키가 아직 수렴하지 않은 트랙 -> Pose ROI
+    running = True
+
+    def capture():
+        for idx, frame, t_capture in paced_reader(cap, realtime):
+            if not running:
+                break
+            start = time.perf_counter()
+            # 색 변환은 각 워커가 필요한 ROI/축소본에만 한다
+            frames.put(FramePacket(idx, frame, t_capture))
+            stats['capture'].record(time.perf_counter() - start)
+        frames.close()
+
+    def pose_worker():
+        person_pose = PersonPoseEstimator()
+        seq = 0
+        while running:
+            new_seq, pkt = frames.get(seq)
+            if pkt is None:
+                if frames.closed:
+                    break
+                continue
+            start = time.perf_counter()
+            _, tracks = pose_slot.peek()
+            ankles = person_pose.update(pkt.idx, pkt.bgr, tracks or [])
+            ankles_slot.put((pkt.idx, ankles))
+            stats['pose'].record(time.perf_counter() - start, seq, new_seq)
+            seq = new_seq
+        person_pose.close()
+
+    def face_worker():
+        detector = DetectionScheduler(detection_schedule)
+        seq = 0
+        while running:
+            new_seq, pkt = frames.get(seq)
+            if pkt is None:
+                if frames.closed:
+                    break
+                continue
+            start = time.perf_counter()
+            _, tracks = tracks_slot.peek()
+            faces = detector.detect(pkt.bgr, pkt.idx, [bbox for _, bbox in tracks or []])
+            if faces is None:
+                seq = new_seq
+                continue
+            faces_slot.put((pkt.idx, pkt.bgr, faces))  # 검출한 프레임도 같이 (렌더 단계는 더 새 프레임에 있다)
+            stats['face'].record(time.perf_counter() - start, seq, new_seq)
+            seq = new_seq
+        detector.close()
+
+    workers = [threading.Thread(target=f, daemon=True) for f in (capture, pose_worker, face_worker)]
+    for w in workers:
+        w.start()
+
+    # FaceMesh 검증은 트랙 id 캐시가 있는 렌더 단계에서, 프레임당 VERIFY_BUDGET_MS 안에서만
+    verifier = FaceVerifier()
+    tracker = HeightTracker(associator, tracker_kind, verifier)
+    seq = 0
+    faces_seq = 0
+    rendered = 0
+    recent = deque(maxlen=64)  # 최근 렌더한 프레임 번호 -> 검출이 추적기 스텝으로 몇 프레임 늦었는지
+    try:
+        while True:
+            new_seq, pkt = frames.get(seq)
+            if pkt is None:
+                if frames.closed:
+                    break
+                continue
+            start = time.perf_counter()
+            new_faces_seq, faces = faces_slot.peek()
+            # 얼굴 워커가 이 프레임보다 새 프레임을 이미 처리했으면 다음 렌더 때 쓴다
+            if new_faces_seq != faces_seq and faces[0] <= pkt.idx:
+                faces_seq = new_faces_seq
+                det_idx, det_bgr, (bboxes, scores) = faces
+                # 검출은 det_idx 프레임 것: 검증/재설정은 그 프레임에서, 박스는 현재 프레임까지 옮긴다
+                lag = 1 + sum(1 for idx in recent if idx > det_idx) if det_idx < pkt.idx else 0
+                tracker.update(pkt.bgr, bboxes, scores, source=det_bgr, lag=lag)
+            else:
+                tracker.track(pkt.bgr)
+            recent.append(pkt.idx)
+            tracks_slot.put([(pid, p.bbox) for pid, p in tracker.people.items()])
+            pose_slot.put([(pid, p.bbox) for pid, p in tracker.people.items() if not p.height.frozen])
+            _, ankles = ankles_slot.peek()
+            img_h = pkt.bgr.shape[0]
+            results = tracker.estimate(ankles[1] if ankles else None, img_h)
+            if events is not None:
+                events.publish(results)
+            canvas = pkt.bgr.copy()  # 워커들이 같은 프레임을 읽고 있으므로 복사본에 그린다
+            draw_results(canvas, results, pkt.idx)
+            if not headless:
+                cv2.imshow("FaceTrack+Height(Pipeline)", canvas)
+                if (cv2.waitKey(1) & 0xFF) == 27:
+                    break
+            stats['render'].record(time.perf_counter() - start, seq, new_seq)
+            latencies.append(time.perf_counter() - pkt.t_capture)
+            seq = new_seq
+            rendered += 1
+    finally:
+        running = False
+        frames.close()
+        for w in workers:
+            w.join(timeout=2.0)
+        verifier.close()
+    return rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Threaded capture/inference pipeline")
+    parser.add_argument('--video', help="녹화 영상 경로 (없으면 카메라 0)")
+    parser.add_argument('--mode', choices=('pipeline', 'loop'), default='pipeline')
+    parser.add_argument('--no-realtime', action='store_true',
+                        help="영상을 FPS에 맞추지 않고 최대 속도로 읽는다")
+    parser.add_argument('--headless', action='store_true')
+    parser.add_argument('--associator', choices=sorted(ASSOCIATORS), default='hungarian',
+                        help="트랙-검출 매칭 방식")
+    parser.add_argument('--tracker', choices=TRACKERS, default=TRACKER_BACKEND,
+                        help="검출 사이 프레임의 추적 백엔드")
+    parser.add_argument('--detection-schedule', choices=('roi', 'full'), default=DETECTION_SCHEDULE,
+                        help="roi: 가끔 축소 전체 검출 + 트랙 주변 ROI, full: 매번 원본 전체 검출")
+    parser.add_argument('--report-every', type=float, default=5.0)
+    parser.add_argument('--events-port', type=int, default=8765,
+                        help="트랙 이벤트 웹소켓 포트 (키오스크 페이지용, 0이면 끔)")
+    parser.add_argument('--events-rate', type=float, default=5.0, help="트랙 이벤트 최대 전송 빈도 (Hz)")
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video if args.video else 0)
+    # 카메라는 원래 실시간이므로 파일일 때만 재생 속도를 맞춘다
+    realtime = bool(args.video) and not args.no_realtime
+    names = ('capture', 'pose', 'face', 'render') if args.mode == 'pipeline' else ('process', 'render')
+    stats = {name: StageStats(name) for name in names}
+    latencies = deque(maxlen=100000)
+
+    stop_report = threading.Event()
+
+    def reporter():
+        while not stop_report.wait(args.report_every):
+            print(" | ".join(stats[n].summary() for n in names))
+
+    threading.Thread(target=reporter, daemon=True).start()
+
+    started = time.perf_counter()
+    events = None
+    if args.events_port:
+        events = TrackEventPublisher('127.0.0.1', args.events_port, args.events_rate).start()
+        print(f"track events on ws://127.0.0.1:{args.events_port}")
+    run = run_pipeline if args.mode == 'pipeline' else run_loop
+    rendered = run(cap, realtime, args.headless, stats, latencies,
+                   ASSOCIATORS[args.associator](), args.tracker, args.detection_schedule, events)
+    elapsed = time.perf_counter() - started
+    if events is not None:
+        events.stop()
+    stop_report.set()
+    cap.release()
+    cv2.destroyAllWindows()
+
+    lat = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    print(f"\nmode={args.mode} frames={rendered} wall={elapsed:.1f}s FPS={rendered / elapsed:.1f}")
+    print(f"glass-to-glass p50={np.percentile(lat, 50):.0f}ms p95={np.percentile(lat, 95):.0f}ms")
+    for name in names:
+        print(stats[name].summary())
+
+
+if __name__ == "__main__":
+    main()
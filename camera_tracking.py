@@ -0,0 +1,111 @@
+# camera_tracking.py
+# 검출 사이 프레임에서 트랙 bbox를 이어 주는 추적 백엔드.
+#
+# - kalman : 등속 칼만 필터 (cx, cy, w, h, vx, vy). 영상을 보지 않아 사람 수가 늘어도 거의 공짜.
+# - csrt / kcf / mosse : OpenCV 영상 추적기. 정확하지만 CSRT는 특히 비싸다.
+#
+# 공통 인터페이스:
+#   init(frame, bbox)    처음 생성 시
+#   predict()            검출 프레임에서 매칭 전에 모든 트랙에 한 번 -> (ok, (x,y,w,h)) 또는 (ok, None)
+#                        (칼만은 이 프레임 몫의 상태 전진, 영상 추적기는 할 일 없음)
+#   reseed(frame, bbox, source=None, lag=0)
+#                        검출과 매칭됐을 때 (객체를 새로 만들지 않고 상태만 다시 맞춤) -> 현재 프레임의 bbox.
+#                        bbox가 lag 프레임 전 source 프레임의 검출이면 현재 프레임까지 옮겨서 맞춘다.
+#   update(frame)        검출 없는 프레임 -> (ok, (x,y,w,h))
+import cv2
+import numpy as np
+
+
+class KalmanBoxTracker:
+    """등속 칼만 필터. 상태 [cx, cy, w, h, vx, vy], 관측 [cx, cy, w, h]."""
+    _F = np.eye(6)
+    _F[0, 4] = _F[1, 5] = 1.0
+    _H = np.eye(4, 6)
+
+    def __init__(self, max_coast=10, q_pos=1.0, q_vel=0.5, r=4.0):
+        # 관측 없이 max_coast 프레임(검출 주기 2번 정도) 넘게 예측만 하면 ok=False -> frames_missing 증가
+        self.max_coast = max_coast
+        self._Q = np.diag([q_pos, q_pos, q_pos, q_pos, q_vel, q_vel])
+        self._R = np.eye(4) * r
+        self.x = np.zeros(6)
+        self.P = np.eye(6)
+        self.coast = 0
+
+    def init(self, frame, bbox):
+        x, y, w, h = bbox
+        self.x = np.array([x + w/2, y + h/2, w, h, 0.0, 0.0])
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 100.0, 100.0])
+        self.coast = 0
+
+    def reseed(self, frame, bbox, source=None, lag=0):
+        # 관측으로 보정만 한다. 이 프레임 몫의 예측은 HeightTracker가 매칭 전에 predict()로 이미 했다.
+        # 늦게 도착한 검출은 추정 속도로 lag 프레임만큼 앞으로 옮긴 뒤 보정한다 (영상은 안 봄).
+        x, y, w, h = bbox
+        z = np.array([x + w/2 + self.x[4] * lag, y + h/2 + self.x[5] * lag, w, h])
+        S = self._H @ self.P @ self._H.T + self._R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self._H @ self.x)
+        self.P = (np.eye(6) - K @ self._H) @ self.P
+        self.coast = 0
+        return bbox if not lag else (z[0] - w/2, z[1] - h/2, w, h)
+
+    def predict(self):
+        self.x = self._F @ self.x
+        self.P = self._F @ self.P @ self._F.T + self._Q
+        self.coast += 1
+        cx, cy, w, h = self.x[:4]
+        return self.coast <= self.max_coast, (cx - w/2, cy - h/2, w, h)
+
+    def update(self, frame):
+        return self.predict()
+
+
+def _opencv_factory(kind):
+    if kind == 'csrt':
+        return cv2.TrackerCSRT_create
+    if kind == 'kcf':
+        return cv2.TrackerKCF_create
+    # MOSSE는 opencv-contrib의 legacy 모듈에만 있다
+    return cv2.legacy.TrackerMOSSE_create
+
+
+# 같은 객체에 init을 다시 불러도 되는 추적기. KCF는 재-init 후 update에서 크기 불일치 오류가 나서 새로 만든다.
+_REINIT_SAFE = ('csrt', 'mosse')
+
+
+class OpenCVTracker:
+    """cv2 추적기 래퍼. reseed는 가능하면 같은 객체에 init을 다시 호출한다."""
+    def __init__(self, kind='csrt'):
+        self.kind = kind
+        self.tracker = _opencv_factory(kind)()
+
+    def init(self, frame, bbox):
+        self.tracker.init(frame, tuple(int(v) for v in bbox))
+
+    def predict(self):
+        return True, None
+
+    def reseed(self, frame, bbox, source=None, lag=0):
+        if self.kind not in _REINIT_SAFE:
+            self.tracker = _opencv_factory(self.kind)()
+        if source is None or not lag:
+            self.init(frame, bbox)
+            return bbox
+        # 검출이 나온 프레임의 픽셀로 맞춘 뒤 현재 프레임까지 한 번 추적
+        self.init(source, bbox)
+        ok, box = self.tracker.update(frame)
+        return tuple(box) if ok else bbox
+
+    def update(self, frame):
+        return self.tracker.update(frame)
+
+
+TRACKERS = ('kalman', 'csrt', 'kcf', 'mosse')
+
+
+def create_tracker(kind):
+    if kind == 'kalman':
+        return KalmanBoxTracker()
+    if kind not in TRACKERS:
+        raise ValueError(f"unknown tracker backend: {kind}")
+    return OpenCVTracker(kind)
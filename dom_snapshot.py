@@ -0,0 +1,352 @@
+# dom_snapshot.py
+# LLM 프롬프트용 압축 DOM 스냅샷.
+# 예전 get_dom_json은 body 전체를 트리 그대로, 조상마다 innerText를 통째로 넣어서 실제 페이지에선 수 MB가 됐다.
+# 여기서는 페이지 안에서 한 번 훑으며
+#   - 보이는 요소만 (안 보이는 서브트리는 통째로 건너뜀)
+#   - 상호작용 요소(a[href], button, input, select, textarea, role=button 등)와
+#     라벨/자기 텍스트가 있는 요소만 남기고
+#   - 텍스트는 요소 자신의 텍스트 노드만, 이미 나온 문장은 다시 넣지 않으며
+#   - 한 줄에 한 요소:  <selector> <tag> "text" attr=value ...
+# 형식으로 만든다. selector는 고유한 #id가 있으면 그것, 없으면 요소에 data-ai 속성을 달아
+# [data-ai=e12] 처럼 짧고 스텝 사이에도 변하지 않는 값을 준다.
+# 토큰 예산을 넘으면 화면 밖 텍스트 -> 화면 안 텍스트 -> 화면 밖 상호작용 요소 순으로 뺀다.
+#
+# DomSnapshotter는 같은 페이지에 머무는 동안 MutationObserver로 바뀐 서브트리만 다시 훑어
+# 추가/변경/삭제된 줄만 돌려준다. 변경/삭제는 LLM이 본(스냅샷에 실린) 노드만 알리고, 변경분도
+# 토큰 예산에 넣어 센다. 내비게이션(새 문서)이나 URL 변경, 예산 초과 시에는 다시 전체 스냅샷.
+#
+# 저장된 HTML로 예전 방식과 비교 (Chrome 필요, --llm이면 ollama 응답 시간까지):
+#   python dom_snapshot.py index.html static/kiosk.html --llm
+import json
+
+SNAPSHOT_TOKEN_BUDGET = 1500   # 스냅샷 한 번에 허용하는 대략의 토큰 수 (문자 4개 = 1토큰으로 계산)
+MAX_TEXT_CHARS = 80            # 요소당 텍스트 최대 길이
+
+# 페이지 안에서 실행되는 함수 (Selenium/Playwright 공용). opts = {maxText, mode: 'full' | 'delta'}
+#   full : 전체를 훑고 MutationObserver를 단다.
+#          -> {full: true, url, title, nodes: [[selector, tag, text, attrs, interactive(0/1), in_viewport(0/1), id], ...]}
+#          id는 요소마다 고정된 번호 (DOM에는 안 닮). 변경분을 스냅샷에 실린 줄과 맞춰 보는 데 쓴다.
+#   delta: 지난 호출 이후 바뀐 서브트리만 다시 훑는다.
+#          -> {full: false, url, title, added: [...], changed: [...], removed: [...]}
+#          문서가 바뀌어 상태가 없으면(내비게이션) 자동으로 full.
+SNAPSHOT_FN = r"""
+(opts) => {
+  const MAX_TEXT = opts.maxText;
+  const SKIP = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'SVG', 'CANVAS', 'IFRAME', 'HEAD']);
+  const CONTROLS = new Set(['BUTTON', 'INPUT', 'SELECT', 'TEXTAREA', 'SUMMARY']);
+  const ROLES = new Set(['button', 'link', 'checkbox', 'radio', 'tab', 'menuitem', 'option',
+                         'textbox', 'combobox', 'searchbox', 'switch']);
+  window.__aiRefSeq = window.__aiRefSeq || 0;
+  window.__aiIdSeq = window.__aiIdSeq || 0;
+  window.__aiIds = window.__aiIds || new WeakMap();
+
+  const clip = s => { s = s.replace(/\s+/g, ' ').trim(); return s.length > MAX_TEXT ? s.slice(0, MAX_TEXT - 1) + '…' : s; };
+  const visible = el => {
+    if (!el.getClientRects().length) return false;
+    if (el.checkVisibility) return el.checkVisibility({checkOpacity: true, checkVisibilityCSS: true});
+    const s = getComputedStyle(el);
+    return s.visibility !== 'hidden' && s.opacity !== '0';
+  };
+  const interactive = el => {
+    if (el.tagName === 'A') return el.hasAttribute('href');
+    if (el.tagName === 'INPUT') return el.type !== 'hidden';
+    if (CONTROLS.has(el.tagName)) return true;
+    const role = el.getAttribute('role');
+    return (role && ROLES.has(role)) || el.hasAttribute('onclick') ||
+           el.getAttribute('contenteditable') === 'true' || el.getAttribute('tabindex') === '0';
+  };
+  const ownText = el => {
+    let t = '';
+    for (const n of el.childNodes) if (n.nodeType === 3) t += n.nodeValue;
+    return clip(t);
+  };
+  const label = el => clip(el.getAttribute('aria-label') || el.getAttribute('title') ||
+                           el.getAttribute('alt') || '');
+  const selectorFor = el => {
+    const id = el.id;
+    if (id && /^[A-Za-z][\w-]*$/.test(id) && document.querySelectorAll('#' + id).length === 1) return '#' + id;
+    let ref = el.getAttribute('data-ai');
+    if (!ref) { ref = 'e' + (++window.__aiRefSeq); el.setAttribute('data-ai', ref); }
+    return '[data-ai=' + ref + ']';
+  };
+  const attrsFor = el => {
+    const out = [];
+    const add = (k, v) => { if (v) out.push(k + '=' + (/[\s"]/.test(v) ? JSON.stringify(v) : v)); };
+    if (el.tagName === 'A') add('href', clip((el.getAttribute('href') || '').replace(location.origin, '')));
+    add('name', el.getAttribute('name'));
+    add('placeholder', clip(el.getAttribute('placeholder') || ''));
+    if (el.tagName === 'INPUT' || el.tagName === 'TEXTAREA' || el.tagName === 'SELECT') add('value', clip(el.value || ''));
+    if (el.disabled) out.push('disabled');
+    if (el.checked) out.push('checked');
+    return out.join(' ');
+  };
+  const describe = (el, seen) => {
+    const isCtl = interactive(el);
+    const text = isCtl ? (label(el) || clip(el.innerText || '')) : (ownText(el) || label(el));
+    if (!isCtl && (text.length < 2 || seen.has(text))) return null;
+    if (text) seen.add(text);   // 버튼/링크 안쪽 span 등에서 같은 글자가 다시 나오지 않게
+    const r = el.getBoundingClientRect();
+    const inView = r.bottom > 0 && r.right > 0 && r.top < innerHeight && r.left < innerWidth ? 1 : 0;
+    let tag = el.getAttribute('role') || el.tagName.toLowerCase();
+    if (el.tagName === 'INPUT') tag += ':' + (el.type || 'text');
+    let id = window.__aiIds.get(el);
+    if (!id) { id = ++window.__aiIdSeq; window.__aiIds.set(el, id); }
+    return [isCtl ? selectorFor(el) : '', tag, text, isCtl ? attrsFor(el) : '', isCtl ? 1 : 0, inView, id];
+  };
+  const scan = (root, seen, out) => {
+    if (root !== document.body && !visible(root)) return;
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT, {
+      acceptNode: el => (SKIP.has(el.tagName.toUpperCase()) || !visible(el))
+        ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_ACCEPT
+    });
+    for (let el = walker.currentNode; el; el = walker.nextNode()) {
+      if (el === document.body) continue;
+      const node = describe(el, seen);
+      if (node) out.set(el, node);
+    }
+  };
+
+  let st = window.__aiSnap;
+  if (opts.mode === 'full' || !st) {
+    if (st) st.observer.disconnect();
+    st = window.__aiSnap = {items: new Map(), dirty: new Set()};
+    scan(document.body, new Set(), st.items);
+    const mark = records => {
+      for (const r of records) {
+        if (r.attributeName === 'data-ai') continue;   // selectorFor가 단 속성
+        const t = r.target.nodeType === 1 ? r.target : r.target.parentElement;
+        if (t) window.__aiSnap.dirty.add(t);
+      }
+    };
+    st.mark = mark;
+    st.observer = new MutationObserver(mark);
+    st.observer.observe(document.body, {subtree: true, childList: true, attributes: true, characterData: true});
+    if (!window.__aiInputHooked) {
+      // 입력값은 속성이 아니라 프로퍼티라 observer에 안 잡힌다
+      const onInput = e => { if (e.target.nodeType === 1 && window.__aiSnap) window.__aiSnap.dirty.add(e.target); };
+      document.addEventListener('input', onInput, true);
+      document.addEventListener('change', onInput, true);
+      window.__aiInputHooked = true;
+    }
+    return {full: true, url: location.href, title: document.title, nodes: [...st.items.values()]};
+  }
+
+  st.mark(st.observer.takeRecords());
+  const result = {full: false, url: location.href, title: document.title, added: [], changed: [], removed: []};
+  if (!st.dirty.size) return result;
+  const insideAny = (el, set) => { for (let p = el; p; p = p.parentElement) if (set.has(p)) return true; return false; };
+  // 다른 dirty 요소 안에 있지 않은 것만 루트로
+  const roots = new Set([...st.dirty].filter(el => el.isConnected && !insideAny(el.parentElement, st.dirty)));
+  st.dirty.clear();
+  const seen = new Set();
+  for (const [el, node] of st.items) if (el.isConnected && !insideAny(el, roots)) seen.add(node[2]);
+  const fresh = new Map();
+  for (const root of roots) scan(root, seen, fresh);
+  for (const [el, node] of st.items) {
+    if (!el.isConnected || (!fresh.has(el) && insideAny(el, roots))) {
+      result.removed.push(node);
+      st.items.delete(el);
+    }
+  }
+  for (const [el, node] of fresh) {
+    const old = st.items.get(el);
+    if (!old) result.added.push(node);
+    else if (old.slice(0, 5).join('\u0001') !== node.slice(0, 5).join('\u0001')) result.changed.push(node);
+    st.items.set(el, node);
+  }
+  return result;
+}
+"""
+
+MAX_DELTA_STEPS = 8        # 이 횟수만큼 변경분만 보냈으면 다음엔 전체 스냅샷 (대화가 끝없이 길어지지 않게)
+MAX_DELTA_RATIO = 0.5      # 전체 스냅샷 이후 변경분 합계가 전체 예산의 이 비율을 넘으면 전체 스냅샷
+
+
+def estimate_tokens(text):
+    """대략의 토큰 수 (영문 기준 문자 4개 ~ 1토큰)"""
+    return len(text) // 4 + 1
+
+
+def selenium_evaluate(driver):
+    """Selenium driver -> evaluate(fn_source, arg). Playwright는 page.evaluate를 그대로 쓰면 된다."""
+    return lambda fn, arg: driver.execute_script(f"return ({fn})(arguments[0]);", arg)
+
+
+def take_snapshot(driver):
+    """Selenium driver에서 스냅샷 원자료를 가져온다"""
+    return selenium_evaluate(driver)(SNAPSHOT_FN, {'maxText': MAX_TEXT_CHARS, 'mode': 'full'})
+
+
+def node_line(node):
+    selector, tag, text, attrs = node[:4]
+    line = f"{selector or '-'} {tag}"
+    if text:
+        line += ' ' + json.dumps(text, ensure_ascii=False)
+    if attrs:
+        line += ' ' + attrs
+    return line
+
+
+def _fit(nodes, budget, prefix=''):
+    """-> (줄 목록, budget 글자 안에 들어가는 노드 인덱스). 우선순위가 높은 노드부터 채운다."""
+    lines = [prefix + node_line(n) for n in nodes]
+    # 0: 화면 안 상호작용, 1: 화면 밖 상호작용, 2: 화면 안 텍스트, 3: 화면 밖 텍스트
+    ranked = sorted(range(len(nodes)), key=lambda i: (2 * (1 - nodes[i][4]) + (1 - nodes[i][5]), i))
+    keep = set()
+    for i in ranked:
+        cost = len(lines[i]) + 1
+        if cost > budget:
+            break
+        budget -= cost
+        keep.add(i)
+    return lines, keep
+
+
+def _format_snapshot(snapshot, max_tokens):
+    """-> (프롬프트용 텍스트, 텍스트에 실린 노드 목록)"""
+    header = f"url: {snapshot['url']}\ntitle: {snapshot['title']}"
+    nodes = snapshot['nodes']
+    lines, keep = _fit(nodes, max_tokens * 4 - len(header))
+    out = [header] + [lines[i] for i in range(len(lines)) if i in keep]
+    if len(keep) < len(lines):
+        out.append(f"... {len(lines) - len(keep)} more elements omitted")
+    return '\n'.join(out), [nodes[i] for i in sorted(keep)]
+
+
+def format_snapshot(snapshot, max_tokens=SNAPSHOT_TOKEN_BUDGET):
+    """스냅샷 -> 프롬프트용 텍스트. 예산을 넘으면 우선순위 낮은 줄부터 뺀다."""
+    return _format_snapshot(snapshot, max_tokens)[0]
+
+
+def format_delta(delta, omitted=0):
+    """변경분 -> 프롬프트용 텍스트. omitted: 예산 때문에 뺀 추가 요소 수"""
+    out = [f"url: {delta['url']}\ntitle: {delta['title']}",
+           "changes since the last step (the rest of the page is as before):"]
+    out += ['added: ' + node_line(n) for n in delta['added']]
+    out += ['changed: ' + node_line(n) for n in delta['changed']]
+    out += ['removed: ' + node_line(n) for n in delta['removed']]
+    if omitted:
+        out.append(f"... {omitted} more new elements omitted")
+    if len(out) == 2:
+        out.append("(no changes)")
+    return '\n'.join(out)
+
+
+def get_dom_snapshot(driver, max_tokens=SNAPSHOT_TOKEN_BUDGET):
+    return format_snapshot(take_snapshot(driver), max_tokens)
+
+
+class DomSnapshotter:
+    """페이지(URL/문서)별 스냅샷 캐시.
+
+    step()은 새 페이지면 전체 스냅샷, 같은 페이지면 MutationObserver가 모은 변경분만 돌려준다.
+    변경분은 이전 스냅샷이 대화에 남아 있어야 의미가 있으므로, 호출 쪽은 full=True일 때 대화 기록을 비운다.
+    LLM이 본 노드(shown)만 변경/삭제를 알리고, 변경분 합계는 max_tokens * max_delta_ratio 안에서 센다.
+    """
+    def __init__(self, evaluate, max_tokens=SNAPSHOT_TOKEN_BUDGET,
+                 max_delta_steps=MAX_DELTA_STEPS, max_delta_ratio=MAX_DELTA_RATIO):
+        self.evaluate = evaluate
+        self.max_tokens = max_tokens
+        self.max_delta_steps = max_delta_steps
+        self.max_delta_ratio = max_delta_ratio
+        self.url = None
+        self.deltas = 0
+        self.shown = set()      # 대화에 실린 노드 id
+        self.delta_chars = 0    # 마지막 전체 스냅샷 이후 보낸 변경분 글자 수
+
+    def full(self):
+        snap = self.evaluate(SNAPSHOT_FN, {'maxText': MAX_TEXT_CHARS, 'mode': 'full'})
+        return self._full_text(snap)
+
+    def _full_text(self, snap):
+        self.url = snap['url']
+        self.deltas = 0
+        self.delta_chars = 0
+        text, shown = _format_snapshot(snap, self.max_tokens)
+        self.shown = {n[6] for n in shown}
+        return text
+
+    def _delta_text(self, delta):
+        """LLM이 본 노드 기준의 변경분 텍스트. 남은 예산에 안 들어가면 None (-> 전체 스냅샷)."""
+        # 예산 때문에 스냅샷에서 빠진 노드의 변경/삭제는 LLM이 모르는 줄이라 알리지 않는다
+        changed = [n for n in delta['changed'] if n[6] in self.shown]
+        removed = [n for n in delta['removed'] if n[6] in self.shown]
+        budget = self.max_tokens * self.max_delta_ratio * 4 - self.delta_chars
+        budget -= len(format_delta(dict(delta, added=[], changed=changed, removed=removed)))
+        if budget < 0:
+            return None
+        added = delta['added']
+        _, keep = _fit(added, budget - len("... 999 more new elements omitted"), 'added: ')
+        if any(added[i][4] for i in range(len(added)) if i not in keep):
+            return None     # 새 버튼/입력칸이 안 들어가면 전체 스냅샷에서 다시 고른다
+        shown_added = [added[i] for i in sorted(keep)]
+        text = format_delta(dict(delta, added=shown_added, changed=changed, removed=removed),
+                            omitted=len(added) - len(shown_added))
+        self.shown.update(n[6] for n in shown_added)
+        self.shown.difference_update(n[6] for n in removed)
+        self.delta_chars += len(text)
+        return text
+
+    def step(self):
+        """-> (프롬프트 텍스트, 전체 스냅샷 여부)"""
+        if self.url is None or self.deltas >= self.max_delta_steps:
+            return self.full(), True
+        delta = self.evaluate(SNAPSHOT_FN, {'maxText': MAX_TEXT_CHARS, 'mode': 'delta'})
+        if delta['full']:               # 내비게이션으로 문서가 바뀜
+            return self._full_text(delta), True
+        if delta['url'] != self.url:    # SPA 라우트 변경
+            return self.full(), True
+        text = self._delta_text(delta)
+        if text is None:
+            return self.full(), True
+        self.deltas += 1
+        return text, False
+
+
+# ----------------------------------------
+# 저장된 HTML 비교: 예전 get_dom_json vs 압축 스냅샷
+# ----------------------------------------
+def _bench(fixtures, max_tokens, use_llm, command):
+    import time
+    from pathlib import Path
+
+    from selenium import webdriver
+    from ai_web_browser import ask_llm, get_dom_json, llm
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    driver = webdriver.Chrome(options=options)
+    try:
+        print(f"{'fixture':<24} {'mode':<9} {'chars':>9} {'~tokens':>8} {'extract ms':>10}"
+              + (f" {'llm s':>7}" if use_llm else ""))
+        for path in fixtures:
+            driver.get(Path(path).resolve().as_uri())
+            for mode in ('full-json', 'snapshot'):
+                start = time.perf_counter()
+                if mode == 'full-json':
+                    page = json.dumps(get_dom_json(driver))
+                else:
+                    page = get_dom_snapshot(driver, max_tokens)
+                extract_ms = (time.perf_counter() - start) * 1000
+                row = (f"{Path(path).name:<24} {mode:<9} {len(page):>9} {estimate_tokens(page):>8} "
+                       f"{extract_ms:>10.1f}")
+                if use_llm:
+                    llm.reset()   # 두 방식 모두 빈 대화에서
+                    start = time.perf_counter()
+                    ask_llm(command, page)
+                    row += f" {time.perf_counter() - start:>7.2f}"
+                print(row)
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DOM snapshot size/latency comparison on saved HTML")
+    parser.add_argument('fixtures', nargs='+', help="저장된 HTML 파일")
+    parser.add_argument('--budget', type=int, default=SNAPSHOT_TOKEN_BUDGET)
+    parser.add_argument('--llm', action='store_true', help="ollama(llama3.1) 한 스텝 응답 시간도 잰다")
+    parser.add_argument('--command', default="click the first button")
+    args = parser.parse_args()
+    _bench(args.fixtures, args.budget, args.llm, args.command)
@@ -20,7 +20,7 @@ function connectToServer() {
         if (data.type === 'realtime') {
             displayRealtimeText(data.text, displayDiv);
         } else if (data.type === 'fullSentence') {
-            fullSentences.push(data.text);
+            if (data.text) fullSentences.push(data.text); // empty when the final failed on the server
             displayRealtimeText("", displayDiv); // Refresh display with new full sentence
         }
     };
@@ -36,7 +36,7 @@ socket.onmessage = function(event) {
     if (data.type === 'realtime') {
         displayRealtimeText(data.text, displayDiv);
     } else if (data.type === 'fullSentence') {
-        fullSentences.push(data.text);
+        if (data.text) fullSentences.push(data.text); // empty when the final failed on the server
         displayRealtimeText("", displayDiv); // Refresh display with new full sentence
     }
 };
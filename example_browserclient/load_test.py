@@ -0,0 +1,179 @@
+"""Drive N synthetic kiosk clients against the STT server.
+
+Every client streams the same audio over the browser protocol (4-byte
+little-endian metadata length, metadata JSON, int16 PCM) and records how
+long it takes, after the last frame of an utterance was sent, until the
+matching `fullSentence` arrives.
+
+    python load_test.py --clients 4 --wav sample_ko.wav
+
+Clients start together, so their utterances end at about the same time.
+To compare batched and unbatched final transcription, run the server with
+the default `--batch-window-ms` and again with `--batch-window-ms 0`; the
+summary line reports throughput and p50/p95 latency.
+
+With `--metrics-url` the run also reports the server's CPU use and the
+partial-update latency it measured, e.g. to compare
+`--realtime-scheduling fixed` against the default adaptive scheduling.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import struct
+import time
+import urllib.request
+import wave
+
+import numpy as np
+import websockets
+
+
+def encode_message(pcm, sample_rate):
+    metadata = json.dumps({'sampleRate': sample_rate}).encode('utf-8')
+    return struct.pack('<I', len(metadata)) + metadata + pcm
+
+
+def read_wav(path):
+    with wave.open(path, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        channels = wf.getnchannels()
+        sample_rate = wf.getframerate()
+    if channels > 1:
+        audio = audio[::channels]
+    return audio, sample_rate
+
+
+def synthetic_utterance(sample_rate, speech_seconds=1.5, silence_seconds=1.5, seed=0):
+    """Voiced-like harmonic burst followed by silence, enough to trip the VAD."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(speech_seconds * sample_rate)) / sample_rate
+    f0 = 140 + 20 * np.sin(2 * np.pi * 3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    voiced *= 0.5 + 0.5 * np.abs(np.sin(2 * np.pi * 4 * t))
+    voiced += 0.02 * rng.standard_normal(len(t))
+    speech = (voiced / np.max(np.abs(voiced)) * 12000).astype(np.int16)
+    silence = np.zeros(int(silence_seconds * sample_rate), dtype=np.int16)
+    return np.concatenate([speech, silence]), len(speech)
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    return float(np.percentile(values, q))
+
+
+async def run_client(client_id, uri, audio, sample_rate, speech_end, chunk_samples,
+                     utterances, speed, timeout):
+    """Stream `audio` `utterances` times; return sentence latencies and partial latencies."""
+    latencies = []
+    partials = []
+    missed = 0
+    async with websockets.connect(uri) as ws:
+        for _ in range(utterances):
+            sent_speech_end = None
+            for start in range(0, len(audio), chunk_samples):
+                chunk = audio[start:start + chunk_samples]
+                await ws.send(encode_message(chunk.tobytes(), sample_rate))
+                if sent_speech_end is None and start + chunk_samples >= speech_end:
+                    sent_speech_end = time.perf_counter()
+                if speed > 0:
+                    await asyncio.sleep(len(chunk) / sample_rate / speed)
+
+            deadline = sent_speech_end + timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    missed += 1
+                    break
+                try:
+                    reply = json.loads(await asyncio.wait_for(ws.recv(), remaining))
+                except asyncio.TimeoutError:
+                    missed += 1
+                    break
+                if reply.get('type') == 'realtime' and reply.get('latency'):
+                    partials.append(reply['latency']['audio_to_text_ms'])
+                if reply.get('type') == 'fullSentence':
+                    latencies.append(time.perf_counter() - sent_speech_end)
+                    break
+    return client_id, latencies, missed, partials
+
+
+def fetch_metrics(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.load(response)
+
+
+async def main(args):
+    if args.wav:
+        audio, sample_rate = read_wav(args.wav)
+        speech_end = len(audio)
+        # Trailing silence so the server-side VAD closes the utterance.
+        audio = np.concatenate([audio, np.zeros(int(1.5 * sample_rate), dtype=np.int16)])
+    else:
+        sample_rate = args.sample_rate
+        audio, speech_end = synthetic_utterance(sample_rate)
+
+    before = fetch_metrics(args.metrics_url) if args.metrics_url else None
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_client(i, args.uri, audio, sample_rate, speech_end, args.chunk,
+                   args.utterances, args.speed, args.timeout)
+        for i in range(args.clients)
+    ), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    all_latencies = []
+    all_partials = []
+    print(f"{'client':>6} {'done':>5} {'missed':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"{'-':>6} client failed: {result!r}")
+            continue
+        client_id, latencies, missed, partials = result
+        all_latencies.extend(latencies)
+        all_partials.extend(partials)
+        ms = [x * 1000 for x in latencies]
+        print(f"{client_id:>6} {len(ms):>5} {missed:>6} {percentile(ms, 50):>8.0f} "
+              f"{percentile(ms, 95):>8.0f} {max(ms, default=float('nan')):>8.0f}")
+
+    ms = [x * 1000 for x in all_latencies]
+    print(f"\n{len(ms)} sentences in {elapsed:.1f}s "
+          f"({len(ms) / elapsed:.2f}/s), p50 {percentile(ms, 50):.0f} ms, "
+          f"p95 {percentile(ms, 95):.0f} ms, mean "
+          f"{statistics.fmean(ms) if ms else float('nan'):.0f} ms")
+    print(f"{len(all_partials)} partial updates, audio->partial p50 "
+          f"{percentile(all_partials, 50):.0f} ms, p95 {percentile(all_partials, 95):.0f} ms")
+
+    if before is not None:
+        after = fetch_metrics(args.metrics_url)
+        cpu = after['process_cpu_s'] - before['process_cpu_s']
+        print(f"server CPU {cpu:.1f}s over {elapsed:.1f}s wall "
+              f"({cpu / elapsed * 100:.0f}% of one core)")
+        counters = {name: after['counters'].get(name, 0) - before['counters'].get(name, 0)
+                    for name in ('gate_blocks', 'gate_skipped_blocks')}
+        if counters['gate_blocks']:
+            print(f"speech gate skipped {counters['gate_skipped_blocks'] / counters['gate_blocks']:.0%} "
+                  f"of {counters['gate_blocks'] * 0.03:.0f}s of audio")
+        for stage in ('realtime_transcribe', 'audio_to_partial', 'final_transcribe'):
+            print(f"  {stage}: {after['stages_ms'].get(stage, {})}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uri', default="ws://localhost:8001")
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--utterances', type=int, default=3, help="utterances per client")
+    parser.add_argument('--wav', help="16-bit PCM WAV to stream (default: synthetic voiced bursts)")
+    parser.add_argument('--sample-rate', type=int, default=48000,
+                        help="sample rate of the synthetic audio")
+    parser.add_argument('--chunk', type=int, default=1024, help="samples per websocket message")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="playback speed relative to real time, 0 = as fast as possible")
+    parser.add_argument('--metrics-url', help="server metrics endpoint, e.g. http://127.0.0.1:9101/metrics")
+    parser.add_argument('--timeout', type=float, default=20.0,
+                        help="seconds to wait for a fullSentence per utterance")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,185 @@
+"""Headless replay of WAV files through the STT websocket protocol.
+
+Streams each file the way client.js does (length-prefixed metadata JSON +
+int16 PCM) at real-time or accelerated speed, and records every partial and
+final transcript with its arrival time and the server's latency fields.
+
+    # against a running server
+    python replay_harness.py samples/*.wav --speed 4 --out replay.jsonl
+
+    # CI: start server.py with stub models, fail if finals go missing
+    python replay_harness.py samples/*.wav --spawn-server --speed 0 --expect-finals 1
+"""
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import websockets
+from scipy.signal import resample_poly
+
+from load_test import encode_message, percentile, read_wav
+
+TRAILING_SILENCE_SECONDS = 1.5
+
+
+def to_client_rate(audio, rate, client_rate):
+    """Resample to the rate a browser AudioContext would report."""
+    if client_rate is None or client_rate == rate:
+        return audio, rate
+    resampled = resample_poly(audio.astype(np.float64), client_rate, rate)
+    return np.clip(np.rint(resampled), -32768, 32767).astype(np.int16), client_rate
+
+
+async def replay_file(uri, path, client_rate, chunk_samples, speed, drain):
+    audio, rate = read_wav(str(path))
+    audio, rate = to_client_rate(audio, rate, client_rate)
+    audio = np.concatenate([audio, np.zeros(int(TRAILING_SILENCE_SECONDS * rate), dtype=np.int16)])
+
+    events = []
+    sent = 0
+    async with websockets.connect(uri) as ws:
+        started = time.perf_counter()
+
+        async def receive():
+            async for raw in ws:
+                reply = json.loads(raw)
+                events.append({
+                    'file': path.name,
+                    'type': reply.get('type'),
+                    'text': reply.get('text'),
+                    'wall_s': round(time.perf_counter() - started, 3),
+                    'audio_sent_s': round(sent / rate, 3),
+                    'latency': reply.get('latency'),
+                })
+
+        receiver = asyncio.create_task(receive())
+        for start in range(0, len(audio), chunk_samples):
+            chunk = audio[start:start + chunk_samples]
+            await ws.send(encode_message(chunk.tobytes(), rate))
+            sent += len(chunk)
+            if speed > 0:
+                # Pace against the clock so per-chunk sleep overhead does not drift.
+                ahead = sent / rate / speed - (time.perf_counter() - started)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+        streamed = time.perf_counter() - started
+        await asyncio.sleep(drain)
+        receiver.cancel()
+
+    return {
+        'file': path.name,
+        'audio_s': len(audio) / rate,
+        'stream_s': streamed,
+        'events': events,
+    }
+
+
+def summarize(results):
+    print(f"{'file':<28} {'audio s':>8} {'x rt':>6} {'partials':>8} {'finals':>6}")
+    partial_latency, final_latency = [], []
+    for result in results:
+        partials = [e for e in result['events'] if e['type'] == 'realtime']
+        finals = [e for e in result['events'] if e['type'] == 'fullSentence']
+        partial_latency += [e['latency']['audio_to_text_ms'] for e in partials if e['latency']]
+        final_latency += [e['latency']['speech_end_to_text_ms'] for e in finals if e['latency']]
+        print(f"{result['file'][:28]:<28} {result['audio_s']:>8.1f} "
+              f"{result['audio_s'] / result['stream_s']:>6.1f} {len(partials):>8} {len(finals):>6}")
+    print(f"\npartial audio->text p50 {percentile(partial_latency, 50):.0f} ms, "
+          f"p95 {percentile(partial_latency, 95):.0f} ms")
+    print(f"final speech end->text p50 {percentile(final_latency, 50):.0f} ms, "
+          f"p95 {percentile(final_latency, 95):.0f} ms")
+    return final_latency
+
+
+def spawn_server(port, stub_rtf):
+    server = subprocess.Popen(
+        [sys.executable, 'server.py', '--stub-models', '--stub-rtf', str(stub_rtf),
+         '--port', str(port), '--metrics-port', '0'],
+        cwd=Path(__file__).parent)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server.py exited with {server.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("server.py did not start listening within 30s")
+
+
+async def main(args):
+    paths = []
+    for name in args.inputs:
+        path = Path(name)
+        paths += sorted(path.glob('*.wav')) if path.is_dir() else [path]
+
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def run(path):
+        async with limit:
+            return await replay_file(args.uri, path, args.sample_rate, args.chunk,
+                                     args.speed, args.drain)
+
+    results = await asyncio.gather(*(run(path) for path in paths))
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            for result in results:
+                for event in result['events']:
+                    f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    final_latency = summarize(results)
+    failures = []
+    for result in results:
+        finals = sum(1 for e in result['events'] if e['type'] == 'fullSentence')
+        if finals < args.expect_finals:
+            failures.append(f"{result['file']}: {finals} finals, expected {args.expect_finals}")
+    if args.max_final_p95_ms and percentile(final_latency, 95) > args.max_final_p95_ms:
+        failures.append(f"final p95 {percentile(final_latency, 95):.0f} ms "
+                        f"> {args.max_final_p95_ms:.0f} ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('inputs', nargs='+', help="WAV files or directories of WAV files")
+    parser.add_argument('--uri', default="ws://localhost:8001")
+    parser.add_argument('--sample-rate', type=int,
+                        help="resample files to this client rate first, e.g. 44100 or 48000")
+    parser.add_argument('--chunk', type=int, default=256, help="samples per websocket message")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="playback speed relative to real time, 0 = as fast as possible")
+    parser.add_argument('--concurrency', type=int, default=1, help="files streamed at once")
+    parser.add_argument('--drain', type=float, default=3.0,
+                        help="seconds to keep listening after the last chunk")
+    parser.add_argument('--out', help="write every received event to this JSONL file")
+    parser.add_argument('--spawn-server', action='store_true',
+                        help="start server.py --stub-models for the duration of the run")
+    parser.add_argument('--stub-rtf', type=float, default=0.0)
+    parser.add_argument('--expect-finals', type=int, default=0,
+                        help="fail if any file yields fewer final transcripts")
+    parser.add_argument('--max-final-p95-ms', type=float,
+                        help="fail if the final-transcript p95 latency is above this")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn_server:
+        port = int(args.uri.rsplit(':', 1)[1].split('/')[0])
+        server = spawn_server(port, args.stub_rtf)
+    try:
+        exit_code = asyncio.run(main(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    sys.exit(exit_code)
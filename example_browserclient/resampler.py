@@ -0,0 +1,173 @@
+"""Streaming polyphase resampler for incoming websocket audio.
+
+The browser sends small int16 chunks at the AudioContext rate (usually
+44.1 or 48 kHz). Resampling each chunk on its own with an FFT costs a full
+transform per chunk and leaves discontinuities at every chunk edge. The
+StreamingResampler keeps the filter history of one connection between
+chunks, so consecutive chunks produce the same output as resampling the
+whole stream at once (delayed by the filter's group delay). Each chunk
+costs one copy into a preallocated buffer and one matrix product over the
+whole input blocks it completes.
+
+Run this file directly for a micro-benchmark against the old per-chunk
+`scipy.signal.resample` path:
+
+    python resampler.py --seconds 30 --chunk 256
+"""
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+from scipy.signal import firwin
+
+
+@lru_cache(maxsize=None)
+def polyphase_filter(original_rate, target_rate):
+    """Return (up, down, phases) for original_rate -> target_rate.
+
+    phases[p] holds the taps of polyphase branch p, reversed so that it can
+    be multiplied directly with a window of input samples oldest-first.
+    The filter is designed like scipy.signal.resample_poly's default.
+    """
+    g = gcd(original_rate, target_rate)
+    up, down = target_rate // g, original_rate // g
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * up
+    taps = -(-len(h) // up)
+    h = np.concatenate([h, np.zeros(taps * up - len(h))])
+    phases = h.reshape(taps, up).T[:, ::-1].copy()
+    phases.setflags(write=False)
+    return up, down, phases
+
+
+MIN_BLOCK_SAMPLES = 96   # input samples per block at least (2 ms at 48 kHz)
+
+
+@lru_cache(maxsize=None)
+def block_matrix(original_rate, target_rate):
+    """Return (block, taps, matrix) for original_rate -> target_rate.
+
+    Every `down` input samples produce exactly `up` output samples with the
+    same phase pattern, so a block of outputs is one row of a strided input
+    view times a fixed matrix. matrix has shape (width, outputs per block);
+    block b reads input samples [b*block, b*block + width), the first taps-1
+    of which overlap the previous block.
+    """
+    up, down, phases = polyphase_filter(original_rate, target_rate)
+    taps = phases.shape[1]
+    # Small ratios (48k -> 16k is 3:1) get several periods per block so the
+    # product is a real matrix multiply instead of a strided dot per output.
+    periods = max(1, MIN_BLOCK_SAMPLES // down)
+    outputs = up * periods
+    width = ((outputs - 1) * down) // up + taps
+    matrix = np.zeros((outputs, width))
+    for r in range(outputs):
+        start = (r * down) // up
+        matrix[r, start:start + taps] = phases[(r * down) % up]
+    matrix = np.ascontiguousarray(matrix.T, dtype=np.float32)
+    matrix.setflags(write=False)
+    return down * periods, taps, matrix
+
+
+class StreamingResampler:
+    """Resamples one connection's int16 mono PCM stream chunk by chunk.
+
+    Input is appended to a preallocated buffer and only whole blocks of
+    input are filtered (one matrix product per chunk), so output can lag
+    the input by up to one block (10 ms at 44.1 kHz, 2 ms at 48 kHz).
+    """
+
+    def __init__(self, original_rate, target_rate=16000):
+        self.original_rate = int(original_rate)
+        self.target_rate = int(target_rate)
+        self.passthrough = self.original_rate == self.target_rate
+        if self.passthrough:
+            return
+        self._block, taps, self._matrix = block_matrix(self.original_rate, self.target_rate)
+        self._width = self._matrix.shape[0]
+        self._buf = np.zeros(self._width + 8192, dtype=np.float32)
+        self._len = taps - 1   # leading zeros as filter history
+
+    def process(self, pcm):
+        """Resample a chunk of int16 PCM bytes and return int16 PCM bytes."""
+        if self.passthrough:
+            return pcm
+        chunk = np.frombuffer(pcm, dtype=np.int16)
+        end = self._len + len(chunk)
+        if end > len(self._buf):
+            grown = np.zeros(2 * end, dtype=np.float32)
+            grown[:self._len] = self._buf[:self._len]
+            self._buf = grown
+        self._buf[self._len:end] = chunk
+        self._len = end
+
+        if end < self._width:
+            return b''
+        blocks = (end - self._width) // self._block + 1
+        step = self._buf.strides[0]
+        windows = np.lib.stride_tricks.as_strided(self._buf, (blocks, self._width), (self._block * step, step),
+                                                  writeable=False)
+        y = windows @ self._matrix
+        consumed = blocks * self._block
+        self._len = end - consumed
+        self._buf[:self._len] = self._buf[consumed:end]
+        return np.clip(np.rint(y.ravel()), -32768, 32767).astype(np.int16).tobytes()
+
+
+def _fft_resample(pcm, original_rate, target_rate):
+    """The previous per-chunk path, kept for the benchmark."""
+    from scipy.signal import resample
+
+    audio = np.frombuffer(pcm, dtype=np.int16)
+    num_target_samples = int(len(audio) * target_rate / original_rate)
+    return resample(audio, num_target_samples).astype(np.int16).tobytes()
+
+
+def _benchmark(seconds, chunk, target_rate):
+    import time
+    from scipy.signal import resample_poly
+
+    rng = np.random.default_rng(0)
+    print(f"{seconds:.0f}s of audio in {chunk}-sample chunks -> {target_rate} Hz")
+    print(f"{'input':>7} {'path':>10} {'CPU ms per audio s':>20} {'max |diff|':>11}")
+    for rate in (44100, 48000):
+        t = np.arange(int(seconds * rate)) / rate
+        signal = 8000 * np.sin(2 * np.pi * 440 * t) + 1000 * rng.standard_normal(len(t))
+        audio = signal.astype(np.int16)
+        chunks = [audio[i:i + chunk].tobytes() for i in range(0, len(audio), chunk)]
+
+        up, down, phases = polyphase_filter(rate, target_rate)
+        reference = resample_poly(audio.astype(np.float64), up, down)
+        delay = 10 * max(up, down) // down  # group delay of the causal filter
+
+        start = time.process_time()
+        fft_out = np.frombuffer(b''.join(_fft_resample(c, rate, target_rate) for c in chunks),
+                                dtype=np.int16)
+        fft_cpu = time.process_time() - start
+
+        resampler = StreamingResampler(rate, target_rate)
+        start = time.process_time()
+        poly_out = np.frombuffer(b''.join(resampler.process(c) for c in chunks), dtype=np.int16)
+        poly_cpu = time.process_time() - start
+
+        n = min(len(fft_out), len(reference))
+        fft_diff = np.max(np.abs(fft_out[:n] - reference[:n]))
+        aligned = poly_out[delay:]
+        n = min(len(aligned), len(reference))
+        poly_diff = np.max(np.abs(aligned[:n] - reference[:n]))
+
+        print(f"{rate:>7} {'fft':>10} {fft_cpu * 1000 / seconds:>20.2f} {fft_diff:>11.0f}")
+        print(f"{rate:>7} {'polyphase':>10} {poly_cpu * 1000 / seconds:>20.2f} {poly_diff:>11.0f}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resampler micro-benchmark")
+    parser.add_argument('--seconds', type=float, default=30.0)
+    parser.add_argument('--chunk', type=int, default=256,
+                        help="samples per chunk (client.js sends 256)")
+    parser.add_argument('--target-rate', type=int, default=16000)
+    args = parser.parse_args()
+    _benchmark(args.seconds, args.chunk, args.target_rate)
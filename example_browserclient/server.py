@@ -1,55 +1,79 @@
 if __name__ == '__main__':
     print("Starting server, please wait...")
-    from RealtimeSTT import AudioToTextRecorder
+    import argparse
     import asyncio
+    import contextlib
     import websockets
     import threading
-    import numpy as np
-    from scipy.signal import resample
-    import json
+    import time
     import logging
     import sys
 
+    from resampler import StreamingResampler
+    from stt_batching import BatchScheduler
+    from stt_framing import AudioQueue, FrameParser
+    from stt_gate import SpeechGate
+    from stt_metrics import metrics, start_metrics_server
+    from stt_models import ModelPool, StubModelPool
+    from stt_sessions import SessionManager, SessionLimitReached
+
+    parser = argparse.ArgumentParser(description="RealtimeSTT websocket server")
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--max-sessions', type=int, default=4,
+                        help="maximum number of concurrently connected kiosks")
+    parser.add_argument('--batch-window-ms', type=float, default=20,
+                        help="how long finished utterances wait for others to share a batch; 0 disables batching")
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--realtime-scheduling', choices=('adaptive', 'fixed'), default='adaptive',
+                        help="adaptive re-runs the realtime pass only on new voiced audio and backs off under CPU load")
+    parser.add_argument('--no-gate', action='store_true',
+                        help="feed all audio to the sessions instead of gating out silence first")
+    parser.add_argument('--gate-min-energy-db', type=float, default=-55.0,
+                        help="blocks quieter than this (dBFS) never count as speech")
+    parser.add_argument('--queue-seconds', type=float, default=10,
+                        help="most audio a session may buffer while transcription catches up")
+    parser.add_argument('--queue-policy', choices=AudioQueue.POLICIES, default='drop',
+                        help="once over --queue-seconds the oldest audio is dropped either way; merge also hands"
+                             " a lagging session its whole backlog as one chunk")
+    parser.add_argument('--compute-type', default='int8',
+                        help="CTranslate2 compute type of the main model (int8, int16, float32, ...)")
+    parser.add_argument('--realtime-compute-type', default='int8')
+    parser.add_argument('--threads', type=int, default=0,
+                        help="CPU threads for the main model; 0 lets CTranslate2 decide")
+    parser.add_argument('--realtime-threads', type=int, default=0)
+    parser.add_argument('--model-cache', help="directory models are downloaded to and loaded from")
+    parser.add_argument('--download-only', action='store_true',
+                        help="fetch the models into --model-cache and exit")
+    parser.add_argument('--no-warmup', action='store_true',
+                        help="skip the warm-up inference at boot")
+    parser.add_argument('--stub-models', action='store_true',
+                        help="use fake models that return the clip length (for CI and replay_harness.py)")
+    parser.add_argument('--stub-rtf', type=float, default=0.0,
+                        help="simulated seconds of compute per second of audio for --stub-models")
+    parser.add_argument('--metrics-host', default="127.0.0.1")
+    parser.add_argument('--metrics-port', type=int, default=9101,
+                        help="port of the JSON latency endpoint at /metrics; 0 disables it")
+    parser.add_argument('--metrics-log', help="append one JSON line per utterance to this file")
+    args = parser.parse_args()
+
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         handlers=[logging.StreamHandler(sys.stdout)]
     )
     logging.getLogger('websockets').setLevel(logging.WARNING)
+    if args.metrics_log:
+        metrics_handler = logging.FileHandler(args.metrics_log, encoding='utf-8')
+        metrics_handler.setFormatter(logging.Formatter('%(message)s'))
+        logging.getLogger('stt.metrics').addHandler(metrics_handler)
 
-    is_running = True
-    recorder = None
-    recorder_ready = threading.Event()
-    client_websocket = None
+    models_ready = threading.Event()
     main_loop = None  # This will hold our primary event loop
 
-    async def send_to_client(message):
-        global client_websocket
-        if client_websocket:
-            try:
-                await client_websocket.send(message)
-            except websockets.exceptions.ConnectionClosed:
-                client_websocket = None
-                print("Client disconnected")
-
-    # Called from the recorder thread on stabilized realtime text.
-    def text_detected(text):
-        global main_loop
-        if main_loop is not None:
-            # Schedule the sending on the main event loop
-            asyncio.run_coroutine_threadsafe(
-                send_to_client(json.dumps({
-                    'type': 'realtime',
-                    'text': text
-                })), main_loop)
-        print(f"\r{text}", flush=True, end='')
-
     recorder_config = {
-        'spinner': False,
-        'use_microphone': False,
         'model': 'medium',
         'language': 'ko',
-        'silero_sensitivity': 0.4,
         'webrtc_sensitivity': 2,
         'post_speech_silence_duration': 0.7,
         'min_length_of_recording': 0,
@@ -57,85 +81,134 @@ if __name__ == '__main__':
         'enable_realtime_transcription': True,
         'realtime_processing_pause': 0,
         'realtime_model_type': 'tiny',
-        'on_realtime_transcription_stabilized': text_detected,
+        'realtime_scheduling': args.realtime_scheduling,
+        'max_queued_seconds': args.queue_seconds,
+        'queue_policy': args.queue_policy,
     }
 
-    def run_recorder():
-        global recorder, main_loop, is_running
-        print("Initializing RealtimeSTT...")
-        recorder = AudioToTextRecorder(**recorder_config)
-        print("RealtimeSTT initialized")
-        recorder_ready.set()
+    if args.stub_models:
+        model_pool = StubModelPool(args.stub_rtf)
+    else:
+        model_pool = ModelPool(download_root=args.model_cache, model_options={
+            recorder_config['model']: {'compute_type': args.compute_type,
+                                       'cpu_threads': args.threads},
+            recorder_config['realtime_model_type']: {'compute_type': args.realtime_compute_type,
+                                                     'cpu_threads': args.realtime_threads},
+        })
+    if args.download_only:
+        model_pool.download([recorder_config['model'], recorder_config['realtime_model_type']])
+        sys.exit(0)
+    # A zero window means batching is off: each session transcribes its own
+    # finals on its own thread instead of queueing behind one batcher.
+    batch_scheduler = None
+    if args.batch_window_ms > 0:
+        batch_scheduler = BatchScheduler(
+            model_pool, recorder_config['model'], recorder_config['language'],
+            max_wait_ms=args.batch_window_ms, max_batch_size=args.max_batch_size)
+    session_manager = SessionManager(model_pool, recorder_config, max_sessions=args.max_sessions,
+                                     scheduler=batch_scheduler)
 
-        # Loop indefinitely checking for full sentence output.
-        while is_running:
-            try:
-                full_sentence = recorder.text()
-                if full_sentence:
-                    if main_loop is not None:
-                        asyncio.run_coroutine_threadsafe(
-                            send_to_client(json.dumps({
-                                'type': 'fullSentence',
-                                'text': full_sentence
-                            })), main_loop)
-                    print(f"\rSentence: {full_sentence}")
-            except Exception as e:
-                print(f"Error in recorder thread: {e}")
-                continue
+    def load_models():
+        print("Loading Whisper models...")
+        names = [recorder_config['model'], recorder_config['realtime_model_type']]
+        model_pool.preload(names)
+        for name in names:
+            if not args.no_warmup:
+                model_pool.warm_up(name, language=recorder_config['language'])
+            stats = model_pool.stats[name]
+            for key in ('load_s', 'warmup_s', 'rtf'):
+                if key in stats:
+                    metrics.set_gauge(f'model_{name}_{key}', stats[key])
+            print(f"  {name}: {stats}")
+        print("Whisper models loaded")
+        models_ready.set()
 
-    def decode_and_resample(audio_data, original_sample_rate, target_sample_rate):
+    def decode_and_resample(resampler, audio_data):
         try:
-            audio_np = np.frombuffer(audio_data, dtype=np.int16)
-            num_original_samples = len(audio_np)
-            num_target_samples = int(num_original_samples * target_sample_rate / original_sample_rate)
-            resampled_audio = resample(audio_np, num_target_samples)
-            return resampled_audio.astype(np.int16).tobytes()
+            return resampler.process(audio_data)
         except Exception as e:
             print(f"Error in resampling: {e}")
             return audio_data
 
     async def echo(websocket):
-        global client_websocket
-        print("Client connected")
-        client_websocket = websocket
+        try:
+            session = session_manager.open(websocket, main_loop)
+        except SessionLimitReached as e:
+            print(f"Rejecting client: {e}")
+            await websocket.close(code=1013, reason="Too many sessions")
+            return
+        print(f"Client {session.id} connected")
+        # One parser and resampler per connection: metadata is decoded only when
+        # it changes and filter state carries across chunks.
+        frame_parser = FrameParser()
+        resampler = None
+        gate = None
+        sender = asyncio.create_task(session.pump())
 
         try:
             async for message in websocket:
-                if not recorder_ready.is_set():
-                    print("Recorder not ready")
+                # 'receive' spans from the message coming off the socket to its
+                # audio being queued for the session; parse/gate/resample are
+                # its parts.
+                arrived = time.perf_counter()
+                if not models_ready.is_set():
+                    print("Models not ready")
                     continue
 
                 try:
-                    # Read the metadata length (first 4 bytes)
-                    metadata_length = int.from_bytes(message[:4], byteorder='little')
-                    # Get the metadata JSON string
-                    metadata_json = message[4:4+metadata_length].decode('utf-8')
-                    metadata = json.loads(metadata_json)
-                    sample_rate = metadata['sampleRate']
-                    # Get the audio chunk following the metadata
-                    chunk = message[4+metadata_length:]
-                    resampled_chunk = decode_and_resample(chunk, sample_rate, 16000)
-                    recorder.feed_audio(resampled_chunk)
+                    with metrics.timer('parse'):
+                        chunk = frame_parser.parse(message)
+                        sample_rate = frame_parser.sample_rate
+                    if resampler is None or resampler.original_rate != sample_rate:
+                        resampler = StreamingResampler(sample_rate, 16000)
+                    if args.no_gate:
+                        blocks = [chunk]
+                    else:
+                        if gate is None or gate.sample_rate != sample_rate:
+                            # Hangover outlasts the session's endpointing silence.
+                            gate = SpeechGate(
+                                sample_rate, min_energy_db=args.gate_min_energy_db,
+                                hangover_seconds=recorder_config['post_speech_silence_duration'] + 0.3)
+                        total, skipped = gate.total_blocks, gate.skipped_blocks
+                        with metrics.timer('gate'):
+                            blocks = gate.process(chunk)
+                        metrics.increment('gate_blocks', gate.total_blocks - total)
+                        metrics.increment('gate_skipped_blocks', gate.skipped_blocks - skipped)
+                    for block in blocks:
+                        with metrics.timer('resample'):
+                            resampled_chunk = decode_and_resample(resampler, block)
+                        if resampled_chunk:  # empty until the resampler has a whole block
+                            session.feed_audio(resampled_chunk)
+                    metrics.observe('receive', time.perf_counter() - arrived)
                 except Exception as e:
                     print(f"Error processing message: {e}")
                     continue
         except websockets.exceptions.ConnectionClosed:
-            print("Client disconnected")
+            print(f"Client {session.id} disconnected")
         finally:
-            if client_websocket == websocket:
-                client_websocket = None
+            if gate is not None:
+                print(f"Client {session.id}: gate skipped {gate.skipped_fraction:.0%} of the audio")
+            session_manager.close(session)
+            sender.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await sender
 
     async def main():
         global main_loop
         main_loop = asyncio.get_running_loop()
 
-        recorder_thread = threading.Thread(target=run_recorder)
-        recorder_thread.daemon = True
-        recorder_thread.start()
-        recorder_ready.wait()
+        loader_thread = threading.Thread(target=load_models)
+        loader_thread.daemon = True
+        loader_thread.start()
+        models_ready.wait()
+        if batch_scheduler is not None:
+            batch_scheduler.start()
+        if args.metrics_port:
+            start_metrics_server(args.metrics_host, args.metrics_port)
+            print(f"Latency metrics at http://{args.metrics_host}:{args.metrics_port}/metrics")
 
-        print("Server started. Press Ctrl+C to stop the server.")
-        async with websockets.serve(echo, "0.0.0.0", 8001):
+        print(f"Server started (max {args.max_sessions} sessions). Press Ctrl+C to stop the server.")
+        async with websockets.serve(echo, args.host, args.port):
             try:
                 await asyncio.Future()  # run forever
             except asyncio.CancelledError:
@@ -144,9 +217,8 @@ if __name__ == '__main__':
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        is_running = False
-        recorder.stop()
-        recorder.shutdown()
+        pass
     finally:
-        if recorder:
-            del recorder
+        session_manager.close_all()
+        if batch_scheduler is not None:
+            batch_scheduler.stop()
@@ -0,0 +1,187 @@
+"""Dynamic batching of final transcriptions across sessions.
+
+When several kiosks finish an utterance at about the same time, their audio
+is padded to Whisper's 30 s window anyway, so running them through the main
+model as one batch costs little more than running one. The scheduler waits
+at most `max_wait_ms` after the first queued utterance for others to join,
+then transcribes the whole batch and hands each text back to the session
+that submitted it, together with the queue and transcription times.
+"""
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+from stt_metrics import metrics, ms
+from stt_sessions import DECODE_OPTIONS, transcribe
+
+logger = logging.getLogger(__name__)
+
+WHISPER_WINDOW_SECONDS = 30
+SAMPLE_RATE = 16000
+
+
+def transcribe_batch(model, audios, language, beam_size):
+    """Transcribe several <=30 s float32 clips with one generate() call per temperature.
+
+    Decodes with the same DECODE_OPTIONS as transcribe(): a clip whose text is
+    too repetitive or too unlikely is decoded again at the next temperature,
+    and a clip the model judges to be silence comes back empty. The only
+    difference is that no timestamp tokens are generated, since the text
+    drops them anyway.
+    """
+    if hasattr(model, 'transcribe_batch'):
+        return model.transcribe_batch(audios, language=language, beam_size=beam_size)
+    import ctranslate2
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+    from faster_whisper.transcribe import get_compression_ratio, get_suppressed_tokens
+
+    opts = DECODE_OPTIONS
+    tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual,
+                          task='transcribe', language=language)
+    features = np.stack([pad_or_trim(model.feature_extractor(audio)) for audio in audios])
+    prompt = list(tokenizer.sot_sequence) + [tokenizer.no_timestamps]
+    suppress_tokens = list(get_suppressed_tokens(tokenizer, list(opts['suppress_tokens'])))
+
+    texts = [''] * len(audios)
+    attempts = [[] for _ in audios]
+    pending = list(range(len(audios)))
+    for temperature in opts['temperature']:
+        if temperature > 0:
+            search = {'beam_size': 1, 'num_hypotheses': opts['best_of'],
+                      'sampling_topk': 0, 'sampling_temperature': temperature}
+        else:
+            search = {'beam_size': beam_size, 'patience': opts['patience']}
+        results = model.model.generate(
+            ctranslate2.StorageView.from_array(np.ascontiguousarray(features[pending])),
+            [prompt] * len(pending),
+            length_penalty=opts['length_penalty'],
+            repetition_penalty=opts['repetition_penalty'],
+            no_repeat_ngram_size=opts['no_repeat_ngram_size'],
+            max_length=448,
+            return_scores=True,
+            return_no_speech_prob=True,
+            suppress_blank=opts['suppress_blank'],
+            suppress_tokens=suppress_tokens,
+            **search,
+        )
+        retry = []
+        for i, result in zip(pending, results):
+            tokens = result.sequences_ids[0]
+            # generate() returns the length-normalised score; recover the average log prob.
+            avg_logprob = result.scores[0] * len(tokens) ** opts['length_penalty'] / (len(tokens) + 1)
+            text = tokenizer.decode(tokens).strip()
+            unlikely = avg_logprob < opts['log_prob_threshold']
+            if result.no_speech_prob > opts['no_speech_threshold'] and unlikely:
+                continue  # silence: transcribe() drops this segment too
+            repetitive = get_compression_ratio(text) > opts['compression_ratio_threshold']
+            if repetitive or unlikely:
+                attempts[i].append((not repetitive, avg_logprob, text))
+                retry.append(i)
+            else:
+                texts[i] = text
+        pending = retry
+        if not pending:
+            break
+    for i in pending:
+        # Every temperature failed: keep the likeliest non-repetitive attempt, like transcribe().
+        texts[i] = max(attempts[i])[2]
+    return texts
+
+
+class BatchScheduler:
+    def __init__(self, pool, model_name, language, beam_size=5,
+                 max_wait_ms=20, max_batch_size=8):
+        self.pool = pool
+        self.model_name = model_name
+        self.language = language
+        self.beam_size = beam_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.is_running = True
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="stt-batcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.is_running = False
+
+    def submit(self, audio, callback):
+        """Queue a finished utterance.
+
+        `callback(text, timing)` runs on the batcher thread; timing holds
+        queue_ms, transcribe_ms and batch_size. If the batch fails, text is
+        empty and timing also holds `error`.
+        """
+        self._queue.put((audio, callback, time.perf_counter()))
+
+    def _run(self):
+        while self.is_running:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                print(f"Error in batch transcription: {e}")
+                self._fail_batch(batch, e)
+
+    def _fail_batch(self, batch, error):
+        # Every session still gets an answer, or its utterance would hang forever.
+        now = time.perf_counter()
+        for _, callback, submitted_at in batch:
+            self._deliver(callback, '', {'queue_ms': ms(now - submitted_at), 'transcribe_ms': 0.0,
+                                         'batch_size': len(batch), 'error': str(error)})
+
+    @staticmethod
+    def _deliver(callback, text, timing):
+        # One session's failing callback must not cost the rest of the batch their results.
+        try:
+            callback(text, timing)
+        except Exception as e:
+            print(f"Error delivering transcription: {e}")
+
+    def _run_batch(self, batch):
+        model = self.pool.get(self.model_name)
+        short, oversized = [], []
+        for item in batch:
+            if len(item[0]) <= WHISPER_WINDOW_SECONDS * SAMPLE_RATE:
+                short.append(item)
+            else:
+                oversized.append(item)
+
+        start = time.perf_counter()
+        if len(short) > 1:
+            texts = transcribe_batch(model, [audio for audio, _, _ in short],
+                                     self.language, self.beam_size)
+        else:
+            texts = [transcribe(model, audio, self.language, self.beam_size)
+                     for audio, _, _ in short]
+        # Clips longer than one window need faster-whisper's own chunking.
+        texts += [transcribe(model, audio, self.language, self.beam_size)
+                  for audio, _, _ in oversized]
+        elapsed = time.perf_counter() - start
+        metrics.observe('final_transcribe', elapsed)
+        metrics.set_gauge('last_batch_size', len(batch))
+        logger.debug("Transcribed batch of %d in %.0f ms", len(batch), elapsed * 1000)
+
+        for (_, callback, submitted_at), text in zip(short + oversized, texts):
+            metrics.observe('final_queue', start - submitted_at)
+            self._deliver(callback, text, {'queue_ms': ms(start - submitted_at),
+                                           'transcribe_ms': ms(elapsed), 'batch_size': len(batch)})
@@ -0,0 +1,165 @@
+"""Hands transcription events from worker threads to the event loop.
+
+Session and batcher threads used to schedule one `run_coroutine_threadsafe`
+per partial and never looked at the returned futures, so a slow websocket
+let them pile up without bound. TranscriptEvents is an async iterator
+backed by a small coalescing buffer instead: only the latest partial is
+kept, finals are kept in order up to `max_finals`, and at most one wake-up
+callback is ever pending on the loop.
+
+Run this file directly for a stress test that fires partials at a high
+rate into a slow consumer and checks memory stays flat:
+
+    python stt_bridge.py --partials 500000
+"""
+import asyncio
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptEvents:
+    def __init__(self, loop, max_finals=32):
+        self.max_finals = max_finals
+        self.coalesced = 0
+        self.dropped = 0
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._finals = deque()
+        self._partial = None
+        self._closed = False
+        self._wakeup_pending = False
+        self._wakeup = asyncio.Event()
+
+    def publish(self, event, final):
+        """Thread-safe. A final supersedes any partial that is still pending."""
+        with self._lock:
+            if self._closed:
+                return
+            if final:
+                self._partial = None
+                if len(self._finals) >= self.max_finals:
+                    self._finals.popleft()
+                    self.dropped += 1
+                    logger.warning("Client is not reading transcripts, dropped a final")
+                self._finals.append(event)
+            else:
+                if self._partial is not None:
+                    self.coalesced += 1
+                self._partial = event
+            self._schedule_wakeup()
+
+    def close(self):
+        """Thread-safe. Iteration stops once the pending events are consumed."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._schedule_wakeup()
+
+    def pending(self):
+        with self._lock:
+            return len(self._finals) + (self._partial is not None)
+
+    def _schedule_wakeup(self):
+        # Called with the lock held.
+        if self._wakeup_pending:
+            return
+        self._wakeup_pending = True
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            pass  # loop already closed during shutdown
+
+    def _wake(self):
+        with self._lock:
+            self._wakeup_pending = False
+        self._wakeup.set()
+
+    def _take(self):
+        with self._lock:
+            if self._finals:
+                return self._finals.popleft()
+            event, self._partial = self._partial, None
+            return event
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            event = self._take()
+            if event is not None:
+                return event
+            if self._closed:
+                raise StopAsyncIteration
+            self._wakeup.clear()
+            # Re-check after clearing so a publish in between is not missed.
+            event = self._take()
+            if event is not None:
+                return event
+            await self._wakeup.wait()
+
+
+def _stress(partials, finals_every, consumer_delay):
+    import time
+    import tracemalloc
+
+    async def run():
+        events = TranscriptEvents(asyncio.get_running_loop())
+        delivered = 0
+
+        def produce():
+            for i in range(partials):
+                final = finals_every and i % finals_every == finals_every - 1
+                events.publish(('x' * 200, time.perf_counter(), None), final=final)
+            events.close()
+
+        async def consume():
+            nonlocal delivered
+            async for event in events:
+                delivered += 1
+                await asyncio.sleep(consumer_delay)
+
+        tracemalloc.start()
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        baseline = tracemalloc.get_traced_memory()[0]
+        producer = threading.Thread(target=produce)
+        started = time.perf_counter()
+        producer.start()
+        peak_growth = 0
+        while producer.is_alive():
+            await asyncio.sleep(0.05)
+            peak_growth = max(peak_growth, tracemalloc.get_traced_memory()[0] - baseline)
+        producer.join()
+        await consumer
+        tracemalloc.stop()
+        elapsed = time.perf_counter() - started
+        print(f"published {partials} events in {elapsed:.1f}s "
+              f"({partials / elapsed:,.0f}/s), delivered {delivered}, "
+              f"coalesced {events.coalesced}, dropped finals {events.dropped}")
+        print(f"peak memory growth {peak_growth / 1024:.1f} KiB, "
+              f"tasks left {len(asyncio.all_tasks()) - 1}")
+        return peak_growth
+
+    growth = asyncio.run(run())
+    limit = 1024 * 1024
+    if growth > limit:
+        raise SystemExit(f"FAIL: memory grew by {growth / 1024:.0f} KiB (limit {limit // 1024} KiB)")
+    print("OK: memory stayed flat")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="TranscriptEvents stress test")
+    parser.add_argument('--partials', type=int, default=500000)
+    parser.add_argument('--finals-every', type=int, default=1000,
+                        help="publish every Nth event as a final (0 = partials only)")
+    parser.add_argument('--consumer-delay', type=float, default=0.002,
+                        help="seconds the consumer spends per event, simulating a slow socket")
+    args = parser.parse_args()
+    _stress(args.partials, args.finals_every, args.consumer_delay)
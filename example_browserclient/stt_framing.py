@@ -0,0 +1,118 @@
+"""Websocket audio framing and the bounded queue in front of each session.
+
+Browser messages are `<uint32 LE metadata length><metadata JSON><int16 PCM>`.
+FrameParser works on a memoryview of the message, so the PCM is never
+sliced into a new bytes object, and it only decodes the metadata JSON when
+its bytes differ from the previous message on the same connection.
+
+AudioQueue bounds how much audio can pile up when transcription falls
+behind. Only its byte budget decides when audio is dropped, and then the
+oldest audio goes first. Small chunks are coalesced into the newest queued
+one so the deque stays short; with the 'merge' policy every chunk is, so
+a session that falls behind takes its whole backlog in one get().
+"""
+import json
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class FrameParser:
+    def __init__(self):
+        self._metadata_raw = None
+        self.metadata = None
+        self.sample_rate = None
+
+    def parse(self, message):
+        """Return a memoryview of the PCM payload of `message`."""
+        view = memoryview(message)
+        end = 4 + int.from_bytes(view[:4], byteorder='little')
+        if end > len(view):
+            raise ValueError(f"metadata length {end - 4} exceeds message size {len(view)}")
+        metadata_raw = view[4:end]
+        if metadata_raw != self._metadata_raw:
+            self._metadata_raw = metadata_raw.tobytes()
+            self.metadata = json.loads(self._metadata_raw)
+            self.sample_rate = int(self.metadata['sampleRate'])
+        return view[end:]
+
+
+COALESCE_BYTES = 16 * 1024  # ~0.5 s of 16 kHz int16
+
+
+class AudioQueue:
+    POLICIES = ('drop', 'merge')
+
+    def __init__(self, max_bytes, policy='drop'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown queue policy {policy!r}, expected one of {self.POLICIES}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.dropped_bytes = 0
+        self._chunks = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, chunk):
+        with self._cond:
+            if self._closed:
+                return
+            if self._chunks and (self.policy == 'merge' or len(self._chunks[-1]) < COALESCE_BYTES):
+                tail = self._chunks[-1]
+                if not isinstance(tail, bytearray):
+                    tail = self._chunks[-1] = bytearray(tail)
+                tail += chunk
+                self._size += len(chunk)
+            else:
+                self._chunks.append(chunk)
+                self._size += len(chunk)
+            while self._size > self.max_bytes:
+                excess = self._size - self.max_bytes
+                if len(self._chunks[0]) <= excess:
+                    self._drop_oldest()
+                else:
+                    self._trim_oldest(excess)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest chunk; None on timeout or once the queue is closed and empty."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._chunks or self._closed, timeout):
+                return None
+            if not self._chunks:
+                return None
+            chunk = self._chunks.popleft()
+            self._size -= len(chunk)
+            return chunk
+
+    def close(self):
+        """Wake up blocked readers; later puts are ignored."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    @property
+    def size(self):
+        return self._size
+
+    def _drop_oldest(self):
+        chunk = self._chunks.popleft()
+        self._size -= len(chunk)
+        self._count_dropped(len(chunk))
+
+    def _trim_oldest(self, excess):
+        excess += excess % 2  # keep int16 samples aligned
+        self._chunks[0] = self._chunks[0][excess:]
+        self._size -= excess
+        self._count_dropped(excess)
+
+    def _count_dropped(self, nbytes):
+        if not self.dropped_bytes:
+            logger.warning("Transcription is falling behind, dropping queued audio")
+        self.dropped_bytes += nbytes
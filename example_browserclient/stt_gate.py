@@ -0,0 +1,103 @@
+"""Cheap speech gate in front of the resampler.
+
+The browser streams microphone audio all the time, so an idle kiosk used
+to resample, VAD and queue silence around the clock. SpeechGate cuts the
+raw stream into 30 ms blocks at the client's sample rate and only lets
+speech through: an energy check against an adaptive noise floor rejects
+most silence, and WebRTC VAD confirms the rest when the client rate is one
+it supports (8/16/32/48 kHz; 44.1 kHz falls back to energy only).
+
+The noise floor is a minimum follower updated on every block: it drops
+quickly to quieter blocks and creeps up slowly otherwise, so it settles on
+steady room noise at any level while the pauses between words keep pulling
+it back down during speech.
+
+A short pre-roll ring buffer is flushed when speech starts so onsets are
+not clipped. After speech ends, audio keeps flowing for `hangover_seconds`,
+which must be longer than the session's post_speech_silence_duration so
+the session can still close the utterance.
+"""
+import math
+from collections import deque
+
+import numpy as np
+import webrtcvad
+
+BLOCK_MS = 30
+WEBRTC_RATES = (8000, 16000, 32000, 48000)
+NOISE_FLOOR_FALL = 0.3          # fraction of the gap closed per quieter block
+NOISE_FLOOR_RISE_DB_PER_S = 2.0
+
+
+class SpeechGate:
+    def __init__(self, sample_rate, min_energy_db=-55.0, margin_db=10.0,
+                 preroll_seconds=0.3, hangover_seconds=1.0, vad_mode=2):
+        self.sample_rate = int(sample_rate)
+        self.min_energy_db = min_energy_db
+        self.margin_db = margin_db
+        self.block_bytes = self.sample_rate * BLOCK_MS // 1000 * 2
+        self._vad = webrtcvad.Vad(vad_mode) if self.sample_rate in WEBRTC_RATES else None
+        self._pending = b''
+        self._preroll = deque(maxlen=max(1, int(preroll_seconds * 1000 / BLOCK_MS)))
+        self._hangover_blocks = int(hangover_seconds * 1000 / BLOCK_MS)
+        self._hangover = 0
+        self._noise_floor_db = -60.0
+        self._floor_rise_db = NOISE_FLOOR_RISE_DB_PER_S * BLOCK_MS / 1000
+        self.total_blocks = 0
+        self.skipped_blocks = 0
+
+    @property
+    def skipped_fraction(self):
+        return self.skipped_blocks / self.total_blocks if self.total_blocks else 0.0
+
+    def process(self, pcm):
+        """Take raw int16 PCM; return the list of 30 ms blocks to pass on.
+
+        Blocks are memoryview slices of `pcm` except one that straddles two
+        calls, so the caller must not modify `pcm` afterwards.
+        """
+        view = memoryview(pcm)
+        passed = []
+        offset = 0
+        if self._pending:
+            offset = self.block_bytes - len(self._pending)
+            if len(view) < offset:
+                self._pending += view
+                return passed
+            self._gate(self._pending + view[:offset], passed)
+        usable = offset + (len(view) - offset) // self.block_bytes * self.block_bytes
+        for start in range(offset, usable, self.block_bytes):
+            self._gate(view[start:start + self.block_bytes], passed)
+        self._pending = view[usable:].tobytes()
+        return passed
+
+    def _gate(self, block, passed):
+        self.total_blocks += 1
+        if self._is_speech(block):
+            # Held pre-roll was counted as skipped; it is passed after all.
+            self.skipped_blocks -= len(self._preroll)
+            passed.extend(self._preroll)
+            self._preroll.clear()
+            passed.append(block)
+            self._hangover = self._hangover_blocks
+        elif self._hangover > 0:
+            self._hangover -= 1
+            passed.append(block)
+        else:
+            self._preroll.append(block)
+            self.skipped_blocks += 1
+
+    def _is_speech(self, block):
+        samples = np.frombuffer(block, dtype=np.int16).astype(np.float32)
+        energy_db = 10 * math.log10(float(np.dot(samples, samples)) / len(samples) / 32768.0 ** 2
+                                    + 1e-12)
+        threshold = max(self.min_energy_db, self._noise_floor_db + self.margin_db)
+        if energy_db < self._noise_floor_db:
+            self._noise_floor_db += NOISE_FLOOR_FALL * (energy_db - self._noise_floor_db)
+            # Below here the min_energy_db threshold decides anyway.
+            self._noise_floor_db = max(self._noise_floor_db, self.min_energy_db - self.margin_db)
+        else:
+            self._noise_floor_db = min(energy_db, self._noise_floor_db + self._floor_rise_db)
+        if energy_db < threshold:
+            return False
+        return self._vad is None or self._vad.is_speech(block, self.sample_rate)
@@ -0,0 +1,113 @@
+"""Per-stage latency metrics for the STT server.
+
+Every stage of the voice pipeline (websocket receive and its parse, gate
+and resample steps, VAD, the realtime pass, the final pass, send-back)
+reports its duration into a rolling histogram. `start_metrics_server` exposes p50/p95/p99 of every
+stage as JSON on a local HTTP endpoint, and one JSON line per finished
+utterance is written to the `stt.metrics` logger.
+
+    curl http://localhost:9101/metrics
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+utterance_logger = logging.getLogger('stt.metrics')
+
+
+class Histogram:
+    """Keeps the most recent `maxlen` observations, in milliseconds."""
+
+    def __init__(self, maxlen=2048):
+        self._values = deque(maxlen=maxlen)
+        self.count = 0
+
+    def observe(self, ms):
+        self._values.append(ms)
+        self.count += 1
+
+    def summary(self):
+        values = sorted(self._values)
+        if not values:
+            return {'count': self.count}
+
+        def pct(q):
+            return round(values[min(len(values) - 1, int(q / 100 * len(values)))], 2)
+
+        return {'count': self.count, 'p50': pct(50), 'p95': pct(95), 'p99': pct(99),
+                'max': round(values[-1], 2)}
+
+
+class Metrics:
+    def __init__(self):
+        self._histograms = defaultdict(Histogram)
+        self._gauges = {}
+        self._counters = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._histograms[stage].observe(seconds * 1000)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'stages_ms': {stage: h.summary() for stage, h in sorted(self._histograms.items())},
+                'gauges': dict(self._gauges),
+                'counters': dict(self._counters),
+                'process_cpu_s': round(time.process_time(), 3),
+            }
+
+    def log_utterance(self, record):
+        utterance_logger.info(json.dumps(record, ensure_ascii=False))
+
+
+# Shared by the server, sessions and the batch scheduler.
+metrics = Metrics()
+
+
+def ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def start_metrics_server(host, port, source=metrics):
+    """Serve `source.snapshot()` as JSON at http://host:port/metrics."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = json.dumps(source.snapshot()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="stt-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,163 @@
+"""Shared pool of loaded Whisper models for the STT server.
+
+AudioToTextRecorder loads its own copy of the main and realtime models, so
+every recorder instance pays the full load time and memory. The pool loads
+each faster-whisper model once and hands the same instance to every session.
+
+StubModelPool stands in for the real models (server.py --stub-models) so the
+protocol and throughput can be checked without downloading Whisper.
+
+Run this file directly to compare startup time and real-time factor across
+compute types and thread counts:
+
+    python stt_models.py --models medium tiny --compute-types int8 int16 float32 --threads 2 4
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ModelPool:
+    """Loads each model once; `model_options` sets compute_type/cpu_threads/num_workers per model."""
+
+    def __init__(self, device='cpu', compute_type='default', download_root=None, model_options=None):
+        self.device = device
+        self.compute_type = compute_type
+        self.download_root = download_root
+        self.model_options = model_options or {}
+        self.stats = {}
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Return the loaded model `name`, loading it on first use."""
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                start = time.perf_counter()
+                model = self._load(name)
+                self.stats[name] = {'load_s': round(time.perf_counter() - start, 2),
+                                    **self.options(name)}
+                logger.info("Loaded model %s in %.1fs (%s)", name,
+                            self.stats[name]['load_s'], self.options(name))
+                self._models[name] = model
+            return model
+
+    def preload(self, names):
+        for name in names:
+            self.get(name)
+
+    def options(self, name):
+        return {'compute_type': self.compute_type, 'cpu_threads': 0, 'num_workers': 1,
+                **self.model_options.get(name, {})}
+
+    def warm_up(self, name, language=None, seconds=2.0):
+        """Run two inferences so the first customer does not pay allocation costs.
+
+        The first run is reported as warmup_s, the second as the real-time
+        factor (compute seconds per second of audio).
+        """
+        model = self.get(name)
+        audio = (np.random.default_rng(0).standard_normal(int(seconds * 16000)) * 0.01
+                 ).astype(np.float32)
+        timings = []
+        for _ in range(2):
+            start = time.perf_counter()
+            segments, _ = model.transcribe(audio, language=language, beam_size=1)
+            list(segments)
+            timings.append(time.perf_counter() - start)
+        self.stats[name].update(warmup_s=round(timings[0], 3), rtf=round(timings[1] / seconds, 3))
+        return self.stats[name]
+
+    def download(self, names):
+        """Fetch models into the cache directory without loading them."""
+        from faster_whisper import download_model
+
+        for name in names:
+            path = download_model(name, cache_dir=self.download_root)
+            logger.info("Model %s cached at %s", name, path)
+
+    def _load(self, name):
+        from faster_whisper import WhisperModel
+
+        kwargs = dict(device=self.device, download_root=self.download_root, **self.options(name))
+        try:
+            # Skip the hub round-trip when the model is already cached.
+            return WhisperModel(name, local_files_only=True, **kwargs)
+        except Exception:
+            return WhisperModel(name, **kwargs)
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+
+StubSegment = namedtuple('StubSegment', 'text')
+
+
+class StubModel:
+    """Deterministic fake: the "transcript" is the clip length.
+
+    `rtf` is the simulated real-time factor, i.e. seconds of compute per
+    second of audio, so throughput regressions still show up in CI.
+    """
+
+    def __init__(self, name, rtf=0.0):
+        self.name = name
+        self.rtf = rtf
+
+    def _text(self, audio):
+        seconds = len(audio) / 16000
+        time.sleep(seconds * self.rtf)
+        return f"{self.name} {seconds:.2f}s"
+
+    def transcribe(self, audio, **kwargs):
+        return [StubSegment(self._text(audio))], None
+
+    def transcribe_batch(self, audios, language=None, beam_size=None):
+        # One batch costs as much as its longest clip, like a padded batch.
+        longest = max(len(audio) for audio in audios)
+        time.sleep(longest / 16000 * self.rtf)
+        return [f"{self.name} {len(audio) / 16000:.2f}s" for audio in audios]
+
+
+class StubModelPool(ModelPool):
+    def __init__(self, rtf=0.0):
+        super().__init__()
+        self.rtf = rtf
+
+    def _load(self, name):
+        return StubModel(name, self.rtf)
+
+
+def _benchmark(args):
+    import itertools
+
+    print(f"{'model':<8} {'compute':<8} {'threads':>7} {'load s':>7} {'warmup s':>8} {'rtf':>6}")
+    for name, compute_type, threads in itertools.product(
+            args.models, args.compute_types, args.threads):
+        pool = ModelPool(device=args.device, download_root=args.model_cache,
+                         model_options={name: {'compute_type': compute_type,
+                                               'cpu_threads': threads}})
+        stats = pool.warm_up(name, language=args.language)
+        print(f"{name:<8} {compute_type:<8} {threads:>7} {stats['load_s']:>7.2f} "
+              f"{stats['warmup_s']:>8.2f} {stats['rtf']:>6.3f}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Startup time and RTF per model setting")
+    parser.add_argument('--models', nargs='+', default=['medium', 'tiny'])
+    parser.add_argument('--compute-types', nargs='+', default=['int8', 'int16', 'float32'])
+    parser.add_argument('--threads', nargs='+', type=int, default=[0],
+                        help="cpu_threads values; 0 lets CTranslate2 decide")
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--language', default='ko')
+    parser.add_argument('--model-cache')
+    _benchmark(parser.parse_args())
@@ -0,0 +1,110 @@
+"""Adaptive scheduling of the realtime (partial transcript) pass.
+
+With `realtime_processing_pause: 0` the tiny model re-transcribes the
+growing utterance as fast as it can, which keeps one core busy per kiosk
+even when nothing new has been said. RealtimeScheduler only lets the pass
+run again once enough new voiced audio has arrived, stretches the pause
+while the process is CPU bound, and hands back the stable part of the
+previous partials so the decoder can start from it instead of from
+scratch.
+"""
+import os
+import threading
+import time
+
+
+class CpuMonitor:
+    """Process CPU utilisation (0..1 of all cores), sampled at most every `interval` s."""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self._cores = os.cpu_count() or 1
+        self._lock = threading.Lock()
+        self._last_wall = time.monotonic()
+        self._last_cpu = time.process_time()
+        self._load = 0.0
+        self._seq = 0
+
+    def sample(self):
+        """Return (sequence number, load); the number changes only when the load is re-measured."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_wall >= self.interval:
+                cpu = time.process_time()
+                self._load = (cpu - self._last_cpu) / (now - self._last_wall) / self._cores
+                self._last_wall, self._last_cpu = now, cpu
+                self._seq += 1
+            return self._seq, self._load
+
+    def load(self):
+        return self.sample()[1]
+
+
+cpu_monitor = CpuMonitor()
+
+
+def common_word_prefix(a, b):
+    """Longest shared prefix of two texts that ends on a word boundary."""
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    if n == len(a) == len(b):
+        return a
+    prefix = a[:n]
+    cut = prefix.rfind(' ')
+    return prefix[:cut].strip() if cut > 0 else ''
+
+
+class RealtimeScheduler:
+    def __init__(self, mode='adaptive', min_pause=0.0, max_pause=1.5,
+                 min_new_voiced=0.3, cpu_high=0.85, cpu_low=0.5, monitor=cpu_monitor):
+        self.mode = mode
+        self.min_pause = min_pause
+        self.max_pause = max_pause
+        self.min_new_voiced = min_new_voiced
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.monitor = monitor
+        self.pause = min_pause
+        self._cpu_sample = None
+        self.reset()
+
+    def reset(self):
+        """Start of a new utterance."""
+        self._new_voiced = 0.0
+        self._last_run = 0.0
+        self._partials = ['', '']
+
+    def note_voiced(self, seconds):
+        self._new_voiced += seconds
+
+    def should_run(self, now):
+        if self.mode != 'adaptive':
+            return now - self._last_run >= self.min_pause
+        if self._new_voiced < self.min_new_voiced:
+            # Only silence or a few frames of speech since the last pass:
+            # the previous partial still stands.
+            return False
+        seq, load = self.monitor.sample()
+        if seq != self._cpu_sample:
+            # Adapt once per CPU sample, not once per chunk: the monitor only
+            # re-measures every `interval` seconds.
+            self._cpu_sample = seq
+            if load > self.cpu_high:
+                self.pause = min(self.max_pause, max(0.1, self.pause * 2))
+            elif load < self.cpu_low:
+                self.pause = max(self.min_pause, self.pause / 2)
+        return now - self._last_run >= self.pause
+
+    def stable_prefix(self):
+        """Text both of the last two partials agree on, used as a decoder prefix."""
+        if self.mode != 'adaptive':
+            return ''
+        return common_word_prefix(*self._partials)
+
+    def ran(self, now, text):
+        self._last_run = now
+        self._new_voiced = 0.0
+        self._partials = [self._partials[1], text]
@@ -0,0 +1,319 @@
+"""Per-connection transcription sessions for the STT server.
+
+Each websocket connection gets a Session with its own audio buffer, VAD
+state and transcript channel. Sessions borrow their Whisper models from a
+shared ModelPool, so opening a connection never reloads `medium`/`tiny`.
+Finished utterances go to a shared BatchScheduler (see stt_batching.py)
+when one is given, otherwise they are transcribed on the session thread.
+Stage timings are reported to stt_metrics and attached to every message.
+Transcripts reach the event loop through a coalescing TranscriptEvents
+stream that `Session.pump()` forwards to the websocket.
+"""
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import webrtcvad
+import websockets
+
+from stt_bridge import TranscriptEvents
+from stt_framing import AudioQueue
+from stt_metrics import metrics, ms
+from stt_realtime import RealtimeScheduler
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2  # int16 mono
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+DEFAULT_CONFIG = {
+    'model': 'medium',
+    'realtime_model_type': 'tiny',
+    'language': 'ko',
+    'webrtc_sensitivity': 2,
+    'post_speech_silence_duration': 0.7,
+    'min_length_of_recording': 0,
+    'min_gap_between_recordings': 0,
+    'pre_recording_buffer_duration': 1.0,
+    'enable_realtime_transcription': True,
+    'realtime_processing_pause': 0,
+    'realtime_scheduling': 'adaptive',
+    'realtime_min_new_voiced': 0.3,
+    'realtime_max_pause': 1.5,
+    'beam_size': 5,
+    'beam_size_realtime': 3,
+    'max_queued_seconds': 10,
+    'queue_policy': 'drop',
+}
+
+
+class SessionLimitReached(Exception):
+    pass
+
+
+def pcm16_to_float(pcm):
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+# faster-whisper's transcribe() defaults, spelled out so the batched path in
+# stt_batching decodes with exactly the same options.
+DECODE_OPTIONS = {
+    'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+    'best_of': 5,
+    'patience': 1,
+    'length_penalty': 1,
+    'repetition_penalty': 1,
+    'no_repeat_ngram_size': 0,
+    'compression_ratio_threshold': 2.4,
+    'log_prob_threshold': -1.0,
+    'no_speech_threshold': 0.6,
+    'suppress_blank': True,
+    'suppress_tokens': [-1],
+}
+
+
+def transcribe(model, audio, language, beam_size, prefix=None):
+    segments, _ = model.transcribe(audio, language=language, beam_size=beam_size, prefix=prefix,
+                                   **DECODE_OPTIONS)
+    text = " ".join(segment.text.strip() for segment in segments).strip()
+    # The decoder continues after the prefix and does not repeat it.
+    if prefix and not text.startswith(prefix):
+        text = f"{prefix} {text}".strip()
+    return text
+
+
+class Session:
+    def __init__(self, session_id, websocket, loop, pool, config=None, scheduler=None):
+        self.id = session_id
+        self.websocket = websocket
+        self.loop = loop
+        self.pool = pool
+        self.scheduler = scheduler
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.is_running = True
+
+        self.events = TranscriptEvents(loop)
+        self.audio_queue = AudioQueue(
+            max_bytes=int(self.config['max_queued_seconds'] * SAMPLE_RATE) * 2,
+            policy=self.config['queue_policy'])
+        self._pending = bytearray()
+        self._vad = webrtcvad.Vad(self.config['webrtc_sensitivity'])
+        preroll_frames = int(self.config['pre_recording_buffer_duration'] * 1000 / FRAME_MS)
+        self._preroll = deque(maxlen=max(1, preroll_frames))
+        self._frames = []
+        self._recording = False
+        self._silent_frames = 0
+        self._last_stop = 0.0
+        self._realtime = RealtimeScheduler(
+            mode=self.config['realtime_scheduling'],
+            min_pause=self.config['realtime_processing_pause'],
+            max_pause=self.config['realtime_max_pause'],
+            min_new_voiced=self.config['realtime_min_new_voiced'])
+        self._last_realtime_text = ''
+        # Approximate arrival time of the newest audio taken off the queue.
+        self._newest_audio_at = 0.0
+        # Index in _frames of the frame that started the utterance (after the pre-roll).
+        self._speech_start_frame = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"stt-session-{session_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.is_running = False
+        self.audio_queue.close()
+        self.events.close()
+
+    def feed_audio(self, chunk):
+        """Queue 16 kHz int16 mono PCM for this session."""
+        self.audio_queue.put(chunk)
+
+    async def pump(self):
+        """Forward transcription events to the websocket until the session stops."""
+        async for message, emitted_at, record in self.events:
+            try:
+                await self.websocket.send(message)
+            except websockets.exceptions.ConnectionClosed:
+                self.stop()
+                print(f"Client {self.id} disconnected")
+                return
+            elapsed = time.perf_counter() - emitted_at
+            metrics.observe('send', elapsed)
+            if record is not None:
+                record['send_ms'] = ms(elapsed)
+                metrics.log_utterance(record)
+
+    def _emit(self, message, record=None):
+        self.events.publish((json.dumps(message), time.perf_counter(), record),
+                            final=message['type'] == 'fullSentence')
+
+    def _run(self):
+        while self.is_running:
+            chunk = self.audio_queue.get()
+            if chunk is None:
+                break  # session closed
+            # The queue holds real-time audio, so what is still queued is
+            # roughly how long ago this chunk arrived.
+            backlog = self.audio_queue.size / BYTES_PER_SECOND
+            metrics.observe('queue_backlog', backlog)
+            self._newest_audio_at = time.perf_counter() - backlog
+            try:
+                self._pending += chunk
+                usable = len(self._pending) - len(self._pending) % FRAME_BYTES
+                with memoryview(self._pending) as view:
+                    for offset in range(0, usable, FRAME_BYTES):
+                        # webrtcvad needs a read-only buffer, hence one copy per frame.
+                        self._process_frame(bytes(view[offset:offset + FRAME_BYTES]))
+                del self._pending[:usable]
+                if self._recording:
+                    self._maybe_transcribe_realtime()
+            except Exception as e:
+                print(f"Error in session {self.id}: {e}")
+                continue
+
+    def _process_frame(self, frame):
+        with metrics.timer('vad'):
+            is_speech = self._vad.is_speech(frame, SAMPLE_RATE)
+        if not self._recording:
+            self._preroll.append(frame)
+            gap = time.monotonic() - self._last_stop
+            if is_speech and gap >= self.config['min_gap_between_recordings']:
+                self._recording = True
+                self._realtime.reset()
+                self._realtime.note_voiced(FRAME_MS / 1000)
+                self._frames = list(self._preroll)
+                self._speech_start_frame = len(self._frames) - 1
+                self._preroll.clear()
+                self._silent_frames = 0
+            return
+
+        self._frames.append(frame)
+        if is_speech:
+            self._silent_frames = 0
+            self._realtime.note_voiced(FRAME_MS / 1000)
+            return
+        self._silent_frames += 1
+        silence = self._silent_frames * FRAME_MS / 1000
+        duration = len(self._frames) * FRAME_MS / 1000
+        if (silence >= self.config['post_speech_silence_duration']
+                and duration >= self.config['min_length_of_recording']):
+            self._finish_utterance()
+
+    def _maybe_transcribe_realtime(self):
+        if not self.config['enable_realtime_transcription']:
+            return
+        now = time.monotonic()
+        if not self._realtime.should_run(now):
+            return
+        model = self.pool.get(self.config['realtime_model_type'])
+        start = time.perf_counter()
+        text = transcribe(model, pcm16_to_float(b''.join(self._frames)),
+                          self.config['language'], self.config['beam_size_realtime'],
+                          prefix=self._realtime.stable_prefix() or None)
+        done = time.perf_counter()
+        self._realtime.ran(now, text)
+        metrics.observe('realtime_transcribe', done - start)
+        metrics.set_gauge('realtime_pause_s', self._realtime.pause)
+        if text and text != self._last_realtime_text:
+            self._last_realtime_text = text
+            metrics.observe('audio_to_partial', done - self._newest_audio_at)
+            self._emit({'type': 'realtime', 'text': text, 'latency': {
+                'transcribe_ms': ms(done - start),
+                'audio_to_text_ms': ms(done - self._newest_audio_at),
+            }})
+            print(f"\r[{self.id}] {text}", flush=True, end='')
+
+    def _finish_utterance(self):
+        audio = pcm16_to_float(b''.join(self._frames))
+        finished_at = time.perf_counter()
+        endpoint = self._silent_frames * FRAME_MS / 1000
+        metrics.observe('endpoint', endpoint)
+        record = {
+            'session': self.id,
+            'audio_s': round(len(audio) / SAMPLE_RATE, 2),
+            'endpoint_ms': ms(endpoint),
+            # Audio time from the first voiced frame to the VAD endpoint; wall-clock
+            # stamps include queueing and are kept for the latency fields only.
+            'speech_ms': ms((len(self._frames) - self._silent_frames - self._speech_start_frame)
+                            * FRAME_MS / 1000),
+        }
+        speech_end = finished_at - endpoint
+        self._frames = []
+        self._recording = False
+        self._last_stop = time.monotonic()
+        self._last_realtime_text = ''
+
+        def deliver(text, timing):
+            self._deliver_sentence(text, timing, record, speech_end)
+
+        if self.scheduler is not None:
+            self.scheduler.submit(audio, deliver)
+            return
+        model = self.pool.get(self.config['model'])
+        start = time.perf_counter()
+        text = transcribe(model, audio, self.config['language'], self.config['beam_size'])
+        elapsed = time.perf_counter() - start
+        metrics.observe('final_transcribe', elapsed)
+        deliver(text, {'queue_ms': 0.0, 'transcribe_ms': ms(elapsed), 'batch_size': 1})
+
+    def _deliver_sentence(self, text, timing, record, speech_end):
+        total = time.perf_counter() - speech_end
+        metrics.observe('speech_end_to_sentence', total)
+        record.update(timing, speech_end_to_text_ms=ms(total), chars=len(text))
+        if 'error' in timing:
+            # Close the utterance on the client instead of leaving it waiting.
+            self._emit({'type': 'fullSentence', 'text': '', 'error': timing['error']}, record)
+        elif text:
+            self._emit({'type': 'fullSentence', 'text': text, 'latency': {
+                'endpoint_ms': record['endpoint_ms'],
+                **timing,
+                'speech_end_to_text_ms': record['speech_end_to_text_ms'],
+            }}, record)
+            print(f"\r[{self.id}] Sentence: {text}")
+        else:
+            metrics.log_utterance(record)
+
+
+class SessionManager:
+    """Opens and closes sessions; only used from the event loop thread."""
+
+    def __init__(self, pool, config=None, max_sessions=4, scheduler=None):
+        self.pool = pool
+        self.config = config
+        self.scheduler = scheduler
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._ids = itertools.count(1)
+
+    def open(self, websocket, loop):
+        if len(self._sessions) >= self.max_sessions:
+            raise SessionLimitReached(
+                f"{len(self._sessions)} of {self.max_sessions} sessions in use")
+        session = Session(next(self._ids), websocket, loop, self.pool, self.config,
+                          self.scheduler)
+        self._sessions[session.id] = session
+        session.start()
+        metrics.set_gauge('sessions', len(self._sessions))
+        logger.info("Session %s opened (%d active)", session.id, len(self._sessions))
+        return session
+
+    def close(self, session):
+        session.stop()
+        if self._sessions.pop(session.id, None) is not None:
+            metrics.set_gauge('sessions', len(self._sessions))
+            logger.info("Session %s closed (%d active)", session.id, len(self._sessions))
+
+    def close_all(self):
+        for session in list(self._sessions.values()):
+            self.close(session)
+
+    def __len__(self):
+        return len(self._sessions)
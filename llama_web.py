@@ -1,8 +1,10 @@
 import time
 import json
-from bs4 import BeautifulSoup
 from playwright.sync_api import sync_playwright
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from transformers import AutoModelForCausalLM, AutoTokenizer, LogitsProcessorList, pipeline
+
+from web_extract import extract_actions
+from action_schema import AGENT_ACTIONS, ActionGrammar, ActionLogitsProcessor
 
 # -----------------------------
 # Llama-3-8B-Web 모델 로드
@@ -15,27 +17,9 @@ model = AutoModelForCausalLM.from_pretrained(
     device_map='auto'
 )
 agent = pipeline("text-generation", model=model, tokenizer=tokenizer)
-
-# -----------------------------
-# DOM 스냅샷 추출
-# -----------------------------
-def extract_actions(html, max_elements=30):
-    soup = BeautifulSoup(html, "html.parser")
-    elements = []
-    for el in soup.find_all(["a","button","input","form"]):
-        selector = None
-        if el.get("id"):
-            selector = f"#{el.get('id')}"
-        elif el.get("name"):
-            selector = f"[name=\"{el.get('name')}\"]"
-        if selector:
-            elements.append({
-                "tag": el.name,
-                "selector": selector,
-                "text": el.get_text(strip=True),
-                "attrs": dict(el.attrs)
-            })
-    return elements[:max_elements]
+# 액션 JSON 형식만 생성하도록 제한 (어휘 마스크는 여기서 한 번 만든다)
+action_grammar = ActionGrammar(tokenizer, AGENT_ACTIONS)
+MAX_NEW_TOKENS = 128   # 한도에 가까워지면 ActionLogitsProcessor가 문자열/객체를 닫는다
 
 # -----------------------------
 # 웹 자동화 에이전트
@@ -65,7 +49,11 @@ Reply with exactly ONE JSON action:
 {{"action":"finish","summary":"..."}}
 Do NOT add extra text.
 """
-            out = agent(prompt, max_new_tokens=128, do_sample=False)[0]['generated_text']
+            # return_full_text=False: 프롬프트를 빼고 생성된 JSON만. '}' 다음엔 EOS만 허용되어 바로 끝난다
+            out = agent(prompt, max_new_tokens=MAX_NEW_TOKENS, do_sample=False, return_full_text=False,
+                        logits_processor=LogitsProcessorList([ActionLogitsProcessor(action_grammar,
+                                                                                    MAX_NEW_TOKENS)])
+                        )[0]['generated_text']
             print("Model output:", out)
 
             try:
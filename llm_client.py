@@ -0,0 +1,266 @@
+# llm_client.py
+# 웹 에이전트(ai_web_browser.py, ai_web_browsing2.py) 공용 Ollama 클라이언트.
+#
+# - ollama.Client 하나를 계속 쓰고(HTTP 연결 재사용) keep_alive로 모델을 메모리에 고정한다.
+# - 매 호출마다 [system, 이전 턴들..., 새 user]를 보낸다. 앞부분이 지난 요청과 글자 그대로 같으면
+#   Ollama(llama.cpp)가 그 접두부의 KV 캐시를 재사용하므로 새 user 메시지만 prefill한다.
+#   그래서 system 프롬프트와 options(num_ctx 등)는 고정하고, 이전 턴은 고치지 않고 뒤에만 붙인다.
+# - 보낼 메시지가 num_ctx에서 답변 몫(REPLY_RESERVE)을 뺀 것보다 길면 오래된 턴부터 버린다.
+#   넘친 채로 보내면 Ollama가 앞에서부터 잘라 system 프롬프트가 날아간다.
+# - schema를 주면 Ollama format=으로 넘겨 출력이 그 JSON 형식을 벗어나지 못하게 한다 (action_schema.py).
+# - stream=True로 받아 첫 JSON 객체가 닫히는 순간 돌려준다. 스트림을 닫으면 서버도 생성을 멈춘다
+#   (모델이 JSON 뒤에 설명을 덧붙여도 기다리지 않는다).
+#
+# 로컬 모의 Ollama 서버로 예전 호출 방식과 첫 액션까지의 시간 비교:
+#   python llm_client.py --steps 6 --page-tokens 1500
+import json
+
+import ollama
+
+from dom_snapshot import estimate_tokens
+
+MODEL = "llama3.1"
+KEEP_ALIVE = -1        # 모델을 계속 메모리에 (초 단위 숫자나 "30m" 같은 문자열도 가능)
+NUM_CTX = 8192         # 바꾸면 모델이 다시 로드되고 캐시도 버려진다
+REPLY_RESERVE = 512    # num_ctx 중 답변 생성에 남겨 두는 토큰 수
+MESSAGE_OVERHEAD = 8   # 메시지마다 채팅 템플릿이 붙이는 토큰 (역할 헤더 등) 대략치
+
+
+class JsonObjectScanner:
+    """스트리밍 텍스트에서 첫 번째 최상위 JSON 객체가 닫히는 지점을 찾는다"""
+    def __init__(self):
+        self.text = ''
+        self._start = -1
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+
+    def feed(self, chunk):
+        """객체가 완성되면 그 텍스트, 아니면 None"""
+        offset = len(self.text)
+        self.text += chunk
+        for i in range(offset, len(self.text)):
+            c = self.text[i]
+            if self._start < 0:
+                if c == '{':
+                    self._start, self._depth = i, 1
+                continue
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_str = False
+            elif c == '"':
+                self._in_str = True
+            elif c == '{':
+                self._depth += 1
+            elif c == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    return self.text[self._start:i + 1]
+        return None
+
+
+class AgentLLM:
+    """system 프롬프트 고정 + 대화 누적 + 스트리밍 조기 종료"""
+    def __init__(self, system_prompt, model=MODEL, host=None, keep_alive=KEEP_ALIVE, num_ctx=NUM_CTX,
+                 reply_reserve=REPLY_RESERVE, schema=None):
+        self.client = ollama.Client(host=host)
+        self.format = schema
+        self.model = model
+        self.keep_alive = keep_alive
+        self.options = {'num_ctx': num_ctx}
+        self.reply_reserve = reply_reserve
+        self.system = {"role": "system", "content": system_prompt}
+        self.history = []
+
+    def warmup(self):
+        """모델 로드 + system 프롬프트 prefill을 미리 해 둔다 (첫 명령 전에 한 번)"""
+        self.client.chat(model=self.model, messages=[self.system], keep_alive=self.keep_alive,
+                         options={**self.options, 'num_predict': 1})
+
+    def reset(self):
+        """새 페이지 등 이전 대화가 더 이상 필요 없을 때. system 접두부 캐시는 그대로 쓰인다."""
+        self.history.clear()
+
+    def ask(self, content, **kwargs):
+        """user 메시지를 보내고 첫 JSON 객체 텍스트(없으면 전체 응답)를 돌려준다"""
+        user_msg = {"role": "user", "content": content}
+        self._trim_history(user_msg)
+        scanner = JsonObjectScanner()
+        reply = None
+        stream = self.client.chat(model=self.model, messages=[self.system, *self.history, user_msg],
+                                  stream=True, keep_alive=self.keep_alive, options=self.options,
+                                  format=self.format, **kwargs)
+        try:
+            for part in stream:
+                reply = scanner.feed(part['message']['content'])
+                if reply is not None:
+                    break
+        finally:
+            stream.close()   # 조기 종료 시 연결을 닫아 서버 쪽 생성도 멈춘다
+        if reply is None:
+            reply = scanner.text
+        self.history += [user_msg, {"role": "assistant", "content": reply}]
+        return reply
+
+    def _trim_history(self, user_msg):
+        """[system, history, user_msg]가 num_ctx - reply_reserve 안에 들어올 때까지 오래된 턴(user+assistant)을 버린다"""
+        def cost(msg):
+            return estimate_tokens(msg['content']) + MESSAGE_OVERHEAD
+        limit = self.options['num_ctx'] - self.reply_reserve - cost(self.system) - cost(user_msg)
+        total = sum(cost(m) for m in self.history)
+        while self.history and total > limit:
+            total -= cost(self.history[0]) + cost(self.history[1])
+            del self.history[:2]
+
+
+# ----------------------------------------
+# 벤치마크: 모의 Ollama 서버 (모델 로드, 접두부 KV 캐시, prefill/디코드 시간, keep_alive 만료를 흉내)
+# ----------------------------------------
+ACTION_REPLY = '{"action": "click", "selector": "#search-btn", "value": "", "wait": 1}'
+TRAILING_REPLY = ("\n\nThis clicks the search button so that the results for the query are shown. "
+                  "After the page loads, the next step can pick the first video from the list.")
+
+
+def _mock_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _keep_alive_seconds(value, default):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        units = {'s': 1, 'm': 60, 'h': 3600}
+        return float(value[:-1]) * units[value[-1]] if value[-1] in units else float(value)
+    return float('inf') if value < 0 else float(value)
+
+
+def _start_mock_server(load_ms, prefill_ms, decode_ms, default_keep_alive):
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {'loaded_until': 0.0, 'prompt': '', 'lock': threading.Lock()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            prompt = ''.join(f"<{m['role']}>{m['content']}" for m in req.get('messages', []))
+            with state['lock']:   # 모델 하나를 순서대로 쓰는 것처럼
+                now = time.monotonic()
+                if now > state['loaded_until']:
+                    time.sleep(load_ms / 1000)
+                    state['prompt'] = ''      # 다시 로드되면 캐시도 없음
+                common = 0
+                for a, b in zip(prompt, state['prompt']):
+                    if a != b:
+                        break
+                    common += 1
+                time.sleep(_mock_tokens(prompt[common:]) * prefill_ms / 1000)
+                state['prompt'] = prompt
+                limit = req.get('options', {}).get('num_predict', -1)
+                tokens = [ACTION_REPLY[i:i + 4] for i in range(0, len(ACTION_REPLY), 4)]
+                tokens += [TRAILING_REPLY[i:i + 4] for i in range(0, len(TRAILING_REPLY), 4)]
+                if limit > 0:
+                    tokens = tokens[:limit]
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.end_headers()
+                try:
+                    if req.get('stream', True):
+                        for tok in tokens:
+                            time.sleep(decode_ms / 1000)
+                            self._line({'model': req['model'], 'message': {'role': 'assistant', 'content': tok},
+                                        'done': False})
+                        self._line({'model': req['model'], 'message': {'role': 'assistant', 'content': ''},
+                                    'done': True})
+                    else:
+                        time.sleep(len(tokens) * decode_ms / 1000)
+                        self._line({'model': req['model'], 'done': True,
+                                    'message': {'role': 'assistant', 'content': ''.join(tokens)}})
+                except (BrokenPipeError, ConnectionResetError):
+                    pass   # 클라이언트가 JSON을 받고 끊음 -> 생성 중단
+                ka = _keep_alive_seconds(req.get('keep_alive'), default_keep_alive)
+                state['loaded_until'] = time.monotonic() + ka
+
+        def _line(self, obj):
+            self.wfile.write((json.dumps(obj) + '\n').encode())
+            self.wfile.flush()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _bench(steps, page_tokens, idle_s, load_ms, prefill_ms, decode_ms, default_keep_alive):
+    import time
+
+    system_prompt = "You are a browser automation agent. " * 40
+    pages = [f"step {i} " + "[data-ai=e1] button \"Search\" " * (page_tokens // 8) for i in range(steps)]
+
+    def legacy(host):
+        # 예전 ask_llm: 매번 [system, user] 비스트리밍, keep_alive 없음
+        client = ollama.Client(host=host)
+        out = []
+        for page in pages:
+            time.sleep(idle_s)
+            start = time.perf_counter()
+            raw = client.chat(model=MODEL, messages=[{"role": "system", "content": system_prompt},
+                                                     {"role": "user", "content": page}])['message']['content']
+            try:
+                json.loads(raw)
+                ok = True
+            except json.JSONDecodeError:
+                ok = False
+            out.append((time.perf_counter() - start, ok))
+        return out
+
+    def shared(host):
+        llm = AgentLLM(system_prompt, host=host)
+        llm.warmup()
+        out = []
+        for page in pages:
+            time.sleep(idle_s)
+            start = time.perf_counter()
+            raw = llm.ask(page)
+            try:
+                json.loads(raw)
+                ok = True
+            except json.JSONDecodeError:
+                ok = False
+            out.append((time.perf_counter() - start, ok))
+        return out
+
+    print(f"mock: load {load_ms} ms, prefill {prefill_ms} ms/tok, decode {decode_ms} ms/tok, "
+          f"server keep_alive {default_keep_alive}s, idle between steps {idle_s}s")
+    print(f"{steps} steps, ~{page_tokens} page tokens per step; time to first parsed action (s)")
+    for name, run in (('legacy', legacy), ('AgentLLM', shared)):
+        server = _start_mock_server(load_ms, prefill_ms, decode_ms, default_keep_alive)   # 모드마다 새 서버(빈 캐시)
+        res = run(f"http://127.0.0.1:{server.server_address[1]}")
+        server.shutdown()
+        times = [t for t, _ in res]
+        print(f"{name:<9} " + ' '.join(f"{t:5.2f}" for t in times)
+              + f"  | mean {sum(times) / len(times):5.2f}  parsed {sum(ok for _, ok in res)}/{len(res)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AgentLLM vs legacy ollama.chat on a mock Ollama server")
+    parser.add_argument('--steps', type=int, default=6)
+    parser.add_argument('--page-tokens', type=int, default=1500)
+    parser.add_argument('--idle', type=float, default=1.5, help="스텝 사이 대기 (사용자 입력/페이지 로딩 흉내)")
+    parser.add_argument('--load-ms', type=float, default=3000)
+    parser.add_argument('--prefill-ms', type=float, default=1.0, help="토큰당 prefill 시간")
+    parser.add_argument('--decode-ms', type=float, default=40.0, help="토큰당 생성 시간")
+    parser.add_argument('--server-keep-alive', type=float, default=1.0,
+                        help="keep_alive를 안 보낼 때 모델이 내려가는 시간 (실제 Ollama 기본 300s를 축소)")
+    args = parser.parse_args()
+    _bench(args.steps, args.page_tokens, args.idle, args.load_ms, args.prefill_ms, args.decode_ms,
+           args.server_keep_alive)
@@ -8,10 +8,22 @@
         'https://cdn.jsdelivr.net/gh/justadudewhohacks/face-api.js@master/weights'
     ];
 
+    // 파이썬 카메라 트래커(camera_pipeline.py)의 트랙 이벤트. 연결되면 어린이 여부는 트래커의 키로 정하고,
+    // 브라우저 face-api 연령은 어린이가 아닐 때 청소년/성인/노인을 나누는 데만 쓴다.
+    const TRACK_EVENTS_URL = 'ws://127.0.0.1:8765';
+    const CHILD_MAX_HEIGHT = 1.40;   // 이 키(m) 미만이면 어린이 화면
+    const MIN_CONFIDENCE = 0.8;      // 이 신뢰도 이상(또는 고정)일 때만 화면 전환
+
     let camStream = null;
     let detectorEnabled = false;
     let modelLoaded = false;
 
+    let trackSocket = null;
+    let trackerActive = false;
+    let lastGroup = null;
+    let faceAge = null;         // 트래커 모드에서 face-api가 마지막으로 추정한 나이 (얼굴 없으면 null)
+    const tracks = new Map();   // id -> {id, b: [x,y,w,h], h, c, f}
+
     // DOM 요소 참조
     const $camOverlay = document.getElementById('camOverlay');
     const $camVideo = document.getElementById('camVideo');
@@ -19,10 +31,98 @@
     const $camStatusText = document.getElementById('camStatusText');
     const $cameraStatus = document.getElementById('cameraStatus'); // 작은 배지
 
+    // 트랙 이벤트 연결. timeoutMs 안에 열리면 true
+    function connectTrackEvents(timeoutMs = 1500) {
+        return new Promise(resolve => {
+            let opened = false;
+            let socket;
+            try {
+                socket = new WebSocket(TRACK_EVENTS_URL);
+            } catch (error) {
+                resolve(false);
+                return;
+            }
+            const timer = setTimeout(() => { if (!opened) { socket.close(); resolve(false); } }, timeoutMs);
+
+            socket.onopen = () => {
+                opened = true;
+                clearTimeout(timer);
+                trackSocket = socket;
+                resolve(true);
+            };
+            socket.onerror = () => { if (!opened) { clearTimeout(timer); resolve(false); } };
+            socket.onmessage = event => {
+                const msg = JSON.parse(event.data);
+                if (msg.t === 's') {
+                    // 스냅샷: 전체 교체
+                    tracks.clear();
+                    msg.tracks.forEach(t => tracks.set(t.id, t));
+                } else if (msg.t === 'd') {
+                    // diff: 바뀐 필드만 덮어쓰고 사라진 트랙 삭제
+                    msg.u.forEach(u => tracks.set(u.id, Object.assign(tracks.get(u.id) || {}, u)));
+                    (msg.r || []).forEach(id => tracks.delete(id));
+                }
+                applyTracks();
+            };
+            socket.onclose = () => {
+                if (!opened) return;
+                trackSocket = null;
+                tracks.clear();
+                if (trackerActive) {
+                    updateStatus('트래커 연결 끊김, 재연결 중...');
+                    setTimeout(reconnectTrackEvents, 3000);
+                }
+            };
+        });
+    }
+
+    async function reconnectTrackEvents() {
+        if (!trackerActive || trackSocket) return;
+        if (!(await connectTrackEvents())) setTimeout(reconnectTrackEvents, 3000);
+    }
+
+    // 가장 가까운(얼굴이 가장 큰) 사람의 키로 화면 연령대 결정
+    function applyTracks() {
+        let nearest = null;
+        tracks.forEach(t => { if (!nearest || t.b[2] > nearest.b[2]) nearest = t; });
+        if (!nearest) {
+            updateStatus('얼굴 찾는 중...');
+            return;
+        }
+        if (nearest.h === null || (!nearest.f && nearest.c < MIN_CONFIDENCE)) {
+            updateStatus(`키 측정 중... (${Math.round(nearest.c * 100)}%)`);
+            return;
+        }
+        // 키로는 어린이 여부만 구분할 수 있다. 그 위는 face-api 연령으로 나누고, 연령이 없으면 성인
+        let ageGroup = 'child';
+        if (nearest.h >= CHILD_MAX_HEIGHT) {
+            ageGroup = faceAge === null ? 'adult' : getAgeGroup(Math.max(faceAge, 13));
+        }
+        updateStatus(`추정 키: ${nearest.h.toFixed(2)}m (${getAgeGroupName(ageGroup)})`);
+        if (ageGroup !== lastGroup && typeof selectAge === 'function') {
+            selectAge(ageGroup);
+        }
+        lastGroup = ageGroup;
+    }
+
     // 카메라 시작
     async function startAgeDetection() {
-        if (camStream) return;
+        if (camStream || trackerActive) return;
 
+        // 카메라 트래커가 떠 있으면 어린이 여부는 그 키로 정한다
+        if (await connectTrackEvents()) {
+            trackerActive = true;
+            console.log('카메라 트래커 연결됨:', TRACK_EVENTS_URL);
+            updateStatus('트래커 연결됨');
+            // 성인/노인 구분용 연령 추정은 브라우저 카메라로 계속 (카메라를 못 열면 어린이/성인만)
+            startBrowserCamera(false);
+            return;
+        }
+        await startBrowserCamera(true);
+    }
+
+    // 브라우저 카메라 + face-api 연령 추정 시작. interactive면 실패 시 사용자에게 알린다
+    async function startBrowserCamera(interactive) {
         try {
             // 카메라 스트림 시작
             camStream = await navigator.mediaDevices.getUserMedia({
@@ -42,11 +142,11 @@
                 }
             }
 
-            updateStatus('카메라 실행 중...');
+            if (!trackerActive) updateStatus('카메라 실행 중...');
 
             // face-api 모델 로드
             if (faceapiAvailable && !modelLoaded) {
-                updateStatus('모델 로딩 중...');
+                if (!trackerActive) updateStatus('모델 로딩 중...');
                 await loadModels();
             }
 
@@ -54,10 +154,14 @@
             if (modelLoaded) {
                 detectorEnabled = true;
                 runDetection();
-            } else {
+            } else if (!trackerActive) {
                 updateStatus('모델 로드 실패');
             }
         } catch (error) {
+            if (!interactive) {
+                console.warn('카메라 시작 실패, 키로만 연령대 결정:', error);
+                return;
+            }
             console.error('카메라 시작 실패:', error);
             updateStatus('카메라 오류');
             alert('카메라 권한이 필요합니다.');
@@ -115,7 +219,11 @@
                         .detectSingleFace($camVideo, new faceapi.TinyFaceDetectorOptions())
                         .withAgeAndGender();
 
-                    if (detection && detection.age) {
+                    if (trackerActive) {
+                        // 화면 전환은 트랙 이벤트 쪽(applyTracks)에서 키와 함께 정한다
+                        faceAge = detection && detection.age ? Math.round(detection.age) : null;
+                        applyTracks();
+                    } else if (detection && detection.age) {
                         const estimatedAge = Math.round(detection.age);
                         const ageGroup = getAgeGroup(estimatedAge);
 
@@ -161,6 +269,13 @@
     // 카메라 중지
     function stopAgeDetection() {
         detectorEnabled = false;
+        trackerActive = false;
+        lastGroup = null;
+        faceAge = null;
+        if (trackSocket) {
+            trackSocket.close();
+            trackSocket = null;
+        }
         if (camStream) {
             camStream.getTracks().forEach(track => track.stop());
             camStream = null;
@@ -0,0 +1,286 @@
+# web_extract.py
+# 저장된/받아온 HTML에서 상호작용 요소(a, button, input, form)를 뽑는 공용 모듈.
+# llama_web.py와 ai_web_browsing2.py가 각자 BeautifulSoup(html.parser)로 트리 전체를 만들고
+# 태그별로 여러 번 훑던 것을 한 번의 순차 스캔으로 바꾸고, max_elements개가 차면 바로 멈춘다.
+#
+# 백엔드 (설치된 것 중 앞의 것을 쓴다):
+#   lxml       : HTMLPullParser로 조각씩 먹이며 스트리밍, 다 차면 나머지 HTML은 파싱하지 않음
+#   selectolax : lexbor C 파서 + CSS 셀렉터 한 번. 작은 페이지는 가장 빠르지만 문서 전체를 파싱한다
+#   bs4        : BeautifulSoup(html.parser, SoupStrainer). C 확장 없이 도는 폴백
+#
+# 저장된 페이지 묶음으로 백엔드별 시간/메모리 비교:
+#   python web_extract.py index.html index_old.html static/kiosk.html saved_pages/ --synthetic 5000
+from collections import deque
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+try:
+    from bs4 import BeautifulSoup, SoupStrainer
+except ImportError:
+    BeautifulSoup = None
+
+ACTION_TAGS = ('a', 'button', 'input', 'form')
+BACKENDS = ('lxml', 'selectolax', 'bs4')
+STREAM_CHUNK = 64 * 1024   # lxml 스트리밍 시 한 번에 먹이는 문자 수
+KEEP_ATTRS = ('id', 'name', 'type', 'href', 'placeholder', 'value', 'aria-label', 'role', 'action')
+
+
+def available_backends():
+    mods = {'lxml': etree, 'selectolax': LexborHTMLParser, 'bs4': BeautifulSoup}
+    return [b for b in BACKENDS if mods[b] is not None]
+
+
+def default_backend():
+    backends = available_backends()
+    if not backends:
+        raise ImportError("web_extract needs lxml, selectolax or beautifulsoup4")
+    return backends[0]
+
+
+# ----------------------------------------
+# 백엔드별 스캔: 문서 순서대로 (tag, attrs, text()) 를 하나씩 내보낸다.
+# text는 요소를 실제로 쓸 때만 계산하도록 함수로 넘긴다.
+# ----------------------------------------
+def _scan_lxml(html, tags):
+    # 'start' 순서로 줄을 세워 문서 순서를 지키고(form이 안쪽 input보다 먼저),
+    # 맨 앞 요소의 'end'가 와서 자식 텍스트까지 다 들어온 뒤에 내보낸다
+    # (페이지 전체를 감싼 form이면 그 form이 닫힐 때까지는 조기 종료가 안 된다)
+    parser = etree.HTMLPullParser(events=('start', 'end'), tag=tags)
+    waiting, ended = deque(), set()
+
+    def ready():
+        for event, el in parser.read_events():
+            if event == 'start':
+                waiting.append(el)
+            else:
+                ended.add(el)
+        while waiting and waiting[0] in ended:
+            el = waiting.popleft()
+            ended.discard(el)
+            yield el.tag, el.attrib, lambda el=el: ''.join(s.strip() for s in el.itertext())
+
+    for start in range(0, len(html), STREAM_CHUNK):
+        parser.feed(html[start:start + STREAM_CHUNK])
+        yield from ready()
+    parser.close()
+    yield from ready()
+
+
+def _scan_selectolax(html, tags):
+    tree = LexborHTMLParser(html)
+    for node in tree.css(', '.join(tags)):
+        yield node.tag, node.attributes, lambda node=node: node.text(separator='', strip=True)
+
+
+def _scan_bs4(html, tags):
+    # 대상 태그(와 그 안쪽)만 트리로 만든다
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer(list(tags)))
+    for el in soup.find_all(list(tags)):
+        yield el.name, el.attrs, lambda el=el: el.get_text(strip=True)
+
+
+_SCANNERS = {'lxml': _scan_lxml, 'selectolax': _scan_selectolax, 'bs4': _scan_bs4}
+
+
+def iter_elements(html, tags=ACTION_TAGS, backend=None):
+    """선택자를 만들 수 있는(id 또는 name이 있는) 요소를 문서 순서대로 (tag, selector, attrs, text()) 로"""
+    for tag, attrs, text in _SCANNERS[backend or default_backend()](html, tags):
+        if attrs.get('id'):
+            yield tag, f"#{attrs['id']}", attrs, text
+        elif attrs.get('name'):
+            yield tag, f"[name=\"{attrs['name']}\"]", attrs, text
+
+
+def extract_actions(html, max_elements=30, backend=None):
+    """llama_web.py 형식: [{tag, selector, text, attrs}, ...]. max_elements개가 차면 스캔을 멈춘다."""
+    elements = []
+    for tag, selector, attrs, text in iter_elements(html, backend=backend):
+        elements.append({
+            "tag": tag,
+            "selector": selector,
+            "text": text(),
+            # 예전엔 dict(el.attrs)로 class/style/data-* 까지 통째로 복사했다
+            "attrs": {k: attrs[k] for k in KEEP_ATTRS if attrs.get(k)}
+        })
+        if len(elements) >= max_elements:
+            break
+    return elements
+
+
+def extract_grouped(html, max_elements=20, backend=None):
+    """ai_web_browsing2.py 형식: id가 있는 input/button/a를 종류별로 max_elements개까지"""
+    groups = {"inputs": [], "buttons": [], "links": []}
+    kinds = {'input': "inputs", 'button': "buttons", 'a': "links"}
+    full = 0
+    for tag, attrs, text in _SCANNERS[backend or default_backend()](html, ('input', 'button', 'a')):
+        group = groups[kinds[tag]]
+        if not attrs.get('id') or len(group) >= max_elements:
+            continue
+        if tag == 'input':
+            group.append({"selector": f"#{attrs['id']}", "placeholder": attrs.get("placeholder") or ""})
+        else:
+            group.append({"selector": f"#{attrs['id']}", "text": text()})
+        if len(group) == max_elements:
+            full += 1
+            if full == len(groups):
+                break
+    return groups
+
+
+# ----------------------------------------
+# 벤치마크: 예전 BeautifulSoup 방식 vs 백엔드별 (시간, 메모리)
+# ----------------------------------------
+def _legacy_extract(html, max_elements=30):
+    """예전 llama_web.extract_actions (비교 기준)"""
+    soup = BeautifulSoup(html, "html.parser")
+    elements = []
+    for el in soup.find_all(["a", "button", "input", "form"]):
+        selector = None
+        if el.get("id"):
+            selector = f"#{el.get('id')}"
+        elif el.get("name"):
+            selector = f"[name=\"{el.get('name')}\"]"
+        if selector:
+            elements.append({"tag": el.name, "selector": selector,
+                             "text": el.get_text(strip=True), "attrs": dict(el.attrs)})
+    return elements[:max_elements]
+
+
+def _synthetic_page(n):
+    rows = ''.join(
+        f'<div class="row r{i}" style="padding:2px" data-x="{i}"><p>item {i} lorem ipsum dolor sit amet</p>'
+        f'<a id="link{i}" class="btn btn-link" href="/item/{i}">open {i}</a>'
+        f'<button name="b{i}" class="btn" data-track="{i}"><span>buy</span> {i}</button>'
+        f'<input id="qty{i}" type="number" placeholder="qty"></div>'
+        for i in range(n))
+    return f'<html><head><title>synthetic</title></head><body>{rows}</body></html>'
+
+
+# 잘림(max_elements) 때 문서 순서가 백엔드마다 달라지지 않는지 보는 고정 예: form이 input보다 먼저
+_TRUNCATION_CASE = ('form-truncated', '<form id="f"><input id="a"><input id="b"></form>', 2)
+
+
+def _check_equivalence(pages, max_elements):
+    """백엔드별 (tag, selector, text) 목록이 예전 방식과 같은지. 다르면 첫 차이를 출력하고 False"""
+    ok = True
+    cases = [(label, html, max_elements) for label, html in pages] + [_TRUNCATION_CASE]
+    for label, html, limit in cases:
+        expected = [(e['tag'], e['selector'], e['text']) for e in _legacy_extract(html, limit)]
+        for name in available_backends():
+            got = [(e['tag'], e['selector'], e['text']) for e in extract_actions(html, limit, backend=name)]
+            if got != expected:
+                ok = False
+                diff = next((i for i, (a, b) in enumerate(zip(got, expected)) if a != b),
+                            min(len(got), len(expected)))
+                print(f"MISMATCH {name} on {label} (max {limit}) at #{diff}: "
+                      f"{got[diff:diff + 1]} != {expected[diff:diff + 1]}")
+    return ok
+
+
+def _load_pages(paths, synthetic):
+    from pathlib import Path
+
+    files = []
+    for p in map(Path, paths):
+        files += sorted(p.rglob('*.htm*')) if p.is_dir() else [p]
+    pages = [(f.name, f.read_text(encoding='utf-8', errors='replace')) for f in files]
+    if synthetic:
+        pages.append((f"synthetic-{synthetic}", _synthetic_page(synthetic)))
+    return pages
+
+
+def _proc_status_kb(*keys):
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in keys:
+                values[key] = int(rest.split()[0])
+    return [values[k] for k in keys]
+
+
+def _peak_growth_kb(run, html):
+    """run(html) 한 번 동안 최대 RSS가 시작 RSS보다 얼마나 커졌는지 (KB, Linux만. 아니면 None).
+    ru_maxrss는 spawn(fork+exec) 너머로 부모의 최댓값을 물려받고 줄지도 않으므로
+    /proc/self/clear_refs로 VmHWM을 현재 RSS로 되돌린 뒤 잰다."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        rss0, = _proc_status_kb('VmRSS')
+    except OSError:
+        return None
+    run(html)
+    peak, = _proc_status_kb('VmHWM')
+    return peak - rss0
+
+
+def _bench_child(name, paths, synthetic, max_elements, repeat, queue):
+    # 자식 프로세스에서 백엔드별로 따로 잰다 (C 파서 메모리는 tracemalloc에 안 잡힘). 페이지도 여기서 읽는다
+    import time
+
+    run = (lambda html: _legacy_extract(html, max_elements)) if name == 'legacy-bs4' else \
+        (lambda html: extract_actions(html, max_elements, backend=name))
+    run(_TRUNCATION_CASE[1])   # import/JIT 성격의 첫 호출 비용 제외 (작은 페이지라 메모리 최댓값은 안 올림)
+    results = {}
+    for label, html in _load_pages(paths, synthetic):
+        memory = _peak_growth_kb(run, html)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run(html)
+        results[label] = ((time.perf_counter() - start) / repeat * 1000, memory)
+    queue.put(results)
+
+
+def _bench(paths, synthetic, max_elements, repeat):
+    import multiprocessing as mp
+
+    # 부모가 페이지를 읽거나 파싱하기 전에 자식부터 돌린다
+    names = (['legacy-bs4'] if BeautifulSoup is not None else []) + available_backends()
+    ctx = mp.get_context('spawn')
+    results = {}
+    for name in names:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_bench_child, args=(name, paths, synthetic, max_elements, repeat, queue))
+        proc.start()
+        results[name] = queue.get()
+        proc.join()
+
+    pages = _load_pages(paths, synthetic)
+    if not pages:
+        raise SystemExit("no pages")
+    if BeautifulSoup is not None:
+        same = _check_equivalence(pages, max_elements)
+        print(f"equivalence vs legacy-bs4 (incl. truncated form case): {'ok' if same else 'MISMATCH'}")
+
+    def mb(kb):
+        return f"{kb / 1024:>14.1f}" if kb is not None else f"{'-':>14}"
+
+    print(f"max_elements={max_elements}, repeat={repeat}")
+    print(f"{'page':<28} {'KB':>7} " + ' '.join(f"{n + ' ms':>14}" for n in names))
+    for label, html in pages:
+        print(f"{label[:28]:<28} {len(html) / 1024:>7.0f} "
+              + ' '.join(f"{results[n][label][0]:>14.2f}" for n in names))
+    print(f"{'total':<28} {'':>7} "
+          + ' '.join(f"{sum(t for t, _ in results[n].values()):>14.2f}" for n in names))
+    print(f"\n{'peak RSS growth per page':<28} {'KB':>7} " + ' '.join(f"{n + ' MB':>14}" for n in names))
+    for label, html in pages:
+        print(f"{label[:28]:<28} {len(html) / 1024:>7.0f} " + ' '.join(mb(results[n][label][1]) for n in names))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="extract_actions backend benchmark over saved pages")
+    parser.add_argument('paths', nargs='*', default=['index.html', 'index_old.html', 'static/kiosk.html'],
+                        help="HTML 파일 또는 디렉터리 (하위 *.htm* 전부)")
+    parser.add_argument('--synthetic', type=int, default=0, help="요소 N세트짜리 합성 대형 페이지 추가")
+    parser.add_argument('--max-elements', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    _bench(args.paths, args.synthetic, args.max_elements, args.repeat)